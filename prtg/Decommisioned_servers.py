@@ -1,6 +1,36 @@
 import local_base
 import csv
+import ipaddress
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Iterator, List, Optional
 
+import typer
+from rich import print
+from typing_extensions import Annotated
+
+import fanout
+import query
+import terminal_outputs as outputs
+
+
+app = typer.Typer(no_args_is_help=True)
+
+
+class Output(str, Enum):
+    text = "text"
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class Status(str, Enum):
+    matched = "matched"
+    missing = "missing"
+    stale = "stale"
+
+
+REPORT_FIELDS = ["status", "hostname", "source", "core", "objid", "device", "host", "matched_on"]
 
 
 def Get_hostnames_from_csv(filename:str):
@@ -8,16 +38,195 @@ def Get_hostnames_from_csv(filename:str):
         hir_servers = csv.DictReader(csv_file)
         return [server["Hostname"] for server in hir_servers]
 
-def Get_Decommissioned_Servers_in_PRTG(filename:str):
-    PRTG_hosts = set(local_base.Get_All_PRTG_Hostnames())
+def Get_Decommissioned_Servers_in_PRTG(filename:str, core_names:list=None):
+    PRTG_hosts = set(local_base.Get_All_PRTG_Hostnames(core_names))
     HIR_hosts = set(Get_hostnames_from_csv(filename))
     print(PRTG_hosts.intersection(HIR_hosts))
 
 
 def Get_Decommissioned_Servers_in_Splunk(splunkCsv:str, *args):
-    splunk_hosts = set(local_base.Get_Core_Hostnames(splunkCsv))
-    HIR_hosts ={}
-    for file in args: 
-       HIR_hosts = {*HIR_hosts, *Get_hostnames_from_csv(file)}
+    splunk_hosts = set(Get_hostnames_from_csv(splunkCsv))
+    HIR_hosts = set()
+    for file in args:
+       HIR_hosts.update(Get_hostnames_from_csv(file))
     for host in splunk_hosts.intersection(HIR_hosts):
         print(host)
+
+
+# ========================= Reconciliation =====================================
+
+
+def host_keys(value: Optional[str]) -> List[str]:
+    """
+    Normalised lookup keys of a hostname or address, most specific first.
+
+    Names are lower cased without a trailing dot and give their FQDN and
+    their short name, so web01.agency.ok.local and WEB01 meet on "web01".
+    Addresses give a single "ip:" key.
+    """
+    value = (value or "").strip().lower().rstrip(".")
+    if not value:
+        return []
+
+    try:
+        return [f"ip:{ipaddress.ip_address(value)}"]
+    except ValueError:
+        pass
+
+    short = value.split(".", 1)[0]
+    return [value] if short == value else [value, short]
+
+
+@dataclass
+class HostIndex:
+    """PRTG devices of every core, keyed by the normalised name and host of each"""
+
+    devices: dict
+    keys: dict
+
+    @classmethod
+    def build(cls, devices: List[dict]) -> "HostIndex":
+        index = cls({}, {})
+        for device in devices:
+            device_key = (device["core"], device["objid"])
+            index.devices[device_key] = device
+            for key in [*host_keys(device.get("name")), *host_keys(device.get("host"))]:
+                index.keys.setdefault(key, []).append(device_key)
+        return index
+
+    def lookup(self, hostname: str, ip: str = None) -> tuple[list, Optional[str]]:
+        """Devices matching an inventory host and the key they matched on"""
+        for key in [*host_keys(hostname), *host_keys(ip)]:
+            found = self.keys.get(key)
+            if found:
+                return [self.devices[device_key] for device_key in dict.fromkeys(found)], key
+        return [], None
+
+
+def read_core_devices(core: str, use_cache: bool = True) -> List[dict]:
+    device_query = query.TableQuery("devices", "objid,name,host", sortby=None)
+    devices = []
+    for page in query.read(core, device_query, use_cache):
+        devices.extend(
+            {**device, "core": core} for device in page if device["name"] not in local_base.exclude
+        )
+    return devices
+
+
+def read_inventory(
+    files: List[Path], column: str, ip_column: str = None
+) -> Iterator[tuple[str, str, Optional[str]]]:
+    """Stream (source file, hostname, ip) from inventory CSVs, one row at a time"""
+    for file in files:
+        with open(file, encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                hostname = (row.get(column) or "").strip()
+                ip = (row.get(ip_column) or "").strip() if ip_column else None
+                if hostname or ip:
+                    yield file.name, hostname, ip
+
+
+def reconcile_hosts(
+    inventory: Iterator[tuple[str, str, Optional[str]]], index: HostIndex
+) -> Iterator[dict]:
+    """
+    Yield a report row for every inventory host, then for every unmatched device.
+
+    matched: the host is a PRTG device, missing: the host is not in PRTG,
+    stale: the PRTG device is in none of the inventories. Inventory rows are
+    looked up as they stream in, only the PRTG side is held in memory.
+    """
+    seen = set()
+    for source, hostname, ip in inventory:
+        devices, key = index.lookup(hostname, ip)
+        if not devices:
+            yield {"status": Status.missing.value, "hostname": hostname or ip, "source": source}
+            continue
+
+        for device in devices:
+            seen.add((device["core"], device["objid"]))
+            yield {
+                "status": Status.matched.value,
+                "hostname": hostname or ip,
+                "source": source,
+                "core": device["core"],
+                "objid": device["objid"],
+                "device": device.get("name"),
+                "host": device.get("host"),
+                "matched_on": key,
+            }
+
+    for device_key, device in index.devices.items():
+        if device_key not in seen:
+            yield {
+                "status": Status.stale.value,
+                "core": device["core"],
+                "objid": device["objid"],
+                "device": device.get("name"),
+                "host": device.get("host"),
+            }
+
+
+@app.command(no_args_is_help=True)
+def reconcile(
+    files: Annotated[
+        List[Path],
+        typer.Argument(exists=True, dir_okay=False, help="Inventory CSV files"),
+    ],
+    core: Annotated[
+        List[str], typer.Option(help="Core to compare against, repeatable, default all")
+    ] = None,
+    column: Annotated[str, typer.Option(help="CSV column holding the hostname")] = "Hostname",
+    ip_column: Annotated[
+        str, typer.Option(help="CSV column holding an IP address, matched against host")
+    ] = None,
+    status: Annotated[
+        List[Status], typer.Option(help="Report only these statuses, repeatable")
+    ] = None,
+    output: Annotated[
+        Output,
+        typer.Option("--output", "-o", help="Output format of the report", case_sensitive=False),
+    ] = Output.text,
+    no_cache: Annotated[
+        bool, typer.Option("--no-cache", help="Query the cores instead of the cache")
+    ] = False,
+) -> None:
+    """
+    Reconcile server inventory CSVs against the devices of every PRTG core.
+
+    Every host is reported as matched (monitored in PRTG), missing (not in
+    PRTG) or stale (a PRTG device in none of the files). With a list of
+    decommissioned servers, the matched rows are the devices to remove:
+
+    prtg decommissioned reconcile retired.csv --status matched -o csv > audit.csv
+
+    Hostnames match by FQDN or short name, case insensitive, and against
+    both the name and the host address of a device.
+    """
+    core_names = core or [name.name for name in local_base.cores]
+    statuses = {value.value for value in status or Status}
+
+    result = fanout.query_cores(lambda name: read_core_devices(name, not no_cache), core_names)
+    local_base.report_fanout_errors(result)
+    index = HostIndex.build(result.merged())
+
+    rows = reconcile_hosts(read_inventory(files, column, ip_column), index)
+    writer = None if output == Output.text else outputs.RecordWriter(output.value, REPORT_FIELDS)
+    counts = dict.fromkeys(Status, 0)
+
+    for row in rows:
+        counts[Status(row["status"])] += 1
+        if row["status"] not in statuses:
+            continue
+
+        if writer is not None:
+            writer.write(row)
+        elif row["status"] == Status.stale.value:
+            print(f"stale    {row['core']}/{row['objid']} {row['device']}")
+        else:
+            target = f"{row['core']}/{row['objid']} {row['device']}" if "core" in row else ""
+            print(f"{row['status']:<8} {row['hostname']} {target}")
+
+    if writer is None:
+        print()
+        print(", ".join(f"{name.value}: {count}" for name, count in counts.items()))
@@ -0,0 +1,731 @@
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import bulk
+import config
+import inventory
+import journal
+import local_base
+import profiling
+import query
+from bulk import ItemResult
+from client import CoreClient
+from tagset import TagSet
+
+NEW_SENSOR_ID = re.compile(r"sensor\.htm\?id=(?P<sensor_id>\d+)")
+
+# object IDs sent in one pause.htm request, keeps URLs well under server limits
+PAUSE_CHUNK = 100
+
+# raw status values of paused by user, dependency, schedule, until and license
+PAUSED_STATUSES = {"7", "8", "9", "11", "12"}
+
+# sensor names remembered for the whole run, by (core, sensor ID)
+NAME_CACHE_SIZE = 10000
+_names: OrderedDict = OrderedDict()
+_names_lock = threading.Lock()
+
+# IDs per SQL IN list when reading the inventory cache
+SQL_CHUNK = 500
+
+
+@dataclass
+class TagResult:
+    """
+    Outcome of a tag change on many devices.
+
+    updated: device ID to the tags read back from the core after the change
+    unchanged: devices whose tags already matched
+    failed: device ID to the error that stopped its update
+    """
+
+    updated: dict = field(default_factory=dict)
+    unchanged: List[str] = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+
+
+@dataclass
+class PauseResult:
+    """
+    Outcome of pausing or resuming many objects.
+
+    confirmed: objects whose status now matches the request
+    unconfirmed: objects whose status does not, including failed ones
+    failed: object ID to the error the core answered
+    """
+
+    paused: bool
+    confirmed: List[str] = field(default_factory=list)
+    unconfirmed: List[str] = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+
+
+@dataclass
+class ChannelRow:
+    """
+    One sensor channel, with the threshold values to set on it, if any.
+
+    Values left None are not written.
+    """
+
+    objid: str
+    subid: Optional[str] = None
+    warning: Optional[str] = None
+    error: Optional[str] = None
+    limitmode: Optional[str] = None
+
+
+class PRTGClient:
+    """
+    Batched operations on one PRTG core, for scripts and services.
+
+    Methods return rows and result objects and never print, the CLI
+    commands are thin wrappers around them:
+
+        prtg = api.PRTGClient("serveronprem")
+        web = [device["objid"] for device in prtg.devices(name="web")]
+        result = prtg.add_tags(web, "role:webserver")
+
+    Reads come from the local inventory cache unless use_cache is off. Many
+    objects are read with batched table.json queries, writes to many objects
+    run on a pool of worker threads and are paced by the core's scheduler.
+    Per object results are bulk.ItemResult, yielded as each one finishes.
+
+    Ctrl-C is left to the calling program, interruptible lets the bulk
+    writes drain on the first Ctrl-C instead, as the CLI commands do.
+    """
+
+    def __init__(
+        self,
+        core: str,
+        token: str = None,
+        workers: int = 8,
+        use_cache: bool = True,
+        interruptible: bool = False,
+    ):
+        self.core = core
+        self.prtg = config.get_client(core, token)
+        self.workers = workers
+        self.use_cache = use_cache
+        self.interruptible = interruptible
+
+    def run(
+        self, items: Iterable, worker: Callable, job: journal.Journal = None, key: Callable = str
+    ) -> Iterator[ItemResult]:
+        """bulk.run, or job.run with a job, on this client's workers"""
+        if job is None:
+            return bulk.run(items, worker, self.workers, self.interruptible)
+        return job.run(items, worker, self.workers, key, self.interruptible)
+
+    # ========================= Reads ==========================================
+
+    def devices(
+        self,
+        tags: List[str] = None,
+        name: str = None,
+        objids: List[str] = None,
+        refresh: bool = False,
+    ) -> Iterator[dict]:
+        """Devices carrying every tag, with name in their name, streamed page by page"""
+        device_query = query.TableQuery(
+            "devices", "objid,name,host,tags", tags=tags or [], name_contains=name,
+            objids=objids or [],
+        )
+        for page in query.read(self.core, device_query, self.use_cache, refresh):
+            yield from page
+
+    def sensors(
+        self,
+        tags: List[str] = None,
+        name: str = None,
+        paused: bool = False,
+        refresh: bool = False,
+    ) -> Iterator[dict]:
+        """Sensors with any of tags, with name in their name, streamed page by page"""
+        sensor_query = query.TableQuery(
+            "sensors", "objid,name,device,parentid,status", any_tags=tags or [],
+            name_contains=name, statuses=sorted(PAUSED_STATUSES) if paused else [],
+        )
+        for page in query.read(self.core, sensor_query, self.use_cache, refresh):
+            yield from page
+
+    def tags(self, device_ids: List[str]) -> dict:
+        """Tags of many devices, inherited ones included, see read_tags"""
+        return read_tags(self.prtg, device_ids)
+
+    def own_tags(self, device_ids: List[str]) -> Iterator[ItemResult]:
+        """Tags set on each device itself, one getobjectproperty request per device"""
+        return self.run(device_ids, lambda device: read_own_tags(self.prtg, device))
+
+    def get_property(self, object_ids: List[str], name: str) -> Iterator[ItemResult]:
+        """A property of many objects, the value of each result is the property"""
+        return self.run(object_ids, lambda objid: read_object_property(self.prtg, objid, name))
+
+    def channel_property(self, channels: Iterable[ChannelRow], name: str) -> Iterator[ItemResult]:
+        """A property of many sensor channels, the value of each result is the property"""
+        return self.run(channels, lambda row: read_channel_property(self.prtg, row, name))
+
+    def statuses(self, object_ids: List[str]) -> dict:
+        """Raw status of sensors and devices, see read_statuses"""
+        return read_statuses(self.prtg, object_ids)
+
+    def sensor_names(self, sensor_ids: List[str]) -> dict:
+        return sensor_names(self.core, sensor_ids, self.prtg.token)
+
+    def sensor_index(self, device_ids: List[str], use_cache: bool = None) -> set:
+        use_cache = self.use_cache if use_cache is None else use_cache
+        return sensor_index(self.core, device_ids, self.prtg.token, use_cache)
+
+    # ========================= Writes =========================================
+
+    def set_property(
+        self, object_ids: List[str], name: str, value: str, job: journal.Journal = None
+    ) -> Iterator[ItemResult]:
+        """Set a property on many objects"""
+
+        def apply(objid: str) -> None:
+            write_object_property(self.prtg, objid, name, value)
+
+        return self.run(object_ids, apply, job)
+
+    def set_channel_property(
+        self,
+        channels: Iterable[ChannelRow],
+        name: str,
+        value: str,
+        job: journal.Journal = None,
+    ) -> Iterator[ItemResult]:
+        """Set a property on many sensor channels, channels are streamed through the pool"""
+
+        def apply(row: ChannelRow) -> None:
+            write_channel_property(self.prtg, row, name, value)
+
+        return self.run(channels, apply, job, channel_key)
+
+    def set_thresholds(
+        self, channels: Iterable[ChannelRow], job: journal.Journal = None
+    ) -> Iterator[ItemResult]:
+        """
+        Set the warning and error thresholds of many channels and enable their limits.
+
+        Each channel's own warning, error and limitmode values are written,
+        limitmode defaults to 1 once a threshold is set, since a threshold
+        only takes effect with the limits enabled. The value of each result
+        is the list of (property, value) written, a channel without any
+        value fails with ValueError.
+        """
+        return self.run(channels, lambda row: apply_thresholds(self.prtg, row), job, channel_key)
+
+    def update_tags(
+        self,
+        edits: dict,
+        current: dict = None,
+        job: journal.Journal = None,
+        on_result: Callable[[ItemResult], None] = None,
+        removing: bool = False,
+    ) -> TagResult:
+        """
+        Apply per-device edits, edit(TagSet) -> TagSet, to the tags of many devices.
+
+        Devices are updated concurrently: their own tags are read, so
+        inherited tags are never written onto the device, edited and
+        written. The new tags are verified with one more batched read,
+        which is also written through to the inventory cache.
+        on_result is called with each update as it finishes.
+
+        With removing, for edits that only remove tags, a batched table.json
+        read first skips devices whose tags would not change, unless the
+        current tags are passed in. table.json lists inherited tags too, so
+        a tag missing there is not on the device itself either. A tag it
+        shows may only be inherited, so edits that add tags are always
+        decided on the device's own tags.
+
+        With a job every update is journaled and devices it already updated
+        are skipped, see journal.open_job.
+        """
+        device_ids = [*edits]
+        pending = device_ids
+        result = TagResult()
+
+        if removing and current is None:
+            current = read_tags(self.prtg, device_ids)
+            pending = []
+            for device in device_ids:
+                tag_set = TagSet(current.get(device, ""))
+                if device in current and edits[device](tag_set) == tag_set:
+                    result.unchanged.append(device)
+                else:
+                    pending.append(device)
+
+        def update(device: str) -> str | None:
+            own_tags = TagSet(read_own_tags(self.prtg, device))
+            new_tags = edits[device](own_tags)
+            if new_tags == own_tags:
+                return None
+
+            write_object_property(self.prtg, device, "tags", str(new_tags))
+            return device
+
+        if job is not None:
+            job.plan(pending)
+        updated = []
+        for item in self.run(pending, update, job):
+            if on_result is not None:
+                on_result(item)
+            if not item.ok:
+                result.failed[item.item] = item.error
+            elif item.value is None:
+                result.unchanged.append(item.item)
+            else:
+                updated.append(item.value)
+
+        if updated:
+            new_tags = read_tags(self.prtg, updated)
+            result.updated = {device: new_tags[device] for device in device_ids if device in new_tags}
+            # the cache holds table.json tags, inherited ones included, not the own tags written
+            for device, tags in result.updated.items():
+                inventory.update_tags(self.core, device, tags)
+        return result
+
+    def add_tags(self, device_ids: List[str], tags: str, job: journal.Journal = None) -> TagResult:
+        tags = TagSet(tags)
+        return self.update_tags(dict.fromkeys(device_ids, lambda current: current | tags), job=job)
+
+    def remove_tags(
+        self, device_ids: List[str], tags: str, job: journal.Journal = None
+    ) -> TagResult:
+        tags = TagSet(tags)
+        return self.update_tags(
+            dict.fromkeys(device_ids, lambda current: current - tags), job=job, removing=True
+        )
+
+    def duplicate(
+        self,
+        source_sensors: List[str],
+        sensor_name: str,
+        target_devices: List[str],
+        job: journal.Journal = None,
+    ) -> Iterator[ItemResult]:
+        """
+        Copy sensors onto many devices as sensor_name and activate the copies.
+
+        Devices that already have a sensor of that name are skipped. Every
+        existence check is answered from one batched read of the targets'
+        sensors from the core itself, never the inventory cache, which may
+        not list sensors created since its last refresh. The value of each
+        device's result maps every source sensor to its new sensor ID, or to
+        None when it was skipped. A device listed twice is updated once, so
+        no two workers copy onto the same device.
+        """
+        target_devices = [*dict.fromkeys(target_devices)]
+        existing = sensor_index(self.core, target_devices, self.prtg.token, use_cache=False)
+
+        def apply(target_id: str) -> dict:
+            applied = {}
+            for sensor_id in source_sensors:
+                if (target_id, sensor_name) in existing:
+                    applied[sensor_id] = None
+                    continue
+
+                applied[sensor_id] = duplicate_sensor(self.prtg, sensor_id, sensor_name, target_id)
+                existing.add((target_id, sensor_name))
+            return applied
+
+        if job is not None:
+            job.plan(target_devices)
+        return self.run(target_devices, apply, job)
+
+    def pause(
+        self,
+        object_ids: List[str],
+        message: str = None,
+        duration: int = None,
+        on_chunk: Callable[[int, int], None] = None,
+    ) -> PauseResult:
+        return self.change_pause(object_ids, True, message, duration, on_chunk)
+
+    def resume(
+        self, object_ids: List[str], on_chunk: Callable[[int, int], None] = None
+    ) -> PauseResult:
+        return self.change_pause(object_ids, False, on_chunk=on_chunk)
+
+    def change_pause(
+        self,
+        object_ids: List[str],
+        paused: bool,
+        message: str = None,
+        duration: int = None,
+        on_chunk: Callable[[int, int], None] = None,
+    ) -> PauseResult:
+        """
+        Pause or resume many objects with multi-ID requests, then confirm in one query.
+
+        IDs are sent PAUSE_CHUNK at a time in one pause.htm call. A chunk the
+        core rejects is retried one ID per request, so a single bad ID only
+        fails itself. Chunks run concurrently, paced by the core's scheduler.
+        on_chunk is called with the number of objects changed and sent for
+        every chunk as it finishes.
+        """
+        chunks = [
+            object_ids[start : start + PAUSE_CHUNK]
+            for start in range(0, len(object_ids), PAUSE_CHUNK)
+        ]
+        result = PauseResult(paused)
+
+        def send(chunk: List[str]) -> dict:
+            try:
+                set_paused(self.prtg, chunk, paused, message, duration)
+                return {}
+            except ValueError:
+                if len(chunk) == 1:
+                    raise
+
+            single = [[objid] for objid in chunk]
+            return {
+                item.item[0]: item.error
+                for item in bulk.run(single, send, max_workers=self.workers)
+                if not item.ok
+            }
+
+        for item in self.run(chunks, send):
+            errors = item.value if item.ok else dict.fromkeys(item.item, item.error)
+            result.failed.update(errors)
+            if on_chunk is not None:
+                on_chunk(len(item.item) - len(errors), len(item.item))
+
+        statuses = read_statuses(self.prtg, object_ids)
+        for objid in object_ids:
+            if (statuses.get(objid) in PAUSED_STATUSES) == paused:
+                result.confirmed.append(objid)
+            else:
+                result.unconfirmed.append(objid)
+        return result
+
+
+class AsyncPRTGClient:
+    """
+    PRTGClient for asyncio code, every method is a coroutine.
+
+    The PRTG API is plain HTTP over pooled keep-alive sessions, so each call
+    runs the batched PRTGClient method in a worker thread. Many calls can be
+    awaited at once, the core's scheduler still paces the writes they send.
+    Methods that stream on PRTGClient return lists here.
+    """
+
+    def __init__(
+        self, core: str, token: str = None, workers: int = 8, use_cache: bool = True
+    ):
+        self.sync = PRTGClient(core, token, workers, use_cache)
+
+    async def _call(self, method: str, *args, **kwargs):
+        def call():
+            result = getattr(self.sync, method)(*args, **kwargs)
+            return list(result) if isinstance(result, Iterator) else result
+
+        return await asyncio.to_thread(call)
+
+    async def devices(self, *args, **kwargs) -> List[dict]:
+        return await self._call("devices", *args, **kwargs)
+
+    async def sensors(self, *args, **kwargs) -> List[dict]:
+        return await self._call("sensors", *args, **kwargs)
+
+    async def tags(self, device_ids: List[str]) -> dict:
+        return await self._call("tags", device_ids)
+
+    async def own_tags(self, device_ids: List[str]) -> List[ItemResult]:
+        return await self._call("own_tags", device_ids)
+
+    async def get_property(self, object_ids: List[str], name: str) -> List[ItemResult]:
+        return await self._call("get_property", object_ids, name)
+
+    async def set_property(self, object_ids: List[str], name: str, value: str) -> List[ItemResult]:
+        return await self._call("set_property", object_ids, name, value)
+
+    async def channel_property(self, channels: List[ChannelRow], name: str) -> List[ItemResult]:
+        return await self._call("channel_property", channels, name)
+
+    async def set_channel_property(
+        self, channels: List[ChannelRow], name: str, value: str
+    ) -> List[ItemResult]:
+        return await self._call("set_channel_property", channels, name, value)
+
+    async def set_thresholds(self, channels: List[ChannelRow]) -> List[ItemResult]:
+        return await self._call("set_thresholds", channels)
+
+    async def statuses(self, object_ids: List[str]) -> dict:
+        return await self._call("statuses", object_ids)
+
+    async def sensor_names(self, sensor_ids: List[str]) -> dict:
+        return await self._call("sensor_names", sensor_ids)
+
+    async def add_tags(self, device_ids: List[str], tags: str) -> TagResult:
+        return await self._call("add_tags", device_ids, tags)
+
+    async def remove_tags(self, device_ids: List[str], tags: str) -> TagResult:
+        return await self._call("remove_tags", device_ids, tags)
+
+    async def update_tags(
+        self, edits: dict, current: dict = None, removing: bool = False
+    ) -> TagResult:
+        return await self._call("update_tags", edits, current, removing=removing)
+
+    async def duplicate(
+        self, source_sensors: List[str], sensor_name: str, target_devices: List[str]
+    ) -> List[ItemResult]:
+        return await self._call("duplicate", source_sensors, sensor_name, target_devices)
+
+    async def pause(
+        self, object_ids: List[str], message: str = None, duration: int = None
+    ) -> PauseResult:
+        return await self._call("pause", object_ids, message, duration)
+
+    async def resume(self, object_ids: List[str]) -> PauseResult:
+        return await self._call("resume", object_ids)
+
+
+# ========================= Requests ===========================================
+
+
+def read_tags(prtg: CoreClient, device_ids: List[str]) -> dict:
+    """
+    Read the tags column of many devices with batched table.json queries.
+
+    Returns a dict of device ID to tag string, devices the core does not
+    know are left out.
+    """
+    url_params = {"content": "devices", "columns": "objid,tags", "output": "json"}
+
+    return {
+        str(device["objid"]): device["tags"]
+        for device in prtg.read_objids(url_params, "devices", device_ids)
+    }
+
+
+def read_object_property(prtg: CoreClient, object_id: str, name: str) -> str:
+    """A property of one object, raising ValueError with the core's message"""
+    return local_base.read_property(prtg.request("get_prop", {"id": object_id, "name": name}))
+
+
+def write_object_property(prtg: CoreClient, object_id: str, name: str, value: str) -> None:
+    params = {"id": object_id, "name": name, "value": value}
+    local_base.read_property(prtg.request("set_prop", params))
+
+
+def channel_params(row: ChannelRow, name: str, value: str = None) -> dict:
+    if row.subid is None:
+        raise ValueError("no channel subid given")
+    params = {"id": row.objid, "subtype": "channel", "subid": row.subid, "name": name}
+    if value is not None:
+        params["value"] = value
+    return params
+
+
+def channel_key(row: ChannelRow) -> str:
+    """The channel in job journals, objid:subid"""
+    return f"{row.objid}:{row.subid}"
+
+
+def read_channel_property(prtg: CoreClient, row: ChannelRow, name: str) -> str:
+    return local_base.read_property(prtg.request("get_prop", channel_params(row, name)))
+
+
+def write_channel_property(prtg: CoreClient, row: ChannelRow, name: str, value: str) -> None:
+    local_base.read_property(prtg.request("set_prop", channel_params(row, name, value)))
+
+
+def apply_thresholds(prtg: CoreClient, row: ChannelRow) -> list:
+    """Write a channel's thresholds and limit mode, returning (property, value) written"""
+    applied = []
+    for name, threshold in (("limitminwarning", row.warning), ("limitminerror", row.error)):
+        if threshold is not None:
+            write_channel_property(prtg, row, name, threshold)
+            applied.append((name, threshold))
+
+    # a new threshold only takes effect once the channel limits are enabled
+    limitmode = row.limitmode or ("1" if applied else None)
+    if limitmode is None:
+        raise ValueError("no warning, error or limitmode value for this row")
+
+    write_channel_property(prtg, row, "limitmode", limitmode)
+    applied.append(("limitmode", limitmode))
+    return applied
+
+
+def read_own_tags(prtg: CoreClient, device_id: str) -> str:
+    """
+    Read the tags set on the device itself, without inherited tags.
+
+    Raises ValueError with the core's message when the device can't be read.
+    """
+    return read_object_property(prtg, device_id, "tags") or ""
+
+
+def read_statuses(prtg: CoreClient, object_ids: List[str]) -> dict:
+    """Raw status of every object, sensors and devices alike, from batched table queries"""
+    statuses = {}
+    remaining = object_ids
+    for content in ("sensors", "devices"):
+        if not remaining:
+            break
+        url_params = {"content": content, "columns": "objid,status", "output": "json"}
+        for obj in prtg.read_objids(url_params, content, remaining):
+            statuses[str(obj["objid"])] = str(obj.get("status_raw"))
+        remaining = [objid for objid in remaining if objid not in statuses]
+    return statuses
+
+
+def duplicate_sensor(
+    prtg: CoreClient, sensor_id: str, sensor_name: str, target_id: str
+) -> str:
+    """
+    Duplicate a sensor onto a device and activate the copy.
+
+    Returns the object ID of the new sensor.
+    """
+    url_params = {"id": sensor_id, "name": sensor_name, "targetid": target_id}
+
+    response_text = prtg.request("duplicate", url_params)
+
+    # the response text will have the new sensor ID embedded within it
+    # the folloing lines uses regex to pull out that id
+    matches = NEW_SENSOR_ID.search(response_text)
+    if matches is None:
+        raise ValueError(f"no sensor id in duplicate response for {sensor_id}")
+    new_id = matches.group("sensor_id")
+
+    # When copied, sensor will be paused
+    wait_for_sensor(prtg, new_id)
+    set_paused(prtg, new_id, paused=False)
+    inventory.upsert(
+        prtg.core, "sensors", {"objid": int(new_id), "name": sensor_name, "parentid": target_id}
+    )
+    return new_id
+
+
+def wait_for_sensor(prtg: CoreClient, sensor_id: str, timeout: float = 30.0) -> None:
+    """Poll the core until the sensor is listed, instead of sleeping a fixed time"""
+    url_params = {
+        "content": "sensors", "columns": "objid", "filter_objid": sensor_id, "output": "json"
+    }
+    deadline = time.monotonic() + timeout
+    interval = 0.1
+
+    while True:
+        if prtg.request(params=url_params)["sensors"]:
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"sensor {sensor_id} not created after {timeout}s")
+        profiling.sleep(interval, "wait_for_sensor")
+        interval = min(interval * 2, 2.0)
+
+
+def set_paused(
+    prtg: CoreClient,
+    sensor_id: str | List[str],
+    paused: bool,
+    message: str = None,
+    duration: int = None,
+) -> None:
+    """
+    Pause or resume one object, or several in one request when given a list.
+
+    A duration in minutes pauses with pauseobjectfor.htm, the core resumes
+    the objects on its own afterwards. Raises ValueError when the core
+    rejects the request.
+    """
+    # + f"pause.htm?id={sensor_id}&action=0&apitoken={token}"
+    if not isinstance(sensor_id, str):
+        sensor_id = ",".join(sensor_id)
+    url_params = {"id": sensor_id, "action": 0 if paused else 1, "pausemsg": message}
+
+    if paused and duration is not None:
+        del url_params["action"]
+        url_params["duration"] = duration
+        local_base.read_property(prtg.request("pause_for", url_params))
+    else:
+        local_base.read_property(prtg.request("pause", url_params))
+
+
+# ========================= Sensor lookups =====================================
+
+
+def sensor_index(
+    core: str, device_ids: List[str], token: str = None, use_cache: bool = True
+) -> set[tuple[str, str]]:
+    """
+    (device ID, sensor name) of every sensor on the given devices.
+
+    The sensors are read in one pass, from the inventory cache or from the
+    core in batched filter_parentid queries, so checking thousands of
+    device and sensor pairs costs no further requests. Their names are
+    remembered for sensor_names.
+    """
+    if use_cache:
+        sensors = cached_sensors(core, "parentid", device_ids)
+    else:
+        prtg = config.get_client(core, token)
+        url_params = {"content": "sensors", "columns": "objid,name,parentid", "output": "json"}
+        sensors = prtg.read_filtered(url_params, "sensors", "parentid", device_ids)
+
+    index = set()
+    for sensor in sensors:
+        index.add((str(sensor["parentid"]), sensor["name"]))
+        remember_name(core, str(sensor["objid"]), sensor["name"])
+    return index
+
+
+def cached_sensors(core: str, column: str, values: Iterable[str]) -> Iterator[dict]:
+    """Cached sensors whose column is any of values, SQL_CHUNK values per query"""
+    values = [int(value) for value in values]
+    for start in range(0, len(values), SQL_CHUNK):
+        chunk = values[start : start + SQL_CHUNK]
+        where = f"{column} IN ({', '.join('?' for _ in chunk)})"
+        for page in inventory.select_pages(core, "sensors", where, chunk):
+            yield from page
+
+
+def sensor_names(core: str, sensor_ids: List[str], token: str = None) -> dict[str, str]:
+    """
+    Names of many sensors by ID, memoised for the whole run.
+
+    IDs not seen before are read from the inventory cache in one query, and
+    whatever it lacks from the core in batched filter_objid queries. The
+    last NAME_CACHE_SIZE names are kept. IDs the core doesn't know are left
+    out.
+    """
+    sensor_ids = [*dict.fromkeys(str(sensor_id) for sensor_id in sensor_ids)]
+    names = {}
+    with _names_lock:
+        for sensor_id in sensor_ids:
+            if (core, sensor_id) in _names:
+                _names.move_to_end((core, sensor_id))
+                names[sensor_id] = _names[(core, sensor_id)]
+
+    missing = [sensor_id for sensor_id in sensor_ids if sensor_id not in names]
+    for sensor in cached_sensors(core, "objid", missing):
+        names[str(sensor["objid"])] = sensor["name"]
+
+    missing = [sensor_id for sensor_id in missing if sensor_id not in names]
+    if missing:
+        prtg = config.get_client(core, token)
+        url_params = {"content": "sensors", "columns": "objid,name", "output": "json"}
+        for sensor in prtg.read_objids(url_params, "sensors", missing):
+            names[str(sensor["objid"])] = sensor["name"]
+
+    for sensor_id, name in names.items():
+        remember_name(core, sensor_id, name)
+    return names
+
+
+def remember_name(core: str, sensor_id: str, name: str) -> None:
+    with _names_lock:
+        _names[(core, sensor_id)] = name
+        _names.move_to_end((core, sensor_id))
+        if len(_names) > NAME_CACHE_SIZE:
+            _names.popitem(last=False)
@@ -0,0 +1,142 @@
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator
+
+
+@dataclass
+class ItemResult:
+    """Outcome of one item of a bulk operation"""
+
+    item: Any
+    ok: bool
+    value: Any = None
+    error: str | None = None
+    elapsed: float = 0.0
+
+
+class Throughput:
+    """Running count of finished items and the rate they complete at"""
+
+    def __init__(self, total: int | None = None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def add(self, result: ItemResult) -> None:
+        if result.ok:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return (self.done + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def line(self) -> str:
+        finished = self.done + self.failed
+        total = f"/{self.total}" if self.total is not None else ""
+        return (
+            f"{finished}{total} finished, {self.failed} failed, "
+            f"{self.rate:.2f} items/s"
+        )
+
+
+@contextmanager
+def graceful_interrupt() -> Iterator[threading.Event]:
+    """
+    Turn the first Ctrl-C into a stop request, set on the yielded event.
+
+    A second Ctrl-C raises KeyboardInterrupt as usual. Only the main thread
+    receives signals, elsewhere the event is never set.
+    """
+    stop = threading.Event()
+    if threading.current_thread() is not threading.main_thread():
+        yield stop
+        return
+
+    def handle(signum, frame) -> None:
+        if stop.is_set():
+            raise KeyboardInterrupt
+        stop.set()
+        print("Stopping after the requests in flight, Ctrl-C again to abort", file=sys.stderr)
+
+    previous = signal.signal(signal.SIGINT, handle)
+    try:
+        yield stop
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+def run(
+    items: Iterable,
+    worker: Callable[[Any], Any],
+    max_workers: int = 8,
+    interruptible: bool = False,
+) -> Iterator[ItemResult]:
+    """
+    Run worker(item) for every item on a bounded thread pool.
+
+    Items are pulled lazily, at most two per worker are in flight at a time,
+    so very large inputs are never held in memory. The load on each core is
+    paced by its scheduler, which every write goes through. Results are
+    yielded in completion order as soon as each item finishes.
+
+    With interruptible, for the CLI commands, Ctrl-C stops pulling items:
+    queued items are dropped, the requests already sent are drained and
+    their results yielded, then KeyboardInterrupt is raised. Otherwise the
+    process's SIGINT handler is left alone, as a library must.
+    """
+
+    def call(item) -> ItemResult:
+        started = time.monotonic()
+        try:
+            value = worker(item)
+        except Exception as e:
+            return ItemResult(
+                item, False, error=f"{type(e).__name__}: {e}",
+                elapsed=time.monotonic() - started,
+            )
+        return ItemResult(item, True, value, elapsed=time.monotonic() - started)
+
+    items = iter(items)
+    max_in_flight = max_workers * 2
+
+    interrupts = graceful_interrupt() if interruptible else nullcontext(threading.Event())
+    with interrupts as stop, ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="bulk"
+    ) as pool:
+        in_flight = set()
+        exhausted = False
+        interrupted = False
+
+        while in_flight or not exhausted:
+            if stop.is_set() and not exhausted:
+                exhausted = interrupted = True
+                for future in in_flight:
+                    future.cancel()
+
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight.add(pool.submit(call, item))
+
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.cancelled():
+                    yield future.result()
+
+    if interrupted:
+        raise KeyboardInterrupt
@@ -1,44 +1,116 @@
-from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from enum import Enum
 from pathlib import Path
-import time
-from typing import Optional
+from typing import Callable, Iterator, Optional
 import typer
 import config
 from rich import print
 from typing_extensions import Annotated
-import local_base
 import csv
-import xmltodict
+
+import api
+import bulk
+import history
+import journal
+import terminal_outputs as outputs
 
 
 app = typer.Typer(no_args_is_help=True, rich_markup_mode="rich")
 
 
-@dataclass
-class QueryParams:
-    action: Optional[int] = None
-    apitoken: Optional[str] = None
-    columns: Optional[str] = None
-    content: Optional[str] = None
-    count: Optional[str] = None
-    filter_name: Optional[str] = None
-    filter_objid: Optional[str] = None
-    filter_tags: Optional[list[str]] = None
-    id: Optional[str] = None
-    name: Optional[str] = None
-    output: Optional[str] = None
-    subtype: Optional[str] = "channel"
-    subid: Optional[int] = None
-    targetid: Optional[int] = None
-    value: Optional[str] = None
+class Output(str, Enum):
+    text = "text"
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+# fields of the per-row results written with --output csv or ndjson
+RESULT_FIELDS = ["objid", "subid", "status", "property", "value", "message"]
+
+
+def read_rows(sensor_id: Optional[str], file: Optional[Path], **defaults) -> Iterator[api.ChannelRow]:
+    """
+    Yield channel rows one at a time, so files of any size stream through.
+
+    Values on --sensor_id take precedence over the file. CSV columns
+    besides objid are optional, missing ones take the value given on the
+    command line.
+    """
+    if sensor_id is not None:
+        for objid in sensor_id.replace(",", " ").split():
+            yield api.ChannelRow(objid, **defaults)
+        return
+
+    with open(file, newline="") as f:
+        for row in csv.DictReader(f, delimiter=","):
+            values = {
+                key: (row.get(key) or "").strip() or default
+                for key, default in defaults.items()
+            }
+            yield api.ChannelRow(row["objid"].strip(), **values)
+
+
+def has_column(file: Optional[Path], column: str) -> bool:
+    """Whether a CSV file has column, only its header is read"""
+    if file is None:
+        return False
+    with open(file, newline="") as f:
+        return column in (csv.DictReader(f, delimiter=",").fieldnames or [])
+
+
+def report_rows(
+    results: Iterator[bulk.ItemResult],
+    messages: Callable[[api.ChannelRow, object], list],
+    output: Output,
+) -> None:
+    """
+    Report every channel result as it finishes.
+
+    messages turns a row and its result value into (property, value,
+    message) lines. With --output csv or ndjson one record is written per
+    line, failed rows included, and the command exits 1 when any row
+    failed.
+    """
+    progress = bulk.Throughput()
+    writer = None if output == Output.text else outputs.RecordWriter(output.value, RESULT_FIELDS)
+
+    for result in results:
+        progress.add(result)
+        row = result.item
+        lines = messages(row, result.value) if result.ok else [(None, None, result.error)]
+
+        for name, value, message in lines:
+            if writer is not None:
+                writer.write(
+                    {
+                        "objid": row.objid,
+                        "subid": row.subid,
+                        "status": "ok" if result.ok else "failed",
+                        "property": name,
+                        "value": value,
+                        "message": message,
+                    }
+                )
+            elif result.ok:
+                print(message)
+            else:
+                print(f"[bold red]Sensor {row.objid} failed: {message}")
+
+    if writer is None:
+        print()
+        print(progress.line())
+    if progress.failed:
+        raise typer.Exit(1)
 
 
 # setobjectproperty.htm?id=[OBJID]&subtype=channel&subid=0&name=limitmode&value=0
 @app.command(no_args_is_help=True)
 def state(
     core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
-    subid: Annotated[str, typer.Option(help="channel ID")],
-    sensor_id: Annotated[str, typer.Option(help="ID of the target sensor")] = None,
+    subid: Annotated[str, typer.Option(help="channel ID, or a subid column in --file")] = None,
+    sensor_id: Annotated[
+        str, typer.Option("--sensor_id", "--sensor-id", help="IDs of the target sensors")
+    ] = None,
     file: Annotated[
         Path,
         typer.Option(
@@ -60,6 +132,11 @@ def state(
     disable: Annotated[
         bool, typer.Option("--disable", help="Disables the channel limits")
     ] = False,
+    output: Annotated[
+        Output,
+        typer.Option("--output", "-o", help="Output format of the results", case_sensitive=False),
+    ] = Output.text,
+    workers: Annotated[int, typer.Option(help="Number of sensors processed at once")] = 8,
 ) -> None:
     """set or list the state of a sensor channel
 
@@ -76,6 +153,7 @@ def state(
     Note:
         1. Values on --sensor_id take preceedent over --file values
         2. Only comma delimited csv files are supported at this time
+        3. The file needs an objid column, a subid column overrides --subid per row
 
     Returns:
         None
@@ -86,60 +164,45 @@ def state(
         print("Must enter sensor_id via the --sensor_id or --file flag")
         raise typer.Exit(1)
 
-    # TODO: add functionality to take each id and run the request, Might need to make its own function
-    if sensor_id is not None:
-        file = None
-
-    # reading in given file
-    f = open(file, "r")
-    reader = csv.DictReader(f, delimiter=",")
-
-    token = config.get_token(core)
+    if subid is None and (sensor_id is not None or not has_column(file, "subid")):
+        print("Missing Arguments")
+        print("Must enter a channel via the --subid flag or a subid column in --file")
+        raise typer.Exit(1)
 
-    url_params = asdict(QueryParams(subid=subid, apitoken=token))
+    prtg = api.PRTGClient(core, token, workers, interruptible=True)
+    rows = read_rows(sensor_id, file, subid=subid)
 
     if enable or disable:
-        url_params["value"] = 1 if enable else 0
+        limitmode = "1" if enable else "0"
         action = "Enabling" if enable else "Pausing"
-        url = local_base.base_url(core, action="set_prop")
-
-        for row in reader:
-            objid = row["objid"]
-            print(f"{action} channel: {url_params['subid']} for sensor: {objid}")
-            url_params["id"] = objid
-            local_base.PRTG_Get_request(url, url_params)
-            print()
-    else:
+
+        def changed(row: api.ChannelRow, value) -> list:
+            message = f"{action} channel: {row.subid} for sensor: {row.objid}"
+            return [("limitmode", limitmode, message)]
+
+        report_rows(prtg.set_channel_property(rows, "limitmode", limitmode), changed, output)
+        return
+
+    if output == Output.text:
         print("Current Channel Status ")
         print("===============")
-        # TODO: i want the action param to fill with predetermined values
-        url = local_base.base_url(core, action="get_prop")
-        for row in reader:
-            objid = row["objid"]
-            url_params["id"] = objid
-            limit_xml = local_base.PRTG_Get_request(url, url_params)
-            status = xmltodict.parse(limit_xml)["prtg"]
 
-            # TODO: this try/catch  needs to be a function of its own with `getobjectproperty`
-            try:
-                # TODO: write a testcase for this happy path
-                print(f"For Sensor {objid}, threshold is: {status['result']}")
+    def read(row: api.ChannelRow, limitmode: str) -> list:
+        return [("limitmode", limitmode, f"For Sensor {row.objid}, threshold is: {limitmode}")]
 
-            except KeyError:
-                # TODO: Write a testcase for this error
-                print(f"[bold red]{status['error']}")
-
-            print()
-    # Closing the file to prevent Error
-    f.close()
+    report_rows(prtg.channel_property(rows, "limitmode"), read, output)
 
 
 @app.command(no_args_is_help=True)
 def set_threshold(
     core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
-    subid: Annotated[str, typer.Option(help="channel ID")],
-    value: Annotated[int, typer.Option(help="Set the threshold value")],
-    sensor_id: Annotated[str, typer.Option(help="ID of the target sensor")] = None,
+    subid: Annotated[str, typer.Option(help="channel ID, or a subid column in --file")] = None,
+    value: Annotated[
+        int, typer.Option(help="Set the threshold value, or warning/error columns in --file")
+    ] = None,
+    sensor_id: Annotated[
+        str, typer.Option("--sensor_id", "--sensor-id", help="IDs of the target sensors")
+    ] = None,
     file: Annotated[
         Path,
         typer.Option(
@@ -161,14 +224,42 @@ def set_threshold(
     error: Annotated[
         bool, typer.Option("--error", help="Sets the error threshold")
     ] = False,
+    output: Annotated[
+        Output,
+        typer.Option("--output", "-o", help="Output format of the results", case_sensitive=False),
+    ] = Output.text,
+    workers: Annotated[int, typer.Option(help="Number of sensors processed at once")] = 8,
+    resume: Annotated[
+        str, typer.Option(help="Job to finish, channels it already set are skipped")
+    ] = None,
 ) -> None:
+    """
+    Set the warning or error threshold of sensor channels and enable their limits.
+
+    With --file every row can carry its own values in the optional columns
+    subid, warning, error and limitmode, for example:
+
+    objid,subid,warning,error
+    54321,0,80,95
+    25964,2,,90
+
+    Rows are streamed through a bounded worker pool, so files with tens of
+    thousands of sensors are never loaded whole. Writes are paced by the
+    core's scheduler. Every channel is recorded in a job journal, a run cut
+    short is finished with --resume <job>.
+    """
 
     if sensor_id is None and file is None:
         print("Missing Arguments")
         print("Must enter sensor_id via the --sensor_id or --file flag")
         raise typer.Exit(1)
 
-    if not warning and not error:
+    if subid is None and (sensor_id is not None or not has_column(file, "subid")):
+        print("Missing Arguments")
+        print("Must enter a channel via the --subid flag or a subid column in --file")
+        raise typer.Exit(1)
+
+    if value is not None and not warning and not error:
         print(
             "Please enter the type of limit being set with the --warning or --error flag"
         )
@@ -178,37 +269,147 @@ def set_threshold(
         print("Only one type of limit can be set per command line entry")
         raise typer.Exit(1)
 
-    # TODO: add functionality to take each id and run the request, Might need to make its own function
-    if sensor_id is not None:
-        file = None
+    if value is None and file is None:
+        print("Must enter a threshold with --value, or warning/error columns with --file")
+        raise typer.Exit(1)
 
-    # reading in given file
-    f = open(file, "r")
-    reader = csv.DictReader(f, delimiter=",")
+    prtg = api.PRTGClient(core, token, workers, interruptible=True)
+    value = None if value is None else str(value)
+    rows = read_rows(
+        sensor_id,
+        file,
+        subid=subid,
+        warning=value if warning else None,
+        error=value if error else None,
+        limitmode=None,
+    )
+
+    def applied(row: api.ChannelRow, written: list) -> list:
+        lines = []
+        for name, threshold in written:
+            if name == "limitmode":
+                message = f"Setting limitmode {threshold} on channel: {row.subid} for sensor: {row.objid}"
+            else:
+                message = f"Applying {name} threshold to channel: {row.subid} for sensor: {row.objid}"
+            lines.append((name, threshold, message))
+        return lines
+
+    job = journal.open_job(
+        "set_threshold", core, resume, sensor_id=sensor_id, file=file, subid=subid, value=value
+    )
+    with journal.reporting(job):
+        report_rows(prtg.set_thresholds(rows, job), applied, output)
 
-    token = config.get_token(core)
-    url = local_base.base_url(core, action="set_prop")
-    url_params = asdict(QueryParams(value=value, subid=subid, apitoken=token))
 
-    for row in reader:
-        objid = row["objid"]
-        url_params["id"] = objid
-        url_params["name"] = "limitminwarning" if warning else "limitminerror"
-        url_params['value'] = value
-        print(
-            f"Applying {url_params['name']} threshold to channel: {url_params['subid']} for sensor: {objid}"
-        )
-        # set the threshold
-        local_base.PRTG_Get_request(url, url_params)
-        time.sleep(.5)
+@app.command(no_args_is_help=True)
+def export(
+    core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
+    directory: Annotated[
+        Path, typer.Argument(file_okay=False, help="Folder the CSV files are written to")
+    ],
+    start: Annotated[
+        datetime,
+        typer.Option(formats=["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"], help="First moment to export"),
+    ],
+    end: Annotated[
+        datetime,
+        typer.Option(
+            formats=["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"],
+            help="End of the export, by default the end of the last whole window",
+        ),
+    ] = None,
+    sensor_id: Annotated[
+        str, typer.Option("--sensor_id", "--sensor-id", help="IDs of the sensors to export")
+    ] = None,
+    file: Annotated[
+        Path,
+        typer.Option(
+            "--file",
+            "-f",
+            exists=True,
+            dir_okay=False,
+            resolve_path=True,
+            help="File to read in object IDs",
+        ),
+    ] = None,
+    window: Annotated[
+        float, typer.Option(min=0.01, help="Days of data fetched per request")
+    ] = 7,
+    average: Annotated[
+        int, typer.Option(min=0, help="Seconds averaged into one row, 0 for raw values")
+    ] = 0,
+    token: Annotated[str, typer.Option(help="User token for the given core")] = None,
+    workers: Annotated[int, typer.Option(help="Number of windows fetched at once")] = 8,
+) -> None:
+    """
+    Export the historic data of every channel of many sensors to CSV files.
 
-        print(
-            f"Enabling {url_params['name']} threshold to channel: {url_params['subid']} for sensor: {objid}"
-        )
-        url_params["name"] = "limitmode"
-        url_params["value"] = 1
-        local_base.PRTG_Get_request(url, url_params)
-        time.sleep(.5)
-        print()
+    [Examples]
+    - A year of raw data of the sensors in a file
+    prtg channel export serveronprem ./capacity --start 2024-01-01 --end 2025-01-01 --file sensors.csv
+
+    The time range is split into windows of --window days, fetched in
+    parallel from historicdata.json and paced by the core's scheduler.
+    Each window is written to DIRECTORY/<objid>/<start>_<end>.csv as soon
+    as it arrives, with a column per channel, so memory holds a few windows
+    at most whatever the range. Running the same command again skips the
+    windows already written, a cut short export just picks up the rest.
+    Without --end only whole windows up to now are exported, a later run
+    adds the windows completed since.
+
+    Note:
+        PRTG only serves raw data (--average 0) for up to 40 days per
+        request, larger windows need an --average such as 3600.
+    """
 
-    f.close()
+    if sensor_id is None and file is None:
+        print("Missing Arguments")
+        print("Must enter sensor_id via the --sensor_id or --file flag")
+        raise typer.Exit(1)
+
+    length = timedelta(days=window)
+    if end is None:
+        # only whole windows, a window still filling up would get a new name every run
+        end = start + length * ((datetime.now() - start) // length)
+        if end <= start:
+            print("No whole window has passed since --start, give --end or a shorter --window")
+            raise typer.Exit(1)
+    elif end <= start:
+        print("--end must come after --start")
+        raise typer.Exit(1)
+
+    prtg = config.get_client(core, token)
+    # a --file row per channel still exports its sensor once
+    objids = [*dict.fromkeys(row.objid for row in read_rows(sensor_id, file))]
+    skipped = 0
+
+    def pending() -> Iterator[history.Window]:
+        nonlocal skipped
+        for item in history.windows(objids, start, end, length):
+            if item.path(directory).exists():
+                skipped += 1
+                continue
+            yield item
+
+    progress = bulk.Throughput()
+    rows = 0
+    results = bulk.run(
+        pending(),
+        lambda item: history.export_window(prtg, item, directory, average),
+        workers,
+        interruptible=True,
+    )
+    for result in results:
+        progress.add(result)
+        if result.ok:
+            rows += result.value
+        else:
+            item = result.item
+            print(f"[bold red]Sensor {item.objid} {item.start} to {item.end} failed: {result.error}")
+
+    if skipped:
+        print(f"Skipped {skipped} windows already written")
+    print(progress.line())
+    print(f"Exported {rows} rows to {directory}")
+    if progress.failed:
+        raise typer.Exit(1)
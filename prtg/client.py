@@ -0,0 +1,262 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+import health
+import local_base
+import profiling
+import scheduler
+import table
+
+# actions that change the core, paced by the core's scheduler
+WRITE_ACTIONS = {"set_prop", "duplicate", "pause", "pause_for", "resume"}
+
+
+@dataclass
+class ClientSettings:
+    """
+    Connection settings shared by every core session.
+
+    Values can be overridden in the [Client] section of prtg_admin.cfg:
+    prtg config set pool_size 20 --section Client
+
+    max_concurrency is the number of writes sent to one core at once before
+    the scheduler adapts it to the core's latency and errors, page_size is
+    the number of rows requested per table.json page.
+    url_template is the address of a core, e.g. http://127.0.0.1:8080/{core}
+    to point every command at a local stand-in.
+
+    connect_timeout and read_timeout bound every single request.
+    fanout_timeout bounds a whole query sent to several cores at once, which
+    may be a download of many pages or a cache refresh per core, so it is
+    much larger.
+    """
+
+    pool_size: int = 10
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    retries: int = 3
+    backoff: float = 0.5
+    max_concurrency: int = 4
+    page_size: int = 2000
+    fanout_timeout: float = 900.0
+    url_template: str = "https://{core}.agency.ok.local"
+
+
+_sessions: dict[str, requests.Session] = {}
+_settings: ClientSettings | None = None
+_lock = threading.Lock()
+
+
+def load_settings() -> ClientSettings:
+    """Read the [Client] section of the config file, falling back to defaults"""
+    return config.read_section("Client", ClientSettings())
+
+
+def get_settings() -> ClientSettings:
+    """The [Client] settings, read again once the config file changes"""
+    global _settings
+
+    config.load_config()
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+def forget_settings() -> None:
+    """Drop the settings and the sessions built on them, requests in flight finish on theirs"""
+    global _settings
+
+    _settings = None
+    with _lock:
+        _sessions.clear()
+
+
+config.on_reload(forget_settings)
+
+
+def get_session(host: str) -> requests.Session:
+    """
+    Return the pooled keep-alive session for a core host, creating it on first use.
+
+    Only connection failures and 502/503/504 responses are retried. Read
+    timeouts are not, because the PRTG API performs writes (duplicate,
+    setobjectproperty) over GET and the core may already have applied them.
+    """
+    # read before taking the lock, a config reload clears the sessions under it
+    settings = get_settings()
+    with _lock:
+        session = _sessions.get(host)
+        if session is not None:
+            return session
+
+        retry = Retry(
+            total=settings.retries,
+            connect=settings.retries,
+            read=0,
+            status=settings.retries,
+            backoff_factor=settings.backoff,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.pool_size,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.headers.update(
+            {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _sessions[host] = session
+
+    return session
+
+
+def get(url: str, params: dict = None) -> requests.Response:
+    """
+    Send a GET request through the shared session of the url's core.
+
+    A core that keeps failing is skipped by its breaker: the request raises
+    health.CoreUnavailable at once instead of waiting on the core again.
+    """
+    settings = get_settings()
+    session = get_session(urlsplit(url).netloc)
+    core = core_name(url)
+    health.check(core)
+
+    started = time.perf_counter()
+    try:
+        response = session.get(
+            url,
+            params=params,
+            timeout=(settings.connect_timeout, settings.read_timeout),
+        )
+    except (requests.ConnectionError, requests.Timeout) as e:
+        health.record(core, False, type(e).__name__)
+        raise
+    health.record(core, response.status_code < 500, f"status {response.status_code}")
+    if profiling.enabled:
+        record(url, response, time.perf_counter() - started)
+    return response
+
+
+def record(url: str, response: requests.Response, seconds: float) -> None:
+    """Add a response to the profile, by core and endpoint"""
+    retries = getattr(response.raw, "retries", None)
+    profiling.record_request(
+        core_name(url),
+        url.rsplit("/", 1)[-1],
+        seconds,
+        response.status_code,
+        len(response.content),
+        len(retries.history) if retries is not None else 0,
+    )
+
+
+def check_status(response: requests.Response) -> requests.Response:
+    """
+    Raise for a response with an error status, return it otherwise.
+
+    PRTG explains rejected requests in an <error> element, raised as
+    ValueError by read_property. Other errors, such as a 503 left after the
+    retries, raise HTTPError. The message never includes the url, which
+    carries the API token.
+    """
+    if response.status_code < 400:
+        return response
+    local_base.read_property(response.text)
+    raise requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+
+
+def core_name(url: str) -> str:
+    """The core a url belongs to, its host when it is not a configured core"""
+    for core in local_base.cores:
+        if url.startswith(local_base.core_url(core.name)):
+            return core.name
+    return urlsplit(url).netloc
+
+
+def close() -> None:
+    """Close every open core session"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+@dataclass
+class CoreClient:
+    """
+    Everything needed to talk to one core: its URLs, API token and session.
+
+    Get one with config.get_client(core). Parameters passed to its methods
+    never need the token, None values are dropped.
+    """
+
+    core: str
+    token: str
+
+    @property
+    def session(self) -> requests.Session:
+        return get_session(urlsplit(self.url()).netloc)
+
+    def url(self, action: str = None) -> str:
+        """table.json url, or the url of an action such as set_prop"""
+        if action is None:
+            return local_base.query_url(self.core)
+        return local_base.base_url(self.core, action=action)
+
+    def with_token(self, params: dict = None) -> dict:
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        params["apitoken"] = self.token
+        return params
+
+    def request(self, action: str = None, params: dict = None):
+        """
+        Send a request, returning parsed JSON for table.json or the response
+        text of an action, whose endpoints answer XML or HTML.
+
+        Writes wait for a slot from the core's scheduler, server errors and
+        slow responses shrink its window. An action answered with a 4xx or
+        5xx status raises, with the core's <error> message when it sent one.
+        """
+        url = self.url(action)
+        params = self.with_token(params)
+        if action is None:
+            return local_base.PRTG_Get_request(url, params)
+        if action not in WRITE_ACTIONS:
+            return check_status(get(url, params)).text
+
+        with scheduler.for_core(self.core).slot() as slot:
+            response = get(url, params)
+            slot.ok = response.status_code < 500
+        return check_status(response).text
+
+    def read_pages(
+        self, params: dict, content: str, prefetch: bool = True
+    ) -> Iterator[list]:
+        return table.read_pages(self.url(), self.with_token(params), content, prefetch=prefetch)
+
+    def read_table(
+        self, params: dict, content: str, prefetch: bool = True
+    ) -> Iterator[dict]:
+        return table.read_table(self.url(), self.with_token(params), content, prefetch=prefetch)
+
+    def read_objids(self, params: dict, content: str, objids: list) -> Iterator[dict]:
+        return table.read_objids(self.url(), self.with_token(params), content, objids)
+
+    def read_filtered(
+        self, params: dict, content: str, column: str, values: list
+    ) -> Iterator[dict]:
+        return table.read_filtered(self.url(), self.with_token(params), content, column, values)
@@ -1,6 +1,9 @@
 import typer
 import configparser as cfp
 import os
+import threading
+from dataclasses import fields
+from typing import Callable
 from platformdirs import user_config_dir
 from typing_extensions import Annotated
 
@@ -11,6 +14,23 @@ configdir = user_config_dir()
 configfile = "prtg_admin.cfg"
 config_file_path = f"{configdir}/{configfile}"
 
+# modification time of the config file when it was last parsed
+_loaded_mtime = None
+_load_lock = threading.Lock()
+_reload_hooks = []
+_clients = {}
+
+class MissingToken(KeyError):
+    """Raised for a core without an API token in the config file"""
+
+    def __init__(self, core: str):
+        super().__init__(core)
+        self.core = core
+
+    def __str__(self) -> str:
+        return f"No Auth Token found, please set token for {self.core}: prtg config set {self.core} <token>"
+
+
 # TODO: allow the option to set a default core to query from 
 # TODO: create functionality to allow context/ core switching
 
@@ -32,25 +52,104 @@ def create_config_file():
     print(read_config_file())
 
 
+def load_config() -> cfp.ConfigParser:
+    """
+    Parse the config file once per process and again only when it changes.
+
+    The file's modification time is checked on every call, which costs a
+    stat instead of a full re-parse. Every hook registered with on_reload
+    is called after a parse.
+    """
+    global _loaded_mtime
+
+    try:
+        mtime = os.stat(config_file_path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    with _load_lock:
+        if mtime != _loaded_mtime:
+            for section in config.sections():
+                config.remove_section(section)
+            config.read(config_file_path)
+            _loaded_mtime = mtime
+            for hook in _reload_hooks:
+                hook()
+
+    return config
+
+
+def on_reload(hook: Callable[[], None]) -> None:
+    """
+    Call hook each time the config file is parsed, to forget settings read from it.
+
+    Hooks run with the config lock held, they must not read the config.
+    """
+    _reload_hooks.append(hook)
+
+
 def read_config_file(quiet: bool = False):
-    config.read(config_file_path)
+    load_config()
 
     if not quiet:
         print("Current Config values")
         print("==========================")
-        for k, v in config["Tokens"].items():
-            print(f"{k} : {v}")
+        for section in config.sections():
+            print(f"[{section}]")
+            for k, v in config[section].items():
+                print(f"{k} : {v}")
 
 
-def get_token(core: str) -> str:
+def read_section(section: str, settings):
+    """
+    Override the fields of a settings dataclass with values from a config section.
+
+    Fields missing from the section keep their defaults.
+    """
     read_config_file(quiet=True)
 
-    token = config["Tokens"][core]
+    if not config.has_section(section):
+        return settings
+
+    for field in fields(settings):
+        value = config[section].get(field.name)
+        if value is not None:
+            setattr(settings, field.name, field.type(value))
+
+    return settings
+
+
+def get_token(core: str) -> str:
+    """The API token of a core, raising MissingToken when none is set"""
+    load_config()
+
+    token = config["Tokens"].get(core) if config.has_section("Tokens") else None
+
+    if token is None:
+        raise MissingToken(core)
+    return token
+
+
+def get_client(core: str, token: str = None):
+    """
+    Return the ready-to-use client of a core: base URL, token and pooled session.
+
+    Clients are reused for the life of the process and rebuilt when the
+    core's token changes in the config file. An explicit token gives a
+    one-off client.
+    """
+    # imported here so config commands do not load the HTTP stack
+    import client
 
     if token is not None:
-        return token
-    else:
-        print(f"No Auth Token found, please set token for {core}")
+        return client.CoreClient(core, token)
+
+    token = get_token(core)
+    core_client = _clients.get(core)
+    if core_client is None or core_client.token != token:
+        core_client = client.CoreClient(core, token)
+        _clients[core] = core_client
+    return core_client
 
 
 @app.command(help="Lists all the current config values")
@@ -69,11 +168,16 @@ def list():
 def set(
     core: Annotated[str, typer.Argument(help="Token to be updated")] = None,
     value: Annotated[str, typer.Argument(help="Token value")] = None,
+    section: Annotated[
+        str, typer.Option(help="Config section, e.g. Client for connection settings")
+    ] = "Tokens",
 ):
     core = core.lower()
     read_config_file(quiet=True)
 
-    config["Tokens"][core] = value
+    if not config.has_section(section):
+        config.add_section(section)
+    config[section][core] = value
 
     with open(config_file_path, "w") as configfile:
         config.write(configfile)
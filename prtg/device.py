@@ -1,15 +1,19 @@
-from hamcrest import none
 import typer
-import config
-from typing import List, Optional
+from typing import Iterator, List
 from typing_extensions import Annotated
 import terminal_outputs as outputs
 import local_base
+import fanout
+import query
+import search as search_index
+import api
+import bulk
+import tagset
+from tagset import TagSet
+import journal
 from enum import Enum
 from rich import print
-import xmltodict
-from dataclasses import dataclass, asdict
-import re
+from pathlib import Path
 
 app = typer.Typer(no_args_is_help=True)
 
@@ -17,23 +21,9 @@ app = typer.Typer(no_args_is_help=True)
 class Output(str, Enum):
     text = "text"
     table = "table"
-
-
-@dataclass
-class QueryParams:
-    action: Optional[int] = None
-    apitoken: Optional[str] = None
-    columns: Optional[str] = None
-    content: Optional[str] = "devices"
-    count: Optional[int] = 50000
-    filter_name: Optional[list[str]] = None
-    filter_objid: Optional[list[str]] = None
-    id: Optional[str] = None
-    name: Optional[str] = None
-    output: Optional[str] = "json"
-    tags: Optional[str] = None
-    targetid: Optional[int] = None
-    value: Optional[str] = None
+    csv = "csv"
+    ndjson = "ndjson"
+    ids = "ids"
 
 
 # TODO: look into how we are going to solve for multi items for options
@@ -44,7 +34,7 @@ class QueryParams:
 
 @app.command(no_args_is_help=True)
 def list(
-    core: Annotated[str, typer.Argument(help="PRTG core to query")],
+    core: Annotated[str, typer.Argument(help="PRTG core to query")] = None,
     tags: Annotated[
         List[str], typer.Option(help="Tags to used to filter query")
     ] = None,
@@ -57,92 +47,145 @@ def list(
             "--output", "-o", help="Output format of command", case_sensitive=False
         ),
     ] = Output.text,
-) -> List[str]:
+    all_cores: Annotated[
+        bool, typer.Option("--all-cores", help="Query every core at the same time")
+    ] = False,
+    refresh: Annotated[
+        bool, typer.Option("--refresh", help="Download the inventory cache again")
+    ] = False,
+    no_cache: Annotated[
+        bool, typer.Option("--no-cache", help="Query the core instead of the cache")
+    ] = False,
+) -> None:
     """
     List Devices within a PRTG Core
 
-    returns a list of IDs and total count of device on core. 
+    prints the IDs and total count of device on core.
+
+    --output csv, ndjson or ids write one line per device as pages arrive,
+    for piping into other tools, the total goes to stderr. table shows the
+    first 1000 devices.
+
+    Devices are read from the local inventory cache, which is refreshed once
+    it is older than the ttl in the [Cache] config section.
     """
     tags_included = False
-    token = config.get_token(core)
-    url = local_base.query_url(core)
-    url_params = asdict(QueryParams(columns="objid,name,tags", apitoken=token))
-
-    # + f"?content=devices&output=json&count=50000&columns=objid,name,tags&apitoken={token}"
-      
-    if ids:
-        
-        for id in ids:
-            # url = url + f"&filter_objid={id}"
-            if url_params["filter_objid"] is not None:
-                url_params["filter_objid"].append(id)
-            else:
-                url_params["filter_objid"] = [id]
-
-    devices = local_base.PRTG_Get_request(url, url_params)["devices"]
-    if tags is not None:
-        tags_included = True
+    core_names = resolve_cores(core, all_cores)
 
-        for tag in tags:
-            devices = [device for device in devices if tag in device["tags"]]
+    # tags and ids are filtered on the core where PRTG can express them
+    device_query = query.TableQuery(
+        "devices", "objid,name,tags", tags=tags or [], objids=ids or []
+    )
 
-    devices = sorted(devices, key=lambda d: d["name"])
-    device_ids = " ".join([str(device["objid"]) for device in devices])
+    def query_core(core: str) -> Iterator[list]:
+        return query.read(core, device_query, not no_cache, refresh)
 
+    if tags is not None:
+        tags_included = True
+
+    # pages are written as they arrive, only the table output keeps any devices
     # TODO: Highlight tag names in the table output
-    if output == Output.table:
-        outputs.device_table(devices, tags_included)
-    else:
-        print(device_ids)
+    count = outputs.write_pages(
+        query_devices(query_core, core_names),
+        output.value,
+        device_fields(core_names),
+        lambda devices: outputs.device_table(devices, tags_included),
+    )
 
     # TODO: Create a test for this output number
-    print(f"Total Devices: {len(devices)}")
-    return device_ids
+    outputs.total(f"Total Devices: {count}", output.value)
 
 
 # TODO: make a seperate MD page for documentation
 # TODO: make an option for case insensitive on the substring search
 
 
+def complete_device_name(ctx: typer.Context, incomplete: str) -> List[str]:
+    return search_index.complete("devices", incomplete, ctx.params.get("core"))
+
+
 @app.command()
 def search(
     core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
-    keyword: Annotated[str, typer.Argument(help="Keyword search term")],
+    keyword: Annotated[
+        str,
+        typer.Argument(help="Keyword search term", autocompletion=complete_device_name),
+    ],
     output: Annotated[
         Output,
         typer.Option(
             "--output", "-o", help="Terminal output format", case_sensitive=False
         ),
     ] = Output.text,
-) -> List[str]:
+    all_cores: Annotated[
+        bool,
+        typer.Option(
+            "--all-cores", help="Search every core, the core argument is ignored"
+        ),
+    ] = False,
+    fuzzy: Annotated[
+        bool, typer.Option("--fuzzy", help="Also match names close to the keyword")
+    ] = False,
+    regex: Annotated[
+        bool,
+        typer.Option("--regex", help="Match the keyword as a regex against the start of names"),
+    ] = False,
+    refresh: Annotated[
+        bool, typer.Option("--refresh", help="Download the inventory cache again")
+    ] = False,
+    no_cache: Annotated[
+        bool, typer.Option("--no-cache", help="Query the core instead of the cache")
+    ] = False,
+) -> None:
     """Search for a device by keyword
     Default terminal output is text and will only  print device ids
 
 
     table: will print a table with Object ID, Device Name, and Associated tags
 
-    Returns an array of IDs
+    csv, ndjson, ids: one line per device, for piping into other tools
+
+    The keyword is looked up in the local search index and matches
+    anywhere in the name, host or tags, best matches first. With --no-cache
+    it matches anywhere in device names, filtered on the core. --regex
+    matches the keyword as a regex against the start of device names.
 
     Example:
     prtg device search serveronprem web -o table
+    prtg device search all web --all-cores
+    prtg device search serveronprem wbe01 --fuzzy
+    prtg device search serveronprem "web0[12]" --regex
 
     """
-    token = config.get_token(core)
-    url = local_base.query_url(core)
-    url_params = asdict(QueryParams(columns="objid,name,tags", apitoken=token))
+    core_names = resolve_cores(core, all_cores)
+
+    if not no_cache and not regex:
+        # ranked substring search on the local index, nothing is downloaded when cached
+        devices = search_index.search(core_names, "devices", keyword, fuzzy, refresh)
+        if len(core_names) == 1:
+            for device in devices:
+                del device["core"]
+        pages = [devices]
+    else:
+        if regex:
+            # a pattern without special characters is narrowed on the core with @sub() first
+            device_query = query.TableQuery("devices", "objid,name,tags", name_pattern=keyword)
+        else:
+            device_query = query.TableQuery("devices", "objid,name,tags", name_contains=keyword)
 
-    devices = local_base.PRTG_Get_request(url, url_params)["devices"]
+        def query_core(core: str) -> Iterator[list]:
+            return query.read(core, device_query, not no_cache, refresh)
 
-    filtered_devices = [device for device in devices if re.match(keyword, device["name"], re.IGNORECASE)]
-    
-    device_ids = [device["objid"] for device in filtered_devices]
+        pages = query_devices(query_core, core_names)
 
-    if output == Output.table:
-        outputs.device_table(filtered_devices, True)
-    else:
-        print(*device_ids)
+    count = outputs.write_pages(
+        pages,
+        output.value,
+        device_fields(core_names),
+        lambda devices: outputs.device_table(devices, True),
+    )
 
-    return device_ids
+    outputs.total(f"Total Devices: {count}", output.value)
 
 
 @app.command(no_args_is_help=True)
@@ -150,41 +193,28 @@ def add_tags(
     core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
     device_id: Annotated[str, typer.Argument(help="device ID")],
     tags: Annotated[str, typer.Option(help="tags to be added to device ")],
-) -> None:
+    workers: Annotated[
+        int, typer.Option(help="Number of devices updated at once")
+    ] = 8,
+    resume: Annotated[
+        str, typer.Option(help="Job to finish, items it already updated are skipped")
+    ] = None,
+) -> dict:
     """
     Add tags to a device or multiple devices
-    """
-    token = config.get_token(core)
-    devices = device_id.split()
-    tags = tags.split()
-
-    for device in devices:
-        print("===============ADD START================")
-        starting_tags = get_tags(core, device)
-        starting_tags_list = starting_tags.split()
-        current_tags_list = starting_tags.split()
 
-        for tag in tags:
-            if tag in starting_tags_list:
-                print()
-                print(f"The tag: {tag} found on device: {device}, skipping to next tag")
-                continue
-
-            current_tags_list.append(tag)
-
-        new_tags = " ".join(current_tags_list)
+    The own tags of every device are read, only the devices missing a tag
+    are updated. A tag the device only inherits from its groups is added
+    to the device itself.
+    """
+    tags = TagSet(tags)
 
-        if new_tags == starting_tags:
-            print("no change in tags detected")
-        else:
-            apply_tags(core, token, device, new_tags)
-            print()
-            print("Updated tags")
-            print("==================")
-            new_tags = get_tags(core, device)
-            print()
+    def add(current_tags: TagSet) -> TagSet:
+        return current_tags | tags
 
-    return None
+    job = journal.open_job("add_tags", core, resume, device_id=device_id, tags=str(tags))
+    print("===============ADD START================")
+    return change_tags(core, dict.fromkeys(device_id.split(), add), workers, job=job)
 
 
 @app.command(no_args_is_help=True)
@@ -192,41 +222,114 @@ def delete_tags(
     core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
     device_id: Annotated[str, typer.Argument(help="Device ID")],
     tags: Annotated[str, typer.Option(help="tags to be removed from Device")],
-) -> str | None:
+    workers: Annotated[
+        int, typer.Option(help="Number of devices updated at once")
+    ] = 8,
+    resume: Annotated[
+        str, typer.Option(help="Job to finish, items it already updated are skipped")
+    ] = None,
+) -> dict:
     """
     Delete a tag from a device or a set of devices
+
+    Current tags of every device are read in one batched query, only the
+    devices carrying one of the tags are updated.
     """
-    token = config.get_token(core)
-    tags = tags.split()
-    devices = device_id.split()
-
-    for device in devices:
-        print("==========DELETE START================")
-        starting_tags = get_tags(core, device)
-        current_tags = get_tags(core, device, True)
-        for tag in tags:
-            print()
-            print(f"Checking for tag: {tag}")
-
-            if current_tags.count(tag) == 0:
-                print(f"{tag} not found on device: {device}, skipping...")
-                continue
-            else:
-                print()
-                print("Removing Tag")
-                current_tags = current_tags.replace(tag, "").strip()
-
-        if starting_tags == current_tags:
-            print("no change in tags detected")
+    tags = TagSet(tags)
+
+    def delete(current_tags: TagSet) -> TagSet:
+        return current_tags - tags
+
+    job = journal.open_job("delete_tags", core, resume, device_id=device_id, tags=str(tags))
+    print("==========DELETE START================")
+    return change_tags(
+        core, dict.fromkeys(device_id.split(), delete), workers, job=job, removing=True
+    )
+
+
+@app.command(no_args_is_help=True)
+def reconcile_tags(
+    core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
+    file: Annotated[
+        Path,
+        typer.Argument(
+            exists=True,
+            dir_okay=False,
+            readable=True,
+            resolve_path=True,
+            help="Desired-state CSV or YAML file",
+        ),
+    ],
+    apply: Annotated[
+        bool, typer.Option("--apply", help="Write the planned changes to the core")
+    ] = False,
+    workers: Annotated[
+        int, typer.Option(help="Number of devices updated at once")
+    ] = 8,
+    resume: Annotated[
+        str, typer.Option(help="Job to finish, items it already updated are skipped")
+    ] = None,
+    refresh: Annotated[
+        bool, typer.Option("--refresh", help="Download the inventory cache again")
+    ] = False,
+    no_cache: Annotated[
+        bool, typer.Option("--no-cache", help="Query the core instead of the cache")
+    ] = False,
+) -> List[tagset.TagChange]:
+    """
+    Bring device tags in line with a desired-state file
+
+    The file selects devices by objid or by a name regex. tags sets a
+    device's tags outright, add and remove edit them. The plan compares
+    against the tags set on each selected device itself, tags inherited
+    from its groups do not count. Without --apply the plan is only printed.
+
+    CSV example:
+    objid,name,tags,add,remove
+    1234,,role:webserver env:prod,,
+    ,^web,,role:webserver,legacy
+
+    Example:
+    prtg device reconcile_tags serveronprem desired.csv
+    prtg device reconcile_tags serveronprem desired.csv --apply
+    """
+    try:
+        rules = tagset.load_rules(file)
+    except (ValueError, KeyError) as error:
+        print(f"[bold red]{error}")
+        raise typer.Exit(1)
+
+    device_query = query.TableQuery("devices", "objid,name,tags")
+    if all(rule.objid is not None for rule in rules):
+        device_query.objids = [rule.objid for rule in rules]
+
+    devices = (
+        device for page in query.read(core, device_query, not no_cache, refresh) for device in page
+    )
+    selected = {str(device["objid"]): device for device in tagset.selected(devices, rules)}
+
+    # table.json tags include inherited ones, the plan diffs what --apply edits
+    prtg = api.PRTGClient(core, workers=workers, interruptible=True)
+    for result in prtg.own_tags([*selected]):
+        if result.ok:
+            selected[result.item]["tags"] = result.value
         else:
-            apply_tags(core, token, device, current_tags)
-            print()
-            print("Updated tags")
-            print("==================")
-            current_tags = get_tags(core, device)
-            print()
+            print(f"[bold red]Device {result.item} skipped: {result.error}")
+            del selected[result.item]
+    changes = tagset.plan(selected.values(), rules)
 
-    return current_tags
+    outputs.tag_plan_table(changes)
+    print(f"Devices to update: {len(changes)}")
+
+    if apply and changes:
+        edits = {change.objid: change.edit for change in changes}
+        current = {change.objid: str(change.current) for change in changes}
+        job = journal.open_job("reconcile_tags", core, resume, file=str(file))
+        change_tags(core, edits, workers, current, job)
+    elif changes:
+        print("Dry run, use --apply to write these changes")
+
+    return changes
 
 
 # TODo: make it so that you can input a singular number or string of numbers
@@ -237,65 +340,119 @@ def get_tags(
     quiet: Annotated[
         bool, typer.Option("--quiet", "-q", help="Prevents tag status to terminal")
     ] = False,
-) -> str | None:
+) -> dict:
     """
     Get tags that are currently on a Device
-    """
-    token = config.get_token(core)
-    url = local_base.base_url(core, action="get_prop")
-    # f"getobjectproperty.htm?id={device_id}&name=tags&apitoken={token}"
 
+    Devices are read concurrently, returns a dict of device ID to its own
+    tags, None for devices that could not be read.
+    """
     device_ids = device_ids.split()
+    results = {result.item: result for result in api.PRTGClient(core, interruptible=True).own_tags(device_ids)}
 
+    tags = {}
     for device_id in device_ids:
-        url_params = QueryParams(id=device_id, apitoken=token, name="tags")
-
-        # This returns an xml response that needs to be parsed
-        tags_xml = local_base.PRTG_Get_request(url, asdict(url_params))
-        tags = xmltodict.parse(tags_xml)["prtg"]
-
-        # TODO: this try/catch  needs to be a function of its own with `getobjectproperty`
-        try:
-            # TODO: write a testcase for this happy path
-            tags = tags["result"]
-
-        except KeyError:
-            # TODO: Write a testcase for this error
-            print(f"[bold red]{tags['error']}")
-            tags = None
-        else:
+        result = results[device_id]
+        tags[device_id] = result.value if result.ok else None
+        if not result.ok:
+            print(f"[bold red]{result.error.split(': ', 1)[-1]}")
+        elif not quiet:
             # Status to terminal
-            if not quiet:
-                print(f"Tags for Device ID: {device_id}")
-                print(tags)
-    # * currently will only return last set of tags parsed
-    # * Need to determine downstream effect  of returning a dictionary
+            print(f"Tags for Device ID: {device_id}")
+            print(result.value)
+
     return tags
 
 
 # ========================= Helper Functions===================================
 
 
-def apply_tags(core: str, token: str, device_id=str, tags=str):
-    url = local_base.base_url(core, action="set_prop")
-    # + f"setobjectproperty.htm?id={device_id}&name=tags&value={tags}&apitoken={token}"
-    url_params = asdict(
-        QueryParams(id=device_id, name="tags", value=tags, apitoken=token)
+def change_tags(
+    core: str,
+    edits: dict,
+    workers: int = 8,
+    current: dict = None,
+    job: journal.Journal = None,
+    removing: bool = False,
+) -> dict:
+    """
+    Apply per-device edits to the tags of many devices, printing each outcome.
+
+    See api.PRTGClient.update_tags. Returns a dict of device ID to the tags
+    now on the device.
+    """
+
+    def report(result: bulk.ItemResult) -> None:
+        if not result.ok:
+            print(f"[bold red]Device {result.item} failed: {result.error}")
+
+    prtg = api.PRTGClient(core, workers=workers, interruptible=True)
+    with journal.reporting(job):
+        result = prtg.update_tags(edits, current, job, on_result=report, removing=removing)
+    for device in result.unchanged:
+        print(f"Device {device}: no change in tags detected")
+
+    if not result.updated:
+        return {}
+
+    print()
+    print("Updated tags")
+    print("==================")
+    for device, tags in result.updated.items():
+        print(f"Device {device}: {tags}")
+
+    return result.updated
+
+
+def device_fields(core_names: List[str]) -> List[str]:
+    """Fields of the csv and ndjson outputs, with the core when several are queried"""
+    fields = ["objid", "name", "tags"]
+    return ["core", *fields] if len(core_names) > 1 else fields
+
+
+def resolve_cores(core: str | None, all_cores: bool) -> List[str]:
+    if all_cores:
+        return [core.name for core in local_base.cores]
+
+    if core is None:
+        print("Missing Arguments")
+        print("Must enter a core or use the --all-cores flag")
+        raise typer.Exit(1)
+
+    return [core]
+
+
+def query_devices(query_core, core_names: List[str]) -> Iterator[list]:
+    """
+    Run a device query on one or more cores, yielding pages of devices.
+
+    A single core is streamed page by page. Several cores are queried at the
+    same time, every device is labelled with its core and the merged result
+    is returned as one page sorted by name.
+    """
+    if len(core_names) == 1:
+        yield from query_core(core_names[0])
+        return
+
+    result = fanout.query_cores(
+        lambda core: [device for page in query_core(core) for device in page],
+        core_names,
     )
+    local_base.report_fanout_errors(result)
 
-    local_base.PRTG_Get_request(url, url_params)
+    devices = []
+    for core, core_devices in result.results.items():
+        for device in core_devices:
+            device["core"] = core
+            devices.append(device)
+    yield sorted(devices, key=lambda d: d["name"])
 
 
 def remove_duplicate_tags(core: str, device_id: str) -> str:
     device = device_id
 
-    tags = get_tags(core, device, quiet=True)
-    taglist = tags.split()
-
-    # Looping through tags
-    for tag in taglist:
-        if tags.count(tag) > 1:
-            tags = tags.replace(tag, "").strip()
+    # TagSet keeps the first occurrence of every tag
+    tags = str(TagSet(get_tags(core, device, quiet=True)[device] or ""))
 
     print(f"Device only tags: {tags}")
     return tags
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+import client
+import health
+
+
+@dataclass
+class FanoutResult:
+    """
+    Results of one query sent to several cores.
+
+    results holds the return value for every core that answered in time,
+    errors holds a short reason for every core that failed or timed out,
+    skipped the reason for every core not queried because its breaker is open.
+    """
+
+    results: dict[str, Any] = field(default_factory=dict)
+    errors: dict[str, str] = field(default_factory=dict)
+    skipped: dict[str, str] = field(default_factory=dict)
+
+    def merged(self) -> list:
+        """Concatenate the list results of every core that answered"""
+        rows = []
+        for core_rows in self.results.values():
+            rows.extend(core_rows)
+        return rows
+
+
+def query_cores(
+    func: Callable[[str], Any],
+    cores: Iterable[str],
+    timeout: float = None,
+) -> FanoutResult:
+    """
+    Call func(core) for every core at the same time.
+
+    Every core gets the same overall deadline, by default the fanout_timeout
+    of the [Client] section. Single requests are bounded by the session
+    timeouts and the breakers, the deadline only stops a whole query that
+    runs far too long. Cores that fail or miss the deadline are reported in
+    FanoutResult.errors, the rest are returned as partial results. Cores
+    known to be down are not queried at all, they are listed in
+    FanoutResult.skipped, so one dead core never holds up the others.
+
+    A single core is called on the caller's thread, without a deadline.
+    """
+    fanout = FanoutResult()
+    cores = [*dict.fromkeys(cores)]
+    for core in cores:
+        reason = health.unavailable(core)
+        if reason is not None:
+            fanout.skipped[core] = reason
+    cores = [core for core in cores if core not in fanout.skipped]
+
+    if not cores:
+        return fanout
+
+    if len(cores) == 1:
+        collect(fanout, cores[0], lambda: func(cores[0]))
+        return fanout
+
+    if timeout is None:
+        timeout = client.get_settings().fanout_timeout
+
+    executor = ThreadPoolExecutor(max_workers=len(cores), thread_name_prefix="fanout")
+    futures = {executor.submit(func, core): core for core in cores}
+    done, not_done = wait(futures, timeout=timeout)
+
+    for future in done:
+        collect(fanout, futures[future], future.result)
+
+    # a missed deadline says nothing about single requests, the breaker
+    # has already counted any of them that failed
+    for future in not_done:
+        fanout.errors[futures[future]] = f"timed out after {timeout}s"
+
+    # Do not wait on cores that missed the deadline
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    # keep the caller's core order
+    fanout.results = {core: fanout.results[core] for core in cores if core in fanout.results}
+    return fanout
+
+
+def collect(fanout: FanoutResult, core: str, result: Callable[[], Any]) -> None:
+    """File the result of one core under results, skipped or errors"""
+    try:
+        fanout.results[core] = result()
+    except health.CoreUnavailable as e:
+        fanout.skipped[core] = e.reason
+    except Exception as e:
+        fanout.errors[core] = f"{type(e).__name__}: {e}"
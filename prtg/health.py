@@ -0,0 +1,182 @@
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+
+import config
+import local_base
+
+
+@dataclass
+class HealthSettings:
+    """
+    Circuit breaking of unresponsive cores, read from the [Health] config section.
+
+    failures: failed requests in a row after which a core is skipped
+    cooldown: seconds a core is skipped before it is probed again
+    probe_timeout: seconds the probe waits for the core to answer
+
+    Connection errors, timeouts and 5xx responses count as failures, after
+    the session's own retries.
+    """
+
+    failures: int = 3
+    cooldown: float = 30.0
+    probe_timeout: float = 3.0
+
+
+class CoreUnavailable(Exception):
+    """Raised instead of sending a request to a core whose breaker is open"""
+
+    def __init__(self, core: str, reason: str):
+        super().__init__(f"{core} is unavailable, {reason}")
+        self.core = core
+        self.reason = reason
+
+
+class Breaker:
+    """
+    Circuit breaker of one core.
+
+    Closed, requests are sent and failures in a row are counted. After
+    settings.failures of them the breaker opens and every request fails at
+    once with CoreUnavailable. Once the cooldown has passed the next
+    request half-opens it: a single cheap probe is sent, and the breaker
+    closes if the core answers, or stays open for another cooldown.
+    """
+
+    def __init__(self, core: str, settings: HealthSettings):
+        self.core = core
+        self.settings = settings
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self.last_error = ""
+        self._lock = threading.Lock()
+
+    def reason(self) -> str:
+        retry_in = self.opened_at + self.settings.cooldown - time.monotonic()
+        return f"{self.failures} failures in a row ({self.last_error}), probing again in {max(retry_in, 0):.0f}s"
+
+    def skipping(self) -> bool:
+        """Whether requests fail fast right now, call with the lock held"""
+        if self.opened_at is None:
+            return False
+        return self.probing or time.monotonic() - self.opened_at < self.settings.cooldown
+
+    def check(self) -> None:
+        """Raise CoreUnavailable unless a request may be sent to the core"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.skipping():
+                raise CoreUnavailable(self.core, self.reason())
+            self.probing = True
+
+        # half open, one caller probes while the others keep failing fast
+        alive = False
+        try:
+            alive, error = probe(self.core, self.settings.probe_timeout)
+        finally:
+            with self._lock:
+                self.probing = False
+                if alive:
+                    self.failures = 0
+                    self.opened_at = None
+                else:
+                    self.last_error = error
+                    self.opened_at = time.monotonic()
+        if not alive:
+            raise CoreUnavailable(self.core, self.reason())
+
+    def record(self, ok: bool, error: str = "") -> None:
+        with self._lock:
+            if ok:
+                self.failures = 0
+                return
+            self.failures += 1
+            self.last_error = error
+            if self.failures >= self.settings.failures and self.opened_at is None:
+                self.opened_at = time.monotonic()
+
+
+def probe(core: str, timeout: float) -> tuple[bool, str]:
+    """
+    Send the cheapest request there is to a core, status.json without a token.
+
+    Any answer below 500, a 401 included, shows the core is serving again.
+    It bypasses the pooled session, so its retries do not stretch the probe.
+    """
+    try:
+        response = requests.get(local_base.core_url(core) + "status.json", timeout=timeout)
+    except requests.RequestException as e:
+        return False, type(e).__name__
+    if response.status_code >= 500:
+        return False, f"status {response.status_code}"
+    return True, ""
+
+
+_settings: HealthSettings | None = None
+_breakers: dict[str, Breaker] = {}
+_lock = threading.Lock()
+
+
+def get_settings() -> HealthSettings:
+    """The [Health] settings, read again once the config file changes"""
+    global _settings
+
+    config.load_config()
+    if _settings is None:
+        _settings = config.read_section("Health", HealthSettings())
+    return _settings
+
+
+def forget_settings() -> None:
+    global _settings
+
+    _settings = None
+
+
+config.on_reload(forget_settings)
+
+
+def for_core(core: str) -> Breaker:
+    """The breaker shared by every request to a core in this process, on the current settings"""
+    settings = get_settings()
+    with _lock:
+        breaker = _breakers.get(core)
+        if breaker is None:
+            breaker = Breaker(core, settings)
+            _breakers[core] = breaker
+        breaker.settings = settings
+        return breaker
+
+
+def check(core: str) -> None:
+    for_core(core).check()
+
+
+def record(core: str, ok: bool, error: str = "") -> None:
+    for_core(core).record(ok, error)
+
+
+def unavailable(core: str) -> str | None:
+    """
+    Why a core is skipped, or None when requests may be sent to it.
+
+    A core due for its probe counts as available, the probe is left to the
+    first request so it runs on that request's thread.
+    """
+    with _lock:
+        breaker = _breakers.get(core)
+    if breaker is None:
+        return None
+    with breaker._lock:
+        return breaker.reason() if breaker.skipping() else None
+
+
+def reset() -> None:
+    """Forget every breaker, closing them all"""
+    with _lock:
+        _breakers.clear()
@@ -0,0 +1,96 @@
+import csv
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import local_base
+import scheduler
+from client import CoreClient
+
+# sdate and edate of historicdata.json, in the core's local time
+DATE_FORMAT = "%Y-%m-%d-%H-%M-%S"
+FILE_DATE_FORMAT = "%Y%m%d-%H%M%S"
+
+
+@dataclass(frozen=True)
+class Window:
+    """One sensor's historic data between start and end, fetched in one request"""
+
+    objid: str
+    start: datetime
+    end: datetime
+
+    def path(self, directory: Path) -> Path:
+        """The CSV file of the window, its presence marks the window as exported"""
+        name = f"{self.start:{FILE_DATE_FORMAT}}_{self.end:{FILE_DATE_FORMAT}}.csv"
+        return Path(directory) / self.objid / name
+
+
+def windows(
+    objids: Iterable[str], start: datetime, end: datetime, length: timedelta
+) -> Iterator[Window]:
+    """
+    Split start to end into windows of length for every sensor, lazily.
+
+    Windows are aligned on start, so the same command line gives the same
+    windows, and file names, every time it runs.
+    """
+    for objid in objids:
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + length, end)
+            yield Window(objid, window_start, window_end)
+            window_start = window_end
+
+
+def fetch(prtg: CoreClient, window: Window, average: int = 0) -> list:
+    """
+    Rows of a window from historicdata.json, average seconds per row, 0 for raw values.
+
+    Historic data queries are among the most expensive on a core, so like
+    writes they wait for a slot from the core's scheduler.
+    """
+    params = prtg.with_token(
+        {
+            "id": window.objid,
+            "sdate": f"{window.start:{DATE_FORMAT}}",
+            "edate": f"{window.end:{DATE_FORMAT}}",
+            "avg": average,
+            "usecaption": 1,
+        }
+    )
+    with scheduler.for_core(prtg.core).slot():
+        data = local_base.PRTG_Get_request(prtg.url("historic"), params)
+    return data.get("histdata", [])
+
+
+def write(window: Window, rows: list, directory: Path) -> int:
+    """
+    Write a window's rows to its CSV file, returning the row count.
+
+    Rows are written to a .part file that is renamed once complete, so an
+    interrupted export never leaves a window that looks done. Channels are
+    columns, a window without data gets a file with the header only.
+    """
+    path = window.path(directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".part")
+
+    fields = ["objid"]
+    for row in rows:
+        fields.extend(key for key in row if key not in fields)
+
+    with open(partial, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, restval="")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({"objid": window.objid, **row})
+
+    os.replace(partial, path)
+    return len(rows)
+
+
+def export_window(prtg: CoreClient, window: Window, directory: Path, average: int = 0) -> int:
+    return write(window, fetch(prtg, window, average), directory)
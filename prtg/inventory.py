@@ -0,0 +1,398 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from platformdirs import user_cache_dir
+
+import config
+
+
+@dataclass
+class CacheSettings:
+    """
+    Settings of the local inventory cache, read from the [Cache] config section.
+
+    ttl: seconds before a cached core is incrementally refreshed
+    full_ttl: seconds before a cached core is downloaded again in full
+    path: location of the sqlite database
+    """
+
+    ttl: float = 900.0
+    full_ttl: float = 86400.0
+    path: str = f"{user_cache_dir()}/prtg_inventory.sqlite"
+
+
+# Columns requested from table.json for every cached object type
+COLUMNS = {
+    "devices": "objid,name,host,tags,group,probe,status",
+    "sensors": "objid,name,device,parentid,tags,group,probe,status",
+}
+
+# Columns covered by the search index
+SEARCH_FIELDS = ("name", "host", "tags")
+
+FIELDS = (
+    "objid",
+    "name",
+    "host",
+    "tags",
+    "device",
+    "parentid",
+    "group",
+    "probe",
+    "status",
+    "status_raw",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    core TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    objid INTEGER NOT NULL,
+    name TEXT,
+    host TEXT,
+    tags TEXT,
+    device TEXT,
+    parentid INTEGER,
+    "group" TEXT,
+    probe TEXT,
+    status TEXT,
+    status_raw INTEGER,
+    PRIMARY KEY (core, kind, objid)
+);
+CREATE INDEX IF NOT EXISTS objects_name ON objects (core, kind, name);
+CREATE INDEX IF NOT EXISTS objects_parent ON objects (core, kind, parentid);
+CREATE TABLE IF NOT EXISTS refreshes (
+    core TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    full_refreshed_at REAL NOT NULL,
+    PRIMARY KEY (core, kind)
+);
+"""
+
+# Trigram full text index over the objects table. Deletes and updates are
+# synced by triggers, REPLACE only fires the delete trigger with
+# recursive_triggers on. Inserts are indexed in one batch by insert().
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE search USING fts5(
+    name, host, tags, content='objects', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER search_delete AFTER DELETE ON objects BEGIN
+    INSERT INTO search (search, rowid, name, host, tags)
+    VALUES ('delete', old.rowid, old.name, old.host, old.tags);
+END;
+CREATE TRIGGER search_update AFTER UPDATE ON objects BEGIN
+    INSERT INTO search (search, rowid, name, host, tags)
+    VALUES ('delete', old.rowid, old.name, old.host, old.tags);
+    INSERT INTO search (rowid, name, host, tags) VALUES (new.rowid, new.name, new.host, new.tags);
+END;
+INSERT INTO search (search) VALUES ('rebuild');
+"""
+
+_settings: CacheSettings | None = None
+_local = threading.local()
+_refresh_locks: dict[tuple, threading.Lock] = {}
+_refresh_locks_lock = threading.Lock()
+
+
+def get_settings() -> CacheSettings:
+    """The [Cache] settings, read again once the config file changes"""
+    global _settings
+
+    config.load_config()
+    if _settings is None:
+        _settings = config.read_section("Cache", CacheSettings())
+    return _settings
+
+
+def forget_settings() -> None:
+    global _settings
+
+    _settings = None
+
+
+config.on_reload(forget_settings)
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Open, or reuse, this thread's connection to the cache database.
+
+    A connection to another path than the configured one, after the path
+    changed in the config file, is closed and the new path opened.
+    """
+    path = get_settings().path
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.path != path:
+        close()
+        connection = None
+    if connection is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA recursive_triggers=ON")
+        connection.executescript(SCHEMA)
+        create_search_index(connection)
+        _local.connection = connection
+        _local.path = path
+    return connection
+
+
+def create_search_index(connection: sqlite3.Connection) -> None:
+    """Add the search index to a cache, indexing what it already holds"""
+    exists = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'search'"
+    ).fetchone()
+    if exists:
+        return
+
+    try:
+        connection.executescript(f"BEGIN IMMEDIATE; {SEARCH_SCHEMA} COMMIT;")
+    except sqlite3.OperationalError:
+        # sqlite built without fts5 or older than 3.34, search scans the cache instead
+        connection.rollback()
+
+
+def has_search_index(connection: sqlite3.Connection = None) -> bool:
+    return (connection or connect()).execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'search'"
+    ).fetchone() is not None
+
+
+def close() -> None:
+    """Close this thread's connection, the next connect() opens the configured path again"""
+    connection = getattr(_local, "connection", None)
+    if connection is not None:
+        connection.close()
+        _local.connection = None
+
+
+@contextmanager
+def writing(connection: sqlite3.Connection = None) -> Iterator[sqlite3.Connection]:
+    """
+    A write transaction that takes the database's write lock up front.
+
+    A deferred transaction that reads before it writes cannot upgrade while
+    another thread's write is committing in WAL mode, it fails at once with
+    "database is locked" instead of waiting out the busy timeout. Starting
+    with BEGIN IMMEDIATE waits for the lock, so cores refreshed at the same
+    time take turns.
+    """
+    connection = connection or connect()
+    connection.execute("BEGIN IMMEDIATE")
+    with connection:
+        yield connection
+
+
+def refresh_lock(core: str, kind: str) -> threading.Lock:
+    with _refresh_locks_lock:
+        return _refresh_locks.setdefault((core, kind), threading.Lock())
+
+
+# ========================= Reading ============================================
+
+
+def select(
+    core: str,
+    kind: str,
+    where: str = None,
+    params: Iterable = (),
+    refresh: bool = False,
+) -> list[dict]:
+    """
+    Return cached objects of one kind on a core, sorted by name.
+
+    The cache is refreshed first when it is older than the configured ttl,
+    or downloaded again in full when refresh is set. where is an optional
+    SQL condition on the objects table.
+    """
+    return [row for page in select_pages(core, kind, where, params, refresh) for row in page]
+
+
+def select_pages(
+    core: str,
+    kind: str,
+    where: str = None,
+    params: Iterable = (),
+    refresh: bool = False,
+    page_size: int = 1000,
+) -> Iterator[list[dict]]:
+    """Like select, yielding pages of page_size objects so large cores stream"""
+    ensure_fresh(core, kind, refresh)
+
+    columns = ", ".join(f'"{field}"' for field in FIELDS)
+    query = f"SELECT {columns} FROM objects WHERE core = ? AND kind = ?"
+    if where:
+        query += f" AND ({where})"
+    query += " ORDER BY name"
+
+    # a cursor of its own, the thread's connection may be used between pages
+    cursor = connect().cursor()
+    cursor.execute(query, (core, kind, *params))
+    while page := cursor.fetchmany(page_size):
+        yield [dict(row) for row in page]
+
+
+def ensure_fresh(core: str, kind: str, refresh: bool = False) -> None:
+    settings = get_settings()
+
+    with refresh_lock(core, kind):
+        refreshed = connect().execute(
+            "SELECT refreshed_at, full_refreshed_at FROM refreshes WHERE core = ? AND kind = ?",
+            (core, kind),
+        ).fetchone()
+        now = time.time()
+
+        if refresh or refreshed is None or now - refreshed[1] > settings.full_ttl:
+            full_refresh(core, kind)
+        elif now - refreshed[0] > settings.ttl:
+            incremental_refresh(core, kind)
+
+
+# ========================= Refreshing =========================================
+
+
+def fetch(core: str, kind: str, columns: str, objids: list = None) -> Iterable[dict]:
+    prtg = config.get_client(core)
+    url_params = {"content": kind, "output": "json", "columns": columns}
+
+    if objids is not None:
+        return prtg.read_objids(url_params, kind, objids)
+    return prtg.read_table(url_params, kind)
+
+
+def full_refresh(core: str, kind: str) -> None:
+    """
+    Replace every cached object of one kind on a core.
+
+    Only objects that changed are written, so the search index is not
+    rebuilt for the ones that did not.
+    """
+    rows = [to_row(obj) for obj in fetch(core, kind, COLUMNS[kind])]
+    now = time.time()
+
+    connection = connect()
+    columns = ", ".join(f'"{field}"' for field in FIELDS)
+    cached = {
+        row[0]: row
+        for row in connection.execute(
+            f"SELECT {columns} FROM objects WHERE core = ? AND kind = ?", (core, kind)
+        )
+    }
+    live = {row["objid"] for row in rows}
+    removed = [objid for objid in cached if objid not in live]
+    changed = [
+        row
+        for row in rows
+        if row["objid"] not in cached
+        or tuple(cached[row["objid"]]) != tuple(row[field] for field in FIELDS)
+    ]
+
+    with writing(connection):
+        connection.executemany(
+            "DELETE FROM objects WHERE core = ? AND kind = ? AND objid = ?",
+            [(core, kind, objid) for objid in removed],
+        )
+        insert(connection, core, kind, changed)
+        connection.execute(
+            "INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?, ?)",
+            (core, kind, now, now),
+        )
+
+
+def incremental_refresh(core: str, kind: str) -> None:
+    """
+    Bring the cache up to date without downloading every column again.
+
+    PRTG has no change feed, so a narrow objid,name,status projection is
+    compared against the cache: removed objects are dropped, status changes
+    are applied in place, and only new or renamed objects are re-fetched in
+    full. Tag or host edits made outside this tool show up on the next full
+    refresh (full_ttl or --refresh).
+    """
+    connection = connect()
+    cached = {
+        row["objid"]: (row["name"], row["status_raw"])
+        for row in connection.execute(
+            "SELECT objid, name, status_raw FROM objects WHERE core = ? AND kind = ?",
+            (core, kind),
+        )
+    }
+
+    live = {}
+    for obj in fetch(core, kind, "objid,name,status"):
+        live[obj["objid"]] = (obj.get("name"), obj.get("status_raw"), obj.get("status"))
+
+    removed = [objid for objid in cached if objid not in live]
+    changed = [objid for objid in live if objid not in cached or cached[objid][0] != live[objid][0]]
+    status_changed = [
+        (live[objid][2], live[objid][1], core, kind, objid)
+        for objid in live
+        if objid in cached and cached[objid][1] != live[objid][1]
+    ]
+
+    rows = [to_row(obj) for obj in fetch(core, kind, COLUMNS[kind], objids=changed)]
+
+    with writing(connection):
+        connection.executemany(
+            "DELETE FROM objects WHERE core = ? AND kind = ? AND objid = ?",
+            [(core, kind, objid) for objid in removed],
+        )
+        connection.executemany(
+            "UPDATE objects SET status = ?, status_raw = ? WHERE core = ? AND kind = ? AND objid = ?",
+            status_changed,
+        )
+        insert(connection, core, kind, rows)
+        connection.execute(
+            "UPDATE refreshes SET refreshed_at = ? WHERE core = ? AND kind = ?",
+            (time.time(), core, kind),
+        )
+
+
+# ========================= Writing ============================================
+
+
+def to_row(obj: dict) -> dict:
+    row = {field: obj.get(field) for field in FIELDS}
+    if isinstance(row["parentid"], str) and row["parentid"].isdigit():
+        row["parentid"] = int(row["parentid"])
+    return row
+
+
+def insert(connection: sqlite3.Connection, core: str, kind: str, rows: list[dict]) -> None:
+    columns = ", ".join(f'"{field}"' for field in FIELDS)
+    placeholders = ", ".join("?" for _ in range(len(FIELDS) + 2))
+    last_rowid = connection.execute("SELECT coalesce(max(rowid), 0) FROM objects").fetchone()[0]
+    connection.executemany(
+        f"INSERT OR REPLACE INTO objects (core, kind, {columns}) VALUES ({placeholders})",
+        [(core, kind, *(row[field] for field in FIELDS)) for row in rows],
+    )
+
+    # new rows get rowids past the previous maximum, a batch insert into the
+    # index is far cheaper than a trigger per row
+    if rows and has_search_index(connection):
+        connection.execute(
+            "INSERT INTO search (rowid, name, host, tags) "
+            "SELECT rowid, name, host, tags FROM objects WHERE rowid > ?",
+            (last_rowid,),
+        )
+
+
+def upsert(core: str, kind: str, obj: dict) -> None:
+    """Write one object through to the cache after this tool changed it"""
+    with writing() as connection:
+        insert(connection, core, kind, [to_row(obj)])
+
+
+def update_tags(core: str, objid: str | int, tags: str) -> None:
+    with writing() as connection:
+        connection.execute(
+            "UPDATE objects SET tags = ? WHERE core = ? AND objid = ?",
+            (tags, core, int(objid)),
+        )
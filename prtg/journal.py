@@ -0,0 +1,213 @@
+import json
+import os
+import secrets
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+import typer
+from platformdirs import user_state_dir
+from rich import print
+
+import bulk
+import config
+
+
+@dataclass
+class JournalSettings:
+    """
+    Location of the bulk job journals, read from the [Journal] config section.
+
+    directory: folder holding one <job>.ndjson file per bulk write job
+    """
+
+    directory: str = f"{user_state_dir()}/prtg_jobs"
+
+
+_settings: JournalSettings | None = None
+
+
+def get_settings() -> JournalSettings:
+    """The [Journal] settings, read again once the config file changes"""
+    global _settings
+
+    config.load_config()
+    if _settings is None:
+        _settings = config.read_section("Journal", JournalSettings())
+    return _settings
+
+
+def forget_settings() -> None:
+    global _settings
+
+    _settings = None
+
+
+config.on_reload(forget_settings)
+
+
+class Journal:
+    """
+    Append-only NDJSON record of one bulk write job.
+
+    The first line describes the job. Items are then recorded as planned,
+    started when they are sent, and done, with their result such as new
+    object IDs, or failed. A resumed job appends to the same file and
+    skips the items already done, failed ones are tried again.
+    """
+
+    def __init__(self, job: str, path: Path, done: set):
+        self.job = job
+        self.path = path
+        self.done = done
+        self.skipped = 0
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def write(self, event: str, **fields) -> None:
+        record = {"event": event, "time": round(time.time(), 3), **fields}
+        self._file.write(json.dumps(record, default=str) + "\n")
+
+    def plan(self, keys: Iterable[str]) -> None:
+        self.write("planned", items=[key for key in keys if key not in self.done])
+
+    def run(
+        self,
+        items: Iterable,
+        worker: Callable[[Any], Any],
+        max_workers: int = 8,
+        key: Callable[[Any], str] = str,
+        interruptible: bool = False,
+    ) -> Iterator[bulk.ItemResult]:
+        """
+        bulk.run over the items not done yet, recording every outcome.
+
+        On KeyboardInterrupt, after bulk.run drained the requests in flight,
+        the checkpoint is written before it is raised again. The items
+        skipped as already done are counted in skipped.
+        """
+
+        def pending() -> Iterator:
+            for item in items:
+                if key(item) in self.done:
+                    self.skipped += 1
+                    continue
+                self.write("started", item=key(item))
+                yield item
+
+        try:
+            for result in bulk.run(pending(), worker, max_workers, interruptible):
+                if result.ok:
+                    self.write("done", item=key(result.item), value=result.value)
+                    self.done.add(key(result.item))
+                else:
+                    self.write("failed", item=key(result.item), error=result.error)
+                yield result
+        except KeyboardInterrupt:
+            self.close("interrupted")
+            raise
+
+        self.close("finished")
+
+    def close(self, event: str) -> None:
+        """Write the checkpoint and make sure the journal is on disk"""
+        if self._file.closed:
+            return
+        self.write(event, done=len(self.done))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+@contextmanager
+def reporting(job: Journal | None) -> Iterator[None]:
+    """
+    Report a command's job on stderr: the items it skipped, and on Ctrl-C
+    how to finish it, exiting 130.
+    """
+    if job is None:
+        yield
+        return
+
+    try:
+        yield
+    except KeyboardInterrupt:
+        job.close("interrupted")
+        print(
+            f"[bold yellow]Job {job.job} interrupted, finish it with --resume {job.job}",
+            file=sys.stderr,
+        )
+        raise typer.Exit(130)
+
+    if job.skipped:
+        print(f"Skipped {job.skipped} items already done in job {job.job}", file=sys.stderr)
+
+
+def job_path(job: str) -> Path:
+    return Path(get_settings().directory) / f"{job}.ndjson"
+
+
+def read(path: Path) -> Iterator[dict]:
+    """Records of a journal, skipping a last line cut short by a crash"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def open_job(command: str, core: str, resume: str = None, **arguments) -> Journal:
+    """
+    Start a journal for a bulk write command, or reopen one to resume it.
+
+    A resumed job must belong to the same command and core and be given the
+    same arguments, its done items say nothing about others. The job name is
+    printed to stderr, so it is at hand when the run is cut short.
+    """
+    if resume is None:
+        job = f"{command}-{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}"
+        path = job_path(job)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        journal = Journal(job, path, set())
+        journal.write("job", job=job, command=command, core=core, arguments=arguments)
+        print(f"Job {job}, journal at {path}", file=sys.stderr)
+        return journal
+
+    path = job_path(resume)
+    if not path.exists():
+        print(f"[bold red]No journal for job {resume} in {path.parent}", file=sys.stderr)
+        raise typer.Exit(1)
+
+    records = read(path)
+    header = next(records, {})
+    if (header.get("command"), header.get("core")) != (command, core):
+        print(
+            f"[bold red]Job {resume} is {header.get('command')} on {header.get('core')}, "
+            f"not {command} on {core}",
+            file=sys.stderr,
+        )
+        raise typer.Exit(1)
+
+    # the same items with other arguments, such as other tags, are not done yet
+    arguments = json.loads(json.dumps(arguments, default=str))
+    if header.get("arguments") != arguments:
+        changed = sorted(
+            name
+            for name in {*arguments, *header.get("arguments", {})}
+            if arguments.get(name) != header.get("arguments", {}).get(name)
+        )
+        print(
+            f"[bold red]Job {resume} ran with other arguments, {', '.join(changed)} differ: "
+            f"{header.get('arguments')}",
+            file=sys.stderr,
+        )
+        raise typer.Exit(1)
+
+    done = {record["item"] for record in records if record["event"] == "done"}
+    journal = Journal(resume, path, done)
+    journal.write("resumed")
+    print(f"Resuming job {resume}, {len(done)} items already done", file=sys.stderr)
+    return journal
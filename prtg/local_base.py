@@ -1,23 +1,97 @@
 from enum import Enum
+import importlib
 
-import cores
-import sensor
-import device
-import requests
-import terminal_outputs
 import typer
-import config
-import channel
+from typer.core import TyperCommand, TyperGroup
 from rich import print
+from typing_extensions import Annotated
+
+import profiling
+
+
+class LazyGroup(TyperGroup):
+    """
+    Root command group that imports a subcommand group only when it is used.
+
+    `prtg cores list` or `prtg --help` never import requests, xmltodict or
+    the device/sensor modules. Help listings use the help text below
+    instead of importing the groups.
+    """
+
+    # name: (module holding the typer app, help text)
+    lazy_subcommands = {
+        "cores": ("cores", "Information about PRTG Cores "),
+        "config": ("config", "Interact with app config"),
+        "sensor": ("sensor", "Interact with sensors in PRTG"),
+        "device": ("device", "Interact with devices in PRTG"),
+        "channel": ("channel", "Interact with sensor channels in PRTG"),
+        "decommissioned": ("Decommisioned_servers", "Reconcile server inventories against PRTG"),
+        "shell": ("shell", "Run commands in a shell that keeps sessions and caches warm"),
+    }
+
+    _listing = False
+
+    def list_commands(self, ctx: typer.Context) -> list:
+        return [*super().list_commands(ctx), *self.lazy_subcommands]
+
+    def get_command(self, ctx: typer.Context, cmd_name: str):
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+
+        module_name, help = self.lazy_subcommands[cmd_name]
+        if self._listing:
+            return TyperCommand(cmd_name, help=help)
+
+        module = importlib.import_module(module_name)
+        group = typer.main.get_group(module.app)
+        group.name = cmd_name
+        group.help = group.help or help
+        return group
+
+    def invoke(self, ctx: typer.Context):
+        # the library raises instead of printing, the CLI reports it
+        import config
+
+        try:
+            return super().invoke(ctx)
+        except config.MissingToken as error:
+            print(f"[bold red]{error}")
+            raise typer.Exit(1)
+
+    def format_help(self, ctx: typer.Context, formatter) -> None:
+        self._listing = True
+        try:
+            super().format_help(ctx, formatter)
+        finally:
+            self._listing = False
 
 
 # TODO: install the autocomplete for the app
-app = typer.Typer(no_args_is_help=True, help="PRTG administration tool")
-app.add_typer(cores.app, name="cores", help="Information about PRTG Cores ")
-app.add_typer(config.app, name="config", help="Interact with app config")
-app.add_typer(sensor.app, name="sensor", help="Interact with sensors in PRTG")
-app.add_typer(device.app, name="device", help="Interact with devices in PRTG")
-app.add_typer(channel.app, name="channel", help="Interact with sensor channels in PRTG")
+app = typer.Typer(cls=LazyGroup, no_args_is_help=True, help="PRTG administration tool")
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            "--profile",
+            help="Print request timings by core and endpoint, throttling and memory to stderr",
+        ),
+    ] = False,
+    profile_export: Annotated[
+        str,
+        typer.Option(
+            "--profile-export",
+            help="Write the profile to a .json file, or a Prometheus textfile otherwise",
+        ),
+    ] = None,
+) -> None:
+    # subcommand groups are registered in LazyGroup.lazy_subcommands
+    if profile or profile_export:
+        profiling.start()
+        ctx.call_on_close(lambda: profiling.finish(profile_export, show=profile))
 
 cores = Enum(
     "cores",
@@ -37,14 +111,23 @@ Actions = {
     "set_prop": "setobjectproperty.htm",
     "duplicate": "duplicateobject.htm",
     "pause": "pause.htm",
+    "pause_for": "pauseobjectfor.htm",
     "resume": "resume.htm",
+    "historic": "historicdata.json",
 }
 
 exclude = ["Probe Device", "Cluster Probe Device", "PRTG Core Server", ""]
 
 
+def core_url(core: str) -> str:
+    """API root of a core, built from url_template in the [Client] config section"""
+    import client
+
+    return client.get_settings().url_template.format(core=core) + "/api/"
+
+
 def base_url(core: str, action: str = None) -> str:
-    url = f"https://{core}.agency.ok.local/api/"
+    url = core_url(core)
 
     match action:
         case "get_prop":
@@ -54,59 +137,112 @@ def base_url(core: str, action: str = None) -> str:
         case "duplicate":
             url = url + Actions["duplicate"]
         case "pause":
-            url = url + Actions["pasue"]
+            url = url + Actions["pause"]
+        case "pause_for":
+            url = url + Actions["pause_for"]
         case "resume":
             url = url + Actions["resume"]
+        case "historic":
+            url = url + Actions["historic"]
         # case None:
         # TODO: come back and check if you need a none testcase
         case _:
-            print("Action Not found, valid query options are: ")
-            for key in Actions.keys():
-                print(key)
-            raise typer.Exit(code=126)
+            raise ValueError(f"unknown action {action}, valid actions are: {', '.join(Actions)}")
     return url
 
 
 def query_url(core: str) -> str:
-    return f"https://{core}.agency.ok.local/api/table.json"
+    return core_url(core) + "table.json"
 
 
 def PRTG_Get_request(url: str, params: dict = None):
+    # imported on first request so commands that never call a core stay fast
+    import client
+
+    # Every command shares one pooled keep-alive session per core
+    return parse_response(client.get(url, params=params))
+
+
+def parse_response(res: "requests.Response"):
+    """
+    Parsed JSON of a response.
+
+    A response that is not JSON raises ValueError, with the core's <error>
+    message when it sent one. The message never includes the url, which
+    carries the API token.
+    """
+    import requests
 
-    res = requests.get(url, params=params)
     try:
-        return res.json()
+        with profiling.parsing("json"):
+            return res.json()
     except requests.JSONDecodeError:
-        if res.status_code == 200:
-            print("[green]Response is not in JSON format, but 200 code returned")
-        elif res.status_code == 400:
-            print(f"[bold red] Response Code:{res.status_code}, Check input parameters")
-
-        return res.text
-
-
-def Get_All_PRTG_Hostnames() -> list:
-    network_server_hostnames = []
-    server_cores = [
-        cores.serverazure.name,
-        cores.serveresx.name,
-        cores.serveronprem.name,
-    ]
-    for core in server_cores:
-        network_server_hostnames = [
-            *network_server_hostnames,
-            *Get_Core_Hostnames(core),
+        read_property(res.text)
+        raise ValueError(f"response is not JSON, status {res.status_code} {res.reason}") from None
+
+
+def read_property(response_text: str) -> str:
+    """The <result> of an API action response, raising ValueError on an <error>"""
+    from xml.etree import ElementTree
+
+    try:
+        with profiling.parsing("xml"):
+            root = ElementTree.fromstring(response_text)
+    except ElementTree.ParseError:
+        # write actions answer success with a small html page, error statuses
+        # never get here, CoreClient.request raises for them
+        return response_text
+
+    error = root.findtext("error")
+    if error is not None:
+        raise ValueError(error)
+    return root.findtext("result")
+
+
+def Get_All_PRTG_Hostnames(core_names: list = None) -> list:
+    if core_names is None:
+        core_names = [
+            cores.serverazure.name,
+            cores.serveresx.name,
+            cores.serveronprem.name,
         ]
-    return network_server_hostnames
+
+    import fanout
+
+    # all cores are queried at the same time, unreachable cores are reported and skipped
+    hostnames = fanout.query_cores(Get_Core_Hostnames, core_names)
+    report_fanout_errors(hostnames)
+
+    return hostnames.merged()
+
+
+def report_fanout_errors(result: "fanout.FanoutResult") -> None:
+    for core, error in result.errors.items():
+        print(f"[bold red]Core {core} skipped: {error}")
+    for core, reason in result.skipped.items():
+        print(f"[bold yellow]Core {core} skipped, unavailable: {reason}")
 
 
 def Get_Core_Hostnames(core: str) -> list:
-    query_url = f"https://{core}.agency.ok.local/api/table.json?content=devices&output=json&columns=objid,name,host,probe"
-    devices = PRTG_Get_request(query_url)["devices"]
+    import inventory
+
+    devices = inventory.select(core, "devices")
     return [device["name"] for device in devices]
 
 
 def Get_Sensor_Status(sensor_type: str, core: str):
-    query_url = f"https://{core}.agency.ok.local/api/table.json?content=sensors&output=json&columns=objid,group,device,sensor,status,message&filter_status=5&filter_sensor={sensor_type}"
-    sensors = PRTG_Get_request(query_url)["sensors"]
+    import config
+
+    # one request for the first page of down sensors, sensor watch follows them live
+    params = {
+        "content": "sensors",
+        "output": "json",
+        "columns": "objid,group,device,sensor,status,message",
+        "filter_status": 5,
+        "filter_sensor": sensor_type,
+    }
+    sensors = config.get_client(core).request(params=params)["sensors"]
+
+    import terminal_outputs
+
     terminal_outputs.create_sensor_status_table(sensors)
@@ -0,0 +1,249 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+# off unless a command runs with --profile, recording then costs a lock per request
+enabled = False
+
+_lock = threading.Lock()
+_started = 0.0
+
+
+@dataclass
+class EndpointStats:
+    """Requests sent to one endpoint of one core"""
+
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    latencies: list = field(default_factory=list)
+
+    def percentile(self, share: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+# (core, endpoint): stats, parse format: seconds, reason: seconds asleep
+requests: dict[tuple[str, str], EndpointStats] = {}
+parse_seconds: dict[str, float] = {}
+sleep_seconds: dict[str, float] = {}
+
+
+def start() -> None:
+    """Start recording, clearing whatever an earlier run recorded"""
+    global enabled, _started
+
+    with _lock:
+        requests.clear()
+        parse_seconds.clear()
+        sleep_seconds.clear()
+        _started = time.perf_counter()
+        enabled = True
+
+
+def record_request(
+    core: str, endpoint: str, seconds: float, status: int, size: int, retries: int = 0
+) -> None:
+    if not enabled:
+        return
+    with _lock:
+        stats = requests.setdefault((core, endpoint), EndpointStats())
+        stats.count += 1
+        stats.errors += status >= 400
+        stats.retries += retries
+        stats.bytes += size
+        stats.seconds += seconds
+        stats.latencies.append(seconds)
+
+
+@contextmanager
+def parsing(format: str) -> Iterator[None]:
+    """Time the parsing of a response body, json or xml"""
+    if not enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            parse_seconds[format] = parse_seconds.get(format, 0.0) + elapsed
+
+
+def sleep(seconds: float, reason: str) -> None:
+    """time.sleep that is counted in the profile under reason"""
+    time.sleep(seconds)
+    if enabled:
+        with _lock:
+            sleep_seconds[reason] = sleep_seconds.get(reason, 0.0) + seconds
+
+
+def throttled() -> dict[str, float]:
+    """Seconds writes waited for the scheduler of each core, if any were sent"""
+    scheduler = sys.modules.get("scheduler")
+    return scheduler.throttled() if scheduler is not None else {}
+
+
+def peak_memory() -> int | None:
+    """Peak resident memory of the process in bytes, None where it is unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def snapshot() -> dict:
+    """Everything recorded so far, as plain data"""
+    with _lock:
+        endpoints = [
+            {
+                "core": core,
+                "endpoint": endpoint,
+                "requests": stats.count,
+                "errors": stats.errors,
+                "retries": stats.retries,
+                "bytes": stats.bytes,
+                "seconds": round(stats.seconds, 6),
+                "p50": round(stats.percentile(0.5), 6),
+                "p95": round(stats.percentile(0.95), 6),
+                "max": round(max(stats.latencies, default=0.0), 6),
+            }
+            for (core, endpoint), stats in sorted(requests.items())
+        ]
+        parse = dict(parse_seconds)
+        sleeps = dict(sleep_seconds)
+
+    return {
+        "wall_seconds": round(time.perf_counter() - _started, 6),
+        "endpoints": endpoints,
+        "throttled_seconds": throttled(),
+        "sleep_seconds": sleeps,
+        "parse_seconds": parse,
+        "peak_memory_bytes": peak_memory(),
+    }
+
+
+def summary(data: dict) -> None:
+    """Print a profile to stderr, so it never mixes with piped output"""
+    from rich import box
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(
+        title=f"Profile, {data['wall_seconds']:.3f}s wall time, latencies in ms",
+        box=box.SIMPLE_HEAD,
+        pad_edge=False,
+    )
+    table.add_column("Core / Endpoint", no_wrap=True)
+    for column in ["Req", "Err", "Retry", "KiB", "Sec", "p50", "p95"]:
+        table.add_column(column, justify="right", min_width=len(column))
+
+    for row in data["endpoints"]:
+        table.add_row(
+            f"{row['core']} {row['endpoint']}",
+            str(row["requests"]),
+            str(row["errors"]),
+            str(row["retries"]),
+            f"{row['bytes'] / 1024:.0f}",
+            f"{row['seconds']:.2f}",
+            f"{row['p50'] * 1000:.0f}",
+            f"{row['p95'] * 1000:.0f}",
+        )
+
+    console = Console(stderr=True)
+    console.print(table)
+    for name, values in [
+        ("Throttled", data["throttled_seconds"]),
+        ("Sleeping", data["sleep_seconds"]),
+        ("Parsing", data["parse_seconds"]),
+    ]:
+        if values:
+            parts = [f"{key} {value:.3f}s" for key, value in values.items()]
+            console.print(f"{name}: " + ", ".join(parts))
+    if data["peak_memory_bytes"] is not None:
+        console.print(f"Peak memory: {data['peak_memory_bytes'] / 2**20:.1f} MiB")
+
+
+# name, type, help and field of the per endpoint Prometheus metrics
+ENDPOINT_METRICS = [
+    ("requests_total", "counter", "Requests sent to PRTG", "requests"),
+    ("request_errors_total", "counter", "Requests answered with a 4xx or 5xx status", "errors"),
+    ("request_retries_total", "counter", "Requests retried by the session", "retries"),
+    ("response_bytes_total", "counter", "Bytes received from PRTG", "bytes"),
+    ("request_seconds_total", "counter", "Seconds spent waiting for PRTG", "seconds"),
+    ("request_seconds_p95", "gauge", "95th percentile request latency", "p95"),
+]
+
+
+def prometheus(data: dict) -> str:
+    """A profile in the Prometheus text format, for the node exporter's textfile collector"""
+    lines = []
+
+    def metric(name: str, kind: str, help: str, samples: list) -> None:
+        lines.append(f"# HELP prtg_{name} {help}")
+        lines.append(f"# TYPE prtg_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"prtg_{name}{{{label_text}}} {value}" if labels else f"prtg_{name} {value}")
+
+    for name, kind, help, key in ENDPOINT_METRICS:
+        samples = [
+            ({"core": row["core"], "endpoint": row["endpoint"]}, row[key])
+            for row in data["endpoints"]
+        ]
+        metric(name, kind, help, samples)
+
+    for name, help, label, values in [
+        ("throttled_seconds_total", "Seconds writes waited for the scheduler", "core",
+         data["throttled_seconds"]),
+        ("sleep_seconds_total", "Seconds spent sleeping", "reason", data["sleep_seconds"]),
+        ("parse_seconds_total", "Seconds spent parsing responses", "format",
+         data["parse_seconds"]),
+    ]:
+        metric(name, "counter", help, [({label: key}, value) for key, value in values.items()])
+
+    metric("run_seconds", "gauge", "Wall time of the run", [({}, data["wall_seconds"])])
+    if data["peak_memory_bytes"] is not None:
+        metric("peak_memory_bytes", "gauge", "Peak resident memory", [({}, data["peak_memory_bytes"])])
+
+    return "\n".join(lines) + "\n"
+
+
+def export(data: dict, path: str) -> None:
+    """
+    Write a profile to path, JSON for a .json file, the Prometheus text format otherwise.
+
+    The file is replaced in one rename, so a collector never reads half of it.
+    """
+    text = json.dumps(data, indent=2) if path.endswith(".json") else prometheus(data)
+    partial = f"{path}.tmp"
+    with open(partial, "w") as f:
+        f.write(text)
+    os.replace(partial, path)
+
+
+def finish(export_path: str = None, show: bool = True) -> None:
+    """Stop recording, print the summary and write the export"""
+    global enabled
+
+    if not enabled:
+        return
+    data = snapshot()
+    enabled = False
+    if show:
+        summary(data)
+    if export_path:
+        export(data, export_path)
@@ -0,0 +1,135 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+import config
+import inventory
+
+# characters with a meaning in a regex, every other character matches itself
+REGEX_SPECIAL = frozenset(".^$*+?{}[]\\|()")
+
+
+@dataclass
+class TableQuery:
+    """
+    Filters of a table.json query, pushed down to the core where PRTG can express them.
+
+    PRTG ORs repeated filter values, so only one of the tags that must all
+    match (tags) is sent to the core, the others are checked client side.
+    Regex name patterns are narrowed on the core with @sub() when the
+    pattern is a plain literal and always re-checked client side.
+
+    tags: every tag must be on the object
+    any_tags: at least one tag must be on the object
+    name: exact object name
+    name_contains: case insensitive substring of the name
+    name_pattern: regex matched against the start of the name, case insensitive
+    objids: object IDs to include
+    statuses: raw status values to include
+    """
+
+    content: str
+    columns: str
+    tags: List[str] = field(default_factory=list)
+    any_tags: List[str] = field(default_factory=list)
+    name: Optional[str] = None
+    name_contains: Optional[str] = None
+    name_pattern: Optional[str] = None
+    objids: List[str] = field(default_factory=list)
+    statuses: List[str] = field(default_factory=list)
+    sortby: Optional[str] = "name"
+
+    def __post_init__(self):
+        self.objids = [str(objid) for objid in self.objids]
+        self.statuses = [str(status) for status in self.statuses]
+
+    def params(self) -> dict:
+        """table.json parameters for the filters the core can apply"""
+        params = {
+            "content": self.content,
+            "columns": self.columns,
+            "output": "json",
+        }
+        if self.sortby:
+            params["sortby"] = self.sortby
+
+        if self.objids:
+            params["filter_objid"] = self.objids
+
+        if self.any_tags:
+            params["filter_tags"] = [f"@tag({tag})" for tag in self.any_tags]
+        elif self.tags:
+            params["filter_tags"] = [f"@tag({self.tags[0]})"]
+
+        if self.name is not None:
+            params["filter_name"] = self.name
+        elif self.name_contains is not None:
+            params["filter_name"] = f"@sub({self.name_contains})"
+        elif self.name_pattern is not None and is_literal(self.name_pattern):
+            params["filter_name"] = f"@sub({self.name_pattern})"
+
+        if self.statuses:
+            params["filter_status"] = self.statuses
+
+        return params
+
+    def remaining(self, row: dict) -> bool:
+        """Check the filters the core could not apply"""
+        if len(self.tags) > 1 and not self.any_tags:
+            row_tags = (row.get("tags") or "").split()
+            if not all(tag in row_tags for tag in self.tags[1:]):
+                return False
+
+        if self.name is None and self.name_contains is None and self.name_pattern:
+            if not re.match(self.name_pattern, row.get("name") or "", re.IGNORECASE):
+                return False
+
+        return True
+
+    def matches(self, row: dict) -> bool:
+        """Check every filter, for rows that did not come from the core"""
+        row_tags = (row.get("tags") or "").split()
+        name = row.get("name") or ""
+
+        if self.objids and str(row.get("objid")) not in self.objids:
+            return False
+        if self.tags and not all(tag in row_tags for tag in self.tags):
+            return False
+        if self.any_tags and not any(tag in row_tags for tag in self.any_tags):
+            return False
+        if self.name is not None and name != self.name:
+            return False
+        if self.name_contains is not None and self.name_contains.lower() not in name.lower():
+            return False
+        if self.name_pattern is not None and not re.match(self.name_pattern, name, re.IGNORECASE):
+            return False
+        if self.statuses and str(row.get("status_raw")) not in self.statuses:
+            return False
+
+        return True
+
+
+def is_literal(pattern: str) -> bool:
+    """True when a regex pattern has no special characters, such as web-01"""
+    return not REGEX_SPECIAL.intersection(pattern)
+
+
+def read(
+    core: str, table_query: TableQuery, use_cache: bool = True, refresh: bool = False
+) -> Iterator[list]:
+    """
+    Yield pages of objects matching a query.
+
+    From the inventory cache every filter is applied locally. From the core
+    the pushed-down filters shrink the response and only the rest are
+    checked here, page by page.
+    """
+    if use_cache:
+        for rows in inventory.select_pages(core, table_query.content, refresh=refresh):
+            yield [row for row in rows if table_query.matches(row)]
+        return
+
+    prtg = config.get_client(core)
+    pages = prtg.read_pages(table_query.params(), table_query.content)
+    for page in pages:
+        yield [row for row in page if table_query.remaining(row)]
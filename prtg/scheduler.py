@@ -0,0 +1,143 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+import client
+import config
+
+
+@dataclass
+class SchedulerSettings:
+    """
+    Pacing of write requests, read from the [Scheduler] config section.
+
+    rate: requests per second allowed to one core, with bursts of up to burst
+    min_window, max_window: bounds of the concurrent writes allowed per core
+    target_latency: seconds a write may take before the core counts as stressed
+
+    The window starts at max_concurrency from the [Client] section.
+    """
+
+    rate: float = 20.0
+    burst: int = 10
+    min_window: int = 1
+    max_window: int = 32
+    target_latency: float = 2.0
+
+
+@dataclass
+class Slot:
+    """One admitted request, mark it failed to count it as a core error"""
+
+    ok: bool = True
+
+
+class CoreScheduler:
+    """
+    Paces the write requests sent to one core.
+
+    A token bucket caps the request rate and a concurrency window caps the
+    writes in flight. The window adapts AIMD-style: it grows by about one
+    request per round of fast, successful writes and halves on an error or
+    a write slower than target_latency, at most once per round trip so one
+    burst of failures does not collapse it to the minimum.
+    """
+
+    def __init__(self, settings: SchedulerSettings, window: int):
+        self.settings = settings
+        self.window = float(min(max(window, settings.min_window), settings.max_window))
+        self.in_flight = 0
+        self.tokens = float(settings.burst)
+        self.refilled_at = time.monotonic()
+        self.decreased_at = 0.0
+        self.throttled = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self) -> Iterator[Slot]:
+        """Wait for a window slot and a rate token, then send one request"""
+        waited_from = time.monotonic()
+        with self._condition:
+            while self.in_flight >= int(self.window):
+                self._condition.wait()
+            self.in_flight += 1
+            delay = self.take_token()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        started = time.monotonic()
+        slot = Slot()
+        try:
+            yield slot
+        except BaseException:
+            slot.ok = False
+            raise
+        finally:
+            finished = time.monotonic()
+            with self._condition:
+                self.throttled += started - waited_from
+                self.in_flight -= 1
+                self.record(finished - started, slot.ok, finished)
+                self._condition.notify_all()
+
+    def take_token(self) -> float:
+        """Take a token from the bucket, returning how long to wait for it"""
+        now = time.monotonic()
+        rate = self.settings.rate
+        self.tokens = min(self.settings.burst, self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+        self.tokens -= 1
+        return -self.tokens / rate if self.tokens < 0 else 0.0
+
+    def record(self, latency: float, ok: bool, now: float) -> None:
+        settings = self.settings
+        if ok and latency <= settings.target_latency:
+            self.window = min(settings.max_window, self.window + 1 / self.window)
+        elif now - self.decreased_at > latency:
+            self.window = max(settings.min_window, self.window / 2)
+            self.decreased_at = now
+
+
+_settings: SchedulerSettings | None = None
+_schedulers: dict[str, CoreScheduler] = {}
+_lock = threading.Lock()
+
+
+def get_settings() -> SchedulerSettings:
+    """The [Scheduler] settings, read again once the config file changes"""
+    global _settings
+
+    config.load_config()
+    if _settings is None:
+        _settings = config.read_section("Scheduler", SchedulerSettings())
+    return _settings
+
+
+def forget_settings() -> None:
+    global _settings
+
+    _settings = None
+
+
+config.on_reload(forget_settings)
+
+
+def throttled() -> dict[str, float]:
+    """Seconds writes to each core spent waiting for a slot or a token"""
+    with _lock:
+        return {core: round(scheduler.throttled, 6) for core, scheduler in _schedulers.items()}
+
+
+def for_core(core: str) -> CoreScheduler:
+    """The scheduler shared by every write to a core in this process, on the current settings"""
+    settings = get_settings()
+    with _lock:
+        scheduler = _schedulers.get(core)
+        if scheduler is None:
+            scheduler = CoreScheduler(settings, client.get_settings().max_concurrency)
+            _schedulers[core] = scheduler
+        scheduler.settings = settings
+        return scheduler
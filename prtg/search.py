@@ -0,0 +1,131 @@
+from typing import List
+
+import fanout
+import inventory
+import local_base
+
+# share of the query's trigrams a fuzzy match must contain
+FUZZY_OVERLAP = 0.5
+
+# fields each kind is found by, sensors by name only like sensor list --no-cache
+KIND_FIELDS = {"devices": inventory.SEARCH_FIELDS, "sensors": ("name",)}
+
+
+def search(
+    cores: List[str],
+    kind: str,
+    text: str,
+    fuzzy: bool = False,
+    refresh: bool = False,
+    limit: int = None,
+) -> List[dict]:
+    """
+    Ranked search of cached objects on one or more cores.
+
+    Devices whose name, host or tags contain text, and sensors whose name
+    contains it, are returned, best first: exact names, then name prefixes,
+    then names containing text, then hosts or tags containing it. With
+    fuzzy, names sharing most of text's trigrams are added after those,
+    ranked by how much they share, so typos still match.
+
+    Candidates come from the trigram index of the inventory cache, which is
+    brought up to date on every core first. Rows carry their core and score.
+    """
+    result = fanout.query_cores(
+        lambda core: inventory.ensure_fresh(core, kind, refresh), cores
+    )
+    local_base.report_fanout_errors(result)
+    cores = [core for core in cores if core in result.results]
+    if not cores or not text:
+        return []
+
+    text = text.lower()
+    grams = trigrams(text)
+    fields = KIND_FIELDS.get(kind, inventory.SEARCH_FIELDS)
+
+    found = []
+    for row in candidates(cores, kind, text, grams, fuzzy, fields):
+        score = rank(row, text, grams, fields)
+        if score > 1 or (fuzzy and score >= FUZZY_OVERLAP):
+            found.append({**row, "score": round(score, 3)})
+
+    found.sort(key=lambda row: (-row["score"], len(row["name"] or ""), row["name"] or ""))
+    return found[:limit] if limit else found
+
+
+def trigrams(text: str) -> set[str]:
+    text = text.lower()
+    return {text[start : start + 3] for start in range(len(text) - 2)}
+
+
+def candidates(
+    cores: List[str],
+    kind: str,
+    text: str,
+    grams: set,
+    fuzzy: bool,
+    fields: tuple = inventory.SEARCH_FIELDS,
+) -> List[dict]:
+    """
+    Objects that may match text in one of fields, narrowed by the trigram index.
+
+    Text shorter than a trigram, or a cache without the index, falls back
+    to scanning the objects of the cores.
+    """
+    columns = ", ".join(f'o."{field}"' for field in inventory.FIELDS)
+    core_marks = ", ".join("?" for _ in cores)
+    query = f"SELECT o.core, {columns} FROM objects o"
+    where = f"o.core IN ({core_marks}) AND o.kind = ?"
+    params = [*cores, kind]
+
+    if grams and inventory.has_search_index():
+        where += " AND o.rowid IN (SELECT rowid FROM search WHERE search MATCH ?)"
+        match = "{" + " ".join(fields) + "} : " + quote(text)
+        if fuzzy:
+            # names sharing any trigram, rank() keeps the close ones
+            match += " OR name : (" + " OR ".join(quote(gram) for gram in grams) + ")"
+        params.append(match)
+
+    rows = inventory.connect().execute(f"{query} WHERE {where}", params)
+    return [dict(row) for row in rows]
+
+
+def quote(text: str) -> str:
+    """An fts5 string literal, matched as a substring by the trigram tokenizer"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def rank(row: dict, text: str, grams: set, fields: tuple = inventory.SEARCH_FIELDS) -> float:
+    """
+    Score a candidate: 2 to 5 for substring matches in fields, the share of
+    the query's trigrams in the name for fuzzy ones.
+    """
+    name = (row.get("name") or "").lower()
+    if name == text:
+        return 5.0
+    if name.startswith(text):
+        return 4.0
+    if text in name:
+        return 3.0
+    if any(text in (row.get(field) or "").lower() for field in fields if field != "name"):
+        return 2.0
+    if not grams:
+        return 0.0
+    return len(grams & trigrams(name)) / len(grams)
+
+
+def complete(kind: str, incomplete: str, core: str = None, limit: int = 20) -> List[str]:
+    """
+    Names for shell completion, from whatever is already cached.
+
+    Completion never contacts a core or refreshes the cache, it has to
+    answer while the user types.
+    """
+    query = "SELECT DISTINCT name FROM objects WHERE kind = ? AND name LIKE ? ESCAPE '\\'"
+    params = [kind, incomplete.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"]
+    if core is not None:
+        query += " AND core = ?"
+        params.append(core)
+
+    rows = inventory.connect().execute(query + " ORDER BY name LIMIT ?", (*params, limit))
+    return [row["name"] for row in rows]
@@ -1,12 +1,15 @@
-from dataclasses import dataclass, asdict
+from pathlib import Path
+import sys
 import typer
-import config
-import re
 from rich import print
-from typing import List, Optional
+from typing import Iterator, List
 from typing_extensions import Annotated
-import local_base
-import time
+import bulk
+import query
+import search
+import api
+import journal
+import status_watch
 import terminal_outputs as outputs
 from enum import Enum
 
@@ -16,22 +19,9 @@ app = typer.Typer(no_args_is_help=True)
 class Output(str, Enum):
     text = "text"
     table = "table"
-
-
-@dataclass
-class QueryParams:
-    action: Optional[int] = None
-    apitoken: Optional[str] = None
-    columns: Optional[str] = None
-    content: Optional[str] = "sensors"
-    count: Optional[str] = "50000"
-    filter_name: Optional[str] = None
-    filter_objid: Optional[str] = None
-    filter_tags: Optional[list[str]] = None
-    id: Optional[str] = None
-    name: Optional[str] = None
-    output: Optional[str] = "json"
-    targetid: Optional[int] = None
+    csv = "csv"
+    ndjson = "ndjson"
+    ids = "ids"
 
 
 # TODO: Implement a way to accept several name types. For now we only accept 1 sensor ID
@@ -49,6 +39,12 @@ def duplicate(
     target_device: Annotated[
         str, typer.Option(help="IDs of the device needing the sensor")
     ] = None,
+    workers: Annotated[
+        int, typer.Option(help="Number of target devices processed at once")
+    ] = 8,
+    resume: Annotated[
+        str, typer.Option(help="Job to finish, devices it already covered are skipped")
+    ] = None,
 ) -> None:
     """
     Copy a sensor type from one device to one or multiple devices.
@@ -57,49 +53,45 @@ def duplicate(
     Copy sensor to single device:  prtg sensor duplicate serveronprem Ping --source_sensor 35921 --target device 52345.
 
     Copy sensor to multiple devices: prtg sensor duplicate serveronprem Ping --source_sensor 35921 --target device '52345 7231 56790 34219'.
-    """
 
-    token = config.get_token(core)
+    Target devices are processed in parallel, the writes are paced by the
+    core's scheduler (see the [Scheduler] config section). Devices that
+    already have a sensor of that name on the core are skipped, checked
+    with one batched read before any sensor is copied.
+
+    Every device is recorded in a job journal. When a run is cut short,
+    finish it with --resume <job>.
+    """
 
-    expression = re.compile(r"sensor\.htm\?id=(?P<sensor_id>\d+)")
     target_device = target_device.split()
     source_sensor = source_sensor.split()
 
-    for target_ID in target_device:
-        print(f"Sensors being Applied to Device: {target_ID}")
-        print("===================START=====================")
-
-        for sensor_id in source_sensor:
-            if has_sensor(core, target_ID, token=token, sensor_name=sensor_name):
-                print(f"Sensor:{sensor_name}, Already applied to device:{target_ID}")
-                print("Remove sensor nor change sensor name before applying duplicate")
-                continue
-
-            print(f"Applying {sensor_name} sensor")
-
-            url = local_base.base_url(core, action="duplicate")
-            url_params = QueryParams(
-                id=sensor_id, name=sensor_name, targetid=target_ID, apitoken=token
-            )
-
-            response_text = local_base.PRTG_Get_request(url, asdict(url_params))
+    job = journal.open_job(
+        "duplicate", core, resume, sensor_name=sensor_name, source_sensor=source_sensor
+    )
+    progress = bulk.Throughput(total=len([d for d in target_device if d not in job.done]))
+    prtg = api.PRTGClient(core, workers=workers, interruptible=True)
+
+    with journal.reporting(job):
+        for result in prtg.duplicate(source_sensor, sensor_name, target_device, job):
+            progress.add(result)
+            if result.ok:
+                applied = [
+                    f"{sensor_name} already applied, skipped" if new_id is None
+                    else f"{sensor_id} -> {new_id}"
+                    for sensor_id, new_id in result.value.items()
+                ]
+                print(f"Device {result.item}: {', '.join(applied)}")
+            else:
+                print(f"[bold red]Device {result.item} failed: {result.error}")
+            print(f"  {progress.line()}")
 
-            # the response text will have the new sensor ID embedded within it
-            # the folloing lines uses regex to pull out that id
-            matches = expression.search(response_text)
-            new_id = matches.group("sensor_id")
-            print(f"{sensor_name} sensor applied to device, with id = {new_id}")
-            time.sleep(1.5)
+    print("=====================END=====================")
+    print(f"Devices updated: {progress.done}, failed: {progress.failed}")
 
-            # When copied, sensor will be paused
-            print(f"Activating sensor, {new_id}...")
-            resume(core, new_id, token)
-            # sleep to allow time for command to execute
-            time.sleep(1.5)
-            print(f"{sensor_name} sensor = {new_id}")
 
-        print("=====================END=====================")
-        print()
+def complete_sensor_name(ctx: typer.Context, incomplete: str) -> List[str]:
+    return search.complete("sensors", incomplete, ctx.params.get("core"))
 
 
 # TODO: Add docstring to explain the default return value
@@ -110,7 +102,13 @@ def list(
     tags: Annotated[
         List[str], typer.Option(help="Tags listed on associated sensor")
     ] = None,
-    name: Annotated[str, typer.Option(help="Name of Sensor being queried")] = None,
+    name: Annotated[
+        str,
+        typer.Option(help="Name of Sensor being queried", autocompletion=complete_sensor_name),
+    ] = None,
+    fuzzy: Annotated[
+        bool, typer.Option("--fuzzy", help="Also match sensor names close to --name")
+    ] = False,
     paused: Annotated[
         bool, typer.Option("--paused", help="List only pasused sensors")
     ] = False,
@@ -120,97 +118,251 @@ def list(
             "--output", "-o", help="Output format of command", case_sensitive=False
         ),
     ] = Output.text,
-) -> List[str]:
+    refresh: Annotated[
+        bool, typer.Option("--refresh", help="Download the inventory cache again")
+    ] = False,
+    no_cache: Annotated[
+        bool, typer.Option("--no-cache", help="Query the core instead of the cache")
+    ] = False,
+) -> None:
     """
     List Sensors based on query parameters.
 
+    --output csv, ndjson or ids write one line per sensor as pages arrive.
 
-    If --name is used, value in --tag will be ignored.
+    If --name is used, value in --tag will be ignored. --name matches
+    anywhere in the sensor name, case insensitive, exact names first.
 
+    Sensors are read from the local inventory cache unless --no-cache is set.
     """
 
-    token = config.get_token(core)
-    url = local_base.query_url(core)
-    # + f"?content=sensors&output=json&columns=objid,name,device&apitoken={token}&count=50000"
-    url_params = asdict(QueryParams(columns="objid,name,device", apitoken=token))
-
-    if name is not None:
-        device_only = True
-        url_params["filter_name"] = name
-    elif tags is not None:
-        for tag in tags:
-            # url = url + f"&filter_tags=@tag({tag})"
-            # url_params["filter_tags"] = "@tag({tag}"
-
-            if url_params["filter_tags"]:
-                url_params["filter_tags"].append(f"@tag({tag})")
-            else:
-                url_params["filter_tags"] = [f"@tag({tag})"]
+    # name, tags and paused are all filtered on the core, tags match any given tag
+    statuses = sorted(api.PAUSED_STATUSES) if paused else []
+    sensor_query = query.TableQuery(
+        "sensors",
+        "objid,name,device",
+        name_contains=name,
+        any_tags=(tags or []) if name is None else [],
+        statuses=statuses,
+    )
+    device_only = name is not None
+
+    if name is not None and not no_cache:
+        # ranked lookup in the local search index
+        found = search.search([core], "sensors", name, fuzzy, refresh)
+        if statuses:
+            found = [sensor for sensor in found if str(sensor["status_raw"]) in statuses]
+        pages = [found]
+    else:
+        pages = query.read(core, sensor_query, not no_cache, refresh)
+
+    # pages are written as they arrive, only the table output keeps any sensors
+    count = outputs.write_pages(
+        pages,
+        output.value,
+        ["objid", "name", "device"],
+        lambda sensors: outputs.sensor_table(sensors, device_only),
+    )
 
-    if paused:
-        url_params["filter_status"] = ["7", "8"]
+    outputs.total(f"Total Sensors: {count}", output.value)
 
-    sensors = local_base.PRTG_Get_request(url, url_params)["sensors"]
 
-    sensors = sorted(sensors, key=lambda s: s["name"])
-    sensor_ids = " ".join([str(sensor["objid"]) for sensor in sensors])
+class WatchOutput(str, Enum):
+    table = "table"
+    ndjson = "ndjson"
 
-    if output == Output.table:
-        outputs.sensor_table(sensors, device_only)
-    else:
-        print(sensor_ids)
 
-    print(f"Total Sensors: {len(sensor_ids)}")
-    return sensor_ids
+@app.command(no_args_is_help=True)
+def watch(
+    cores: Annotated[List[str], typer.Argument(help="PRTG cores to watch")],
+    interval: Annotated[
+        float, typer.Option(min=1, help="Seconds between polls of the cores")
+    ] = 30,
+    status: Annotated[
+        List[str],
+        typer.Option(help="Raw status values to watch, by default the problem statuses"),
+    ] = None,
+    all_statuses: Annotated[
+        bool, typer.Option("--all", help="Watch every sensor whatever its status")
+    ] = False,
+    name: Annotated[
+        str,
+        typer.Option(help="Watch only sensors with this in their name", autocompletion=complete_sensor_name),
+    ] = None,
+    tags: Annotated[
+        List[str], typer.Option(help="Watch only sensors with any of these tags")
+    ] = None,
+    polls: Annotated[
+        int, typer.Option(help="Stop after this many polls, by default run until Ctrl-C")
+    ] = None,
+    output: Annotated[
+        WatchOutput,
+        typer.Option("--output", "-o", help="Output format of command", case_sensitive=False),
+    ] = WatchOutput.table,
+) -> None:
+    """
+    Follow sensor status changes on one or more cores.
+
+    The watched sensors are listed once, then only the sensors whose
+    status changed since the last poll are printed. Sensors that are new
+    show as coming from new, sensors that no longer match show as cleared,
+    e.g. a down sensor that is up again.
+
+    prtg sensor watch serveronprem networkdc --interval 15
+
+    Each poll asks every core at once for a few columns of the sensors in a
+    watched status, down, warning, unusual or unknown unless --status or
+    --all is given. A core that stops answering is skipped until it
+    recovers. --output ndjson writes one line per change, for piping,
+    starting with every watched sensor as new.
+    """
+    table_query = query.TableQuery(
+        "sensors",
+        status_watch.WATCH_COLUMNS,
+        any_tags=tags or [],
+        name_contains=name,
+        statuses=[] if all_statuses else status or status_watch.PROBLEM_STATUSES,
+        sortby="objid",
+    )
+    writer = None
+    if output == WatchOutput.ndjson:
+        fields = ["time", "core", "objid", "device", "name", "before", "after", "message"]
+        writer = outputs.RecordWriter("ndjson", fields)
+
+    try:
+        for first, changes in status_watch.watch(cores, table_query, interval, polls):
+            if writer is not None:
+                # the sensors watched from the start come first, as new
+                for core, snapshot in first.items():
+                    changes = status_watch.diff(core, {}, snapshot) + changes
+                for change in changes:
+                    writer.write(change.record())
+                sys.stdout.flush()
+                continue
+
+            if first:
+                sensors = [
+                    {**row, "core": core} if len(cores) > 1 else row
+                    for core, snapshot in first.items()
+                    for row in snapshot.values()
+                ]
+                outputs.create_sensor_status_table(sensors, f"Watching {len(sensors)} sensors")
+            outputs.status_changes(changes)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+def read_ids(ids: List[str] = None, file: Path = None) -> List[str]:
+    """
+    Object IDs from arguments, a file, or stdin when an argument is "-".
+
+    IDs may be separated by spaces, commas or newlines, anything that is
+    not a number (such as a CSV header) is skipped. Duplicates are dropped.
+    """
+
+    def split(lines) -> Iterator[str]:
+        for line in lines:
+            yield from (value for value in line.replace(",", " ").split() if value.isdigit())
+
+    found = []
+    for value in ids or []:
+        found.extend(split(sys.stdin) if value == "-" else split([value]))
+
+    if file is not None:
+        with open(file) as f:
+            found.extend(split(f))
+
+    return [*dict.fromkeys(found)]
+
+
+def change_pause(
+    core: str,
+    object_ids: List[str],
+    paused: bool,
+    message: str = None,
+    duration: int = None,
+    workers: int = 8,
+    token: str = None,
+) -> None:
+    """
+    Pause or resume many objects and report what the core confirms.
+
+    See api.PRTGClient.change_pause, exits 1 when any object did not change.
+    """
+    action = "Pausing" if paused else "Resuming"
+
+    def report(changed: int, sent: int) -> None:
+        print(f"{action} {changed} of {sent} objects")
+
+    prtg = api.PRTGClient(core, token, workers, interruptible=True)
+    result = prtg.change_pause(object_ids, paused, message, duration, on_chunk=report)
+
+    for objid, error in result.failed.items():
+        print(f"[bold red]Failed {objid}: {error}")
+
+    state = "paused" if paused else "active"
+    print(f"Confirmed {state}: {len(result.confirmed)} of {len(object_ids)}")
+    if result.unconfirmed:
+        print(f"[bold red]Not {state}: {' '.join(result.unconfirmed)}")
+        raise typer.Exit(1)
 
 
 @app.command(no_args_is_help=True)
 def resume(
     core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
-    sensor_id: Annotated[str, typer.Argument(help="ID of the sensor to be resumed")],
+    sensor_id: Annotated[
+        List[str], typer.Argument(help="IDs of the sensors or devices to resume, - reads stdin")
+    ] = None,
+    file: Annotated[
+        Path,
+        typer.Option("--file", "-f", exists=True, dir_okay=False, help="File to read in object IDs"),
+    ] = None,
+    workers: Annotated[int, typer.Option(help="Number of requests sent at once")] = 8,
     token: Annotated[str, typer.Option(help="User token for the given core")] = None,
 ):
     """
-    Resumes metrics gatering on a sensor that is in a non-active statee
+    Resumes metrics gatering on sensors or devices that are in a non-active state
 
     Non-Active states: Unknown, Warning, PausedbyUser, Unussual, PausedUntil, DownAcknowledsge
+
+    prtg sensor resume serveronprem 35921 35922 --file maintenance.csv
     """
-    sensor_id = sensor_id.split()
-    if token is None:
-        token = config.get_token(core)
+    object_ids = read_ids(sensor_id, file)
+    if not object_ids:
+        print("No object IDs given")
+        raise typer.Exit(1)
 
-    for sensor in sensor_id:
-        url = local_base.base_url(core, action="pause")
-        # + f"pause.htm?id={sensor}&action=1&apitoken={token}"
-        url_params = asdict(QueryParams(id=sensor, apitoken=token, action=1))
-        local_base.PRTG_Get_request(url, url_params)
-        time.sleep(3)
-        print(f"sensor Activation for, {sensor} is successful")
+    change_pause(core, object_ids, paused=False, workers=workers, token=token)
 
 
 @app.command(no_args_is_help=True)
 def pause(
     core: Annotated[str, typer.Argument(help="PRTG core to connect to")],
-    sensor_id: Annotated[str, typer.Argument(help="ID of the sensor to be resumed")],
+    sensor_id: Annotated[
+        List[str], typer.Argument(help="IDs of the sensors or devices to pause, - reads stdin")
+    ] = None,
+    file: Annotated[
+        Path,
+        typer.Option("--file", "-f", exists=True, dir_okay=False, help="File to read in object IDs"),
+    ] = None,
     message: Annotated[str, typer.Option(help="Reason for pausing device")] = None,
+    duration: Annotated[
+        int, typer.Option(help="Minutes until the objects resume on their own")
+    ] = None,
+    workers: Annotated[int, typer.Option(help="Number of requests sent at once")] = 8,
     token: Annotated[str, typer.Option(help="User token for the given core")] = None,
 ):
     """
-    Paues metrics gatering on a sensor that in a collecting or up state
-    """
-
-    if token is None:
-        token = config.get_token(core)
+    Paues metrics gatering on sensors or devices that are in a collecting or up state
 
-    url = local_base.base_url(core, action="pause")
-    # + f"pause.htm?id={sensor_id}&action=0&apitoken={token}"
-    url_params = asdict(QueryParams(id=sensor_id, apitoken=token, action=0))
-
-    if message is not None:
-        url_params["pausemsg"] = message
+    cat maintenance.txt | prtg sensor pause serveronprem - --duration 60 --message "patching"
+    """
+    object_ids = read_ids(sensor_id, file)
+    if not object_ids:
+        print("No object IDs given")
+        raise typer.Exit(1)
 
-    local_base.PRTG_Get_request(url, url_params)
-    time.sleep(1.5)
+    change_pause(core, object_ids, True, message, duration, workers, token)
 
 
 def has_sensor(
@@ -219,55 +371,36 @@ def has_sensor(
     token: str = None,
     sensor_id: str = None,
     sensor_name: str = None,
+    use_cache: bool = True,
 ) -> bool:
     """
-    Get a list of Devices associated with the a particular sensor.
+    Check whether a device has a sensor of a given name.
 
     Arguments:
        sensor_name:
            name of sensor of interest. value given is case sensitive
+        sensor_id:
+            looked up for its name when no sensor_name is given
         device_id:
             id of the device of interest.
 
-    Returns:
-        A list of strings containing the device IDs
+        use_cache:
+            answer from the local inventory cache instead of the core
+
+    To check many devices use api.sensor_index, which reads them all at once.
     """
 
     if sensor_name is None:
         if sensor_id is None:
             print("Function needs a sensor id or a sensor name to perform search")
-            typer.Exit(code=1)
-        else:
-            sensor_name = get_sensor_name(sensor_id, core, token)
-
-    if token is None:
-        token = config.get_token(core)
-
-    url = local_base.query_url(core)
-    # + f"?content=sensors&id={device_id}&output=json&columns=objid,name,device&apitoken={token}&count=50000&filter_name={sensor_name}"
-    url_params = asdict(
-        QueryParams(
-            id=device_id,
-            columns="objid,name,device",
-            apitoken=token,
-            filter_name=sensor_name,
-        )
-    )
+            raise typer.Exit(code=1)
+        sensor_name = get_sensor_name(sensor_id, core, token)
 
-    return (
-        True
-        if len(local_base.PRTG_Get_request(url, url_params)["sensors"]) > 0
-        else False
-    )
+    return (str(device_id), sensor_name) in api.sensor_index(core, [device_id], token, use_cache)
 
 
 def get_sensor_name(sensor_id: str, core: str, token: str) -> str:
-    url = local_base.query_url(core)
-    # + f"?content=sensors&output=json&columns=objid,name,device&apitoken={token}&count=50000&filter_objid={sensor_id}"
-    url_params = asdict(
-        QueryParams(columns="objid,name,device", apitoken=token, filter_objid=sensor_id)
-    )
-    return local_base.PRTG_Get_request(url, url_params)["sensors"][0]["name"]
+    return api.sensor_names(core, [sensor_id], token)[str(sensor_id)]
 
 
 # TODO: Add a command named sensor 'status' that will return sensor data.
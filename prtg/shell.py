@@ -0,0 +1,191 @@
+import os
+import shlex
+import sys
+
+import typer
+from platformdirs import user_state_dir
+from rich import print
+
+import local_base
+
+app = typer.Typer()
+
+PROMPT = "prtg> "
+HISTORY_FILE = f"{user_state_dir()}/prtg_history"
+HISTORY_LENGTH = 1000
+
+# command groups whose arguments after the core are names of cached objects
+OBJECT_KINDS = {"device": "devices", "sensor": "sensors", "channel": "sensors"}
+
+
+@app.callback(invoke_without_command=True)
+def shell() -> None:
+    """
+    Run prtg commands one after another in a single process.
+
+    Commands are typed without the leading prtg. Core sessions, the
+    inventory cache and the loaded config stay open between commands, so
+    only the first command pays for imports and connections. Tab completes
+    commands, options, cores and the names of cached devices and sensors.
+
+    prtg shell
+    prtg> device search serveronprem web
+    prtg> sensor pause serveronprem 35921 --duration 30
+
+    exit, quit or Ctrl-D leave the shell. Commands can also be piped in,
+    one per line: prtg shell < incident.txt
+    """
+    history = start_readline()
+    print("prtg shell, type help for the commands, exit to leave")
+
+    while True:
+        try:
+            line = input(PROMPT)
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+
+        if line.strip() in ("exit", "quit"):
+            break
+        run_line(line)
+
+    if history is not None:
+        try:
+            os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+            history.write_history_file(HISTORY_FILE)
+        except OSError:
+            pass
+
+
+def run_line(line: str) -> int:
+    """Run one shell line as a prtg command, returning its exit code"""
+    try:
+        args = shlex.split(line)
+    except ValueError as error:
+        print(f"[bold red]{error}")
+        return 2
+
+    if not args:
+        return 0
+    if args == ["help"]:
+        args = ["--help"]
+    if args[0] == "shell":
+        print("Already in the shell")
+        return 1
+
+    try:
+        result = local_base.app(args, prog_name="prtg", standalone_mode=False)
+    except SystemExit as exit:
+        return exit.code if isinstance(exit.code, int) else 1
+    except KeyboardInterrupt:
+        print("[bold yellow]Interrupted")
+        return 130
+    except Exception as error:
+        # usage errors know how to show themselves, anything else is a failed command
+        show = getattr(error, "show", None)
+        if show is not None:
+            show()
+            return getattr(error, "exit_code", 1)
+        print(f"[bold red]{type(error).__name__}: {error}")
+        return 1
+    return result if isinstance(result, int) else 0
+
+
+def start_readline():
+    """
+    Set up line editing, history and tab completion on a terminal where
+    readline exists. Commands piped in from a file run without them.
+    """
+    if not sys.stdin.isatty():
+        return None
+    try:
+        import readline
+    except ImportError:
+        return None
+
+    try:
+        readline.read_history_file(HISTORY_FILE)
+    except OSError:
+        pass
+    readline.set_history_length(HISTORY_LENGTH)
+    readline.set_completer_delims(" \t\n")
+    readline.set_completer(Completer(readline.get_line_buffer))
+    readline.parse_and_bind("tab: complete")
+    return readline
+
+
+class Completer:
+    """readline completer for shell lines, see complete_words"""
+
+    def __init__(self, line_buffer):
+        self.line_buffer = line_buffer
+        self.matches = []
+
+    def __call__(self, text: str, state: int) -> str | None:
+        if state == 0:
+            try:
+                words = shlex.split(self.line_buffer())
+            except ValueError:
+                words = self.line_buffer().split()
+            if text == "" or not words:
+                words.append("")
+            self.matches = complete_words(words)
+        return self.matches[state] if state < len(self.matches) else None
+
+
+def complete_words(words: list) -> list:
+    """
+    Completions of the last of words, the command line typed so far.
+
+    The first words complete to command groups and their commands, words
+    starting with - to the command's options, the word after the command to
+    a core and later words to names of cached objects on that core. Object
+    names only come from the inventory cache, completion never waits on a
+    core.
+    """
+    *typed, text = words
+
+    if not typed:
+        return matching(["help", "exit", *local_base.LazyGroup.lazy_subcommands], text)
+
+    group = group_command(typed[0])
+    if group is None:
+        return []
+    if len(typed) == 1:
+        return matching(group.list_commands(None), text)
+
+    command = group.get_command(None, typed[1])
+    if command is None:
+        return []
+    if text.startswith("-"):
+        options = [opt for param in command.params for opt in getattr(param, "opts", [])]
+        return matching([option for option in options if option.startswith("-")], text)
+
+    core_names = [core.name for core in local_base.cores]
+    if len(typed) == 2:
+        return matching(core_names, text)
+
+    kind = OBJECT_KINDS.get(typed[0])
+    if kind is None or typed[2] not in core_names:
+        return []
+
+    # imported here so the shell starts without sqlite
+    import search
+
+    names = search.complete(kind, text.strip("'\""), typed[2])
+    return [shlex.quote(name) for name in names]
+
+
+def group_command(name: str):
+    """The click group of a prtg command group, imported on first use"""
+    if name not in local_base.LazyGroup.lazy_subcommands or name == "shell":
+        return None
+    root = typer.main.get_group(local_base.app)
+    return root.get_command(None, name)
+
+
+def matching(words: list, text: str) -> list:
+    return [word for word in words if word.startswith(text)]
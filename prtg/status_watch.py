@@ -0,0 +1,118 @@
+import time
+from dataclasses import dataclass
+from typing import Iterator, List
+
+import config
+import fanout
+import local_base
+import query
+
+# the few columns a watch needs, every poll downloads them for each watched sensor
+WATCH_COLUMNS = "objid,device,name,status,message"
+
+# Unknown, Warning, Down, Unusual, Down Acknowledged and Down Partial
+PROBLEM_STATUSES = ["1", "4", "5", "10", "13", "14"]
+
+
+@dataclass
+class Transition:
+    """A watched sensor whose status changed between two polls"""
+
+    core: str
+    objid: int
+    device: str
+    name: str
+    before: str | None
+    after: str | None
+    message: str = ""
+
+    def record(self) -> dict:
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "core": self.core,
+            "objid": self.objid,
+            "device": self.device,
+            "name": self.name,
+            "before": self.before,
+            "after": self.after,
+            "message": self.message,
+        }
+
+
+def snapshot(core: str, table_query: query.TableQuery) -> dict:
+    """Watched sensors of a core by objid, read from the core itself"""
+    prtg = config.get_client(core)
+    return {
+        row["objid"]: row
+        for page in prtg.read_pages(table_query.params(), "sensors")
+        for row in page
+        if table_query.remaining(row)
+    }
+
+
+def diff(core: str, previous: dict, current: dict) -> List[Transition]:
+    """
+    Status changes of one core's sensors between two snapshots.
+
+    Sensors new to the snapshot come in with before None, sensors that
+    dropped out of it, such as a down sensor that is up again while only
+    problem statuses are watched, leave with after None.
+    """
+
+    def transition(row: dict, before: str | None, after: str | None) -> Transition:
+        message = row.get("message_raw", row.get("message")) or ""
+        return Transition(core, row["objid"], row.get("device"), row.get("name"), before, after, message)
+
+    changes = []
+    for objid, row in current.items():
+        old = previous.get(objid)
+        if old is None:
+            changes.append(transition(row, None, row.get("status")))
+        elif old.get("status_raw") != row.get("status_raw"):
+            changes.append(transition(row, old.get("status"), row.get("status")))
+
+    for objid, row in previous.items():
+        if objid not in current:
+            changes.append(transition(row, row.get("status"), None))
+
+    return changes
+
+
+def watch(
+    cores: List[str],
+    table_query: query.TableQuery,
+    interval: float,
+    polls: int = None,
+) -> Iterator[tuple[dict, List[Transition]]]:
+    """
+    Poll the watched sensors of every core, yielding what is new each time.
+
+    Each poll yields the snapshots of cores read for the first time, by
+    core, and the transitions of every other core since its last poll.
+    All cores are read in one fanout per interval, timed from the start of
+    each poll so a slow core does not make the polls drift. A core that
+    fails keeps its last snapshot, so a missed poll is not reported as
+    every sensor clearing, and cores with an open breaker are not asked
+    until they recover.
+    """
+    snapshots = {}
+    poll = 0
+
+    while polls is None or poll < polls:
+        started = time.monotonic()
+        result = fanout.query_cores(lambda core: snapshot(core, table_query), cores)
+        local_base.report_fanout_errors(result)
+
+        first = {}
+        changes = []
+        for core, current in result.results.items():
+            if core in snapshots:
+                changes.extend(diff(core, snapshots[core], current))
+            else:
+                first[core] = current
+            snapshots[core] = current
+        yield first, changes
+
+        poll += 1
+        if polls is None or poll < polls:
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
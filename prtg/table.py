@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+import client
+import local_base
+
+# filter_objid values sent per request, keeps URLs well under server limits
+OBJID_CHUNK = 100
+
+
+def fetch_page(url: str, params: dict, content: str, start: int, count: int) -> list:
+    page_params = {**params, "start": start, "count": count}
+    return local_base.PRTG_Get_request(url, page_params)[content]
+
+
+def read_pages(
+    url: str,
+    params: dict,
+    content: str,
+    page_size: int = None,
+    prefetch: bool = False,
+) -> Iterator[list]:
+    """
+    Page through a table.json query with start/count, yielding one page at a time.
+
+    With prefetch the next page is requested in the background while the
+    caller works on the current one. Paging stops on the first short page.
+    """
+    if page_size is None:
+        page_size = client.get_settings().page_size
+
+    start = 0
+    if not prefetch:
+        while True:
+            page = fetch_page(url, params, content, start, page_size)
+            yield page
+            if len(page) < page_size:
+                return
+            start += page_size
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") as pool:
+        pending = pool.submit(fetch_page, url, params, content, start, page_size)
+        while True:
+            page = pending.result()
+            if len(page) < page_size:
+                yield page
+                return
+
+            start += page_size
+            pending = pool.submit(fetch_page, url, params, content, start, page_size)
+            yield page
+
+
+def read_table(
+    url: str,
+    params: dict,
+    content: str,
+    page_size: int = None,
+    prefetch: bool = False,
+) -> Iterator[dict]:
+    """Yield the rows of a table.json query as each page arrives"""
+    for page in read_pages(url, params, content, page_size, prefetch):
+        yield from page
+
+
+def read_objids(
+    url: str,
+    params: dict,
+    content: str,
+    objids: list,
+    chunk_size: int = OBJID_CHUNK,
+) -> Iterator[dict]:
+    """Yield the rows of a table.json query for many objids, chunked by filter_objid"""
+    return read_filtered(url, params, content, "objid", objids, chunk_size)
+
+
+def read_filtered(
+    url: str,
+    params: dict,
+    content: str,
+    column: str,
+    values: list,
+    chunk_size: int = OBJID_CHUNK,
+) -> Iterator[dict]:
+    """Yield the rows of a table.json query matching any of values, chunked by filter_<column>"""
+    values = [str(value) for value in values]
+    for start in range(0, len(values), chunk_size):
+        chunk_params = {**params, f"filter_{column}": values[start : start + chunk_size]}
+        yield from read_table(url, chunk_params, content)
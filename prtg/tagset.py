@@ -0,0 +1,207 @@
+import csv
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+
+class TagSet:
+    """
+    Ordered set of PRTG tags.
+
+    PRTG stores tags as one string separated by spaces or commas. Membership,
+    union and difference work on whole tags, so removing "web" never touches
+    "webserver", and duplicates collapse to their first occurrence.
+    """
+
+    def __init__(self, tags: Iterable[str] | str = ()):
+        if isinstance(tags, str):
+            tags = re.split(r"[\s,]+", tags)
+        self._tags = dict.fromkeys(tag for tag in tags if tag)
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self._tags
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tags)
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TagSet):
+            other = TagSet(other)
+        return self._tags.keys() == other._tags.keys()
+
+    def __or__(self, other: Iterable[str] | str) -> "TagSet":
+        return TagSet([*self, *TagSet(other)])
+
+    def __sub__(self, other: Iterable[str] | str) -> "TagSet":
+        other = TagSet(other)
+        return TagSet(tag for tag in self if tag not in other)
+
+    def __str__(self) -> str:
+        return " ".join(self._tags)
+
+    def __repr__(self) -> str:
+        return f"TagSet({str(self)!r})"
+
+
+@dataclass
+class TagRule:
+    """
+    Desired tags for the devices selected by objid or by a name regex.
+
+    tags replaces the device's tags outright when set, otherwise add and
+    remove are applied to whatever tags the device has.
+    """
+
+    objid: str | None = None
+    name: str | None = None
+    tags: TagSet | None = None
+    add: TagSet = field(default_factory=TagSet)
+    remove: TagSet = field(default_factory=TagSet)
+
+    def selects(self, device: dict) -> bool:
+        if self.objid is not None:
+            return str(device["objid"]) == self.objid
+        return re.search(self.name, device.get("name") or "", re.IGNORECASE) is not None
+
+    def apply(self, current: TagSet) -> TagSet:
+        if self.tags is not None:
+            return self.tags
+        return (current | self.add) - self.remove
+
+
+@dataclass
+class TagChange:
+    """Planned tag change on one device"""
+
+    objid: str
+    name: str
+    current: TagSet
+    target: TagSet
+    edit: Callable[[TagSet], TagSet]
+
+    @property
+    def added(self) -> TagSet:
+        return self.target - self.current
+
+    @property
+    def removed(self) -> TagSet:
+        return self.current - self.target
+
+
+def load_rules(path: Path) -> list[TagRule]:
+    """
+    Read a desired-state file.
+
+    CSV files need an objid or name column and any of tags, add and remove.
+    YAML files (needs PyYAML) look like:
+
+        devices:
+          "1234": "role:webserver env:prod"
+        rules:
+          - name: "^web"
+            add: [role:webserver]
+            remove: [legacy]
+    """
+    if path.suffix.lower() in (".yml", ".yaml"):
+        return load_yaml_rules(path)
+
+    rules = []
+    with open(path, encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            rules.append(
+                TagRule(
+                    objid=row.get("objid") or None,
+                    name=row.get("name") or None,
+                    tags=TagSet(row["tags"]) if row.get("tags") else None,
+                    add=TagSet(row.get("add") or ""),
+                    remove=TagSet(row.get("remove") or ""),
+                )
+            )
+    return rules
+
+
+def load_yaml_rules(path: Path) -> list[TagRule]:
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("YAML desired-state files need PyYAML, use a CSV file instead")
+
+    with open(path) as f:
+        document = yaml.safe_load(f) or {}
+
+    rules = [
+        TagRule(objid=str(objid), tags=TagSet(value or ""))
+        for objid, value in (document.get("devices") or {}).items()
+    ]
+    for rule in document.get("rules") or []:
+        rules.append(
+            TagRule(
+                objid=str(rule["objid"]) if "objid" in rule else None,
+                name=rule.get("name"),
+                tags=TagSet(rule["tags"]) if "tags" in rule else None,
+                add=TagSet(rule.get("add") or ""),
+                remove=TagSet(rule.get("remove") or ""),
+            )
+        )
+    return rules
+
+
+class RuleIndex:
+    """Rules of a desired-state file, looked up by device"""
+
+    def __init__(self, rules: list[TagRule]):
+        self.by_objid = {}
+        self.by_name = []
+        for rule in rules:
+            if rule.objid is not None:
+                self.by_objid.setdefault(rule.objid, []).append(rule)
+            elif rule.name is not None:
+                self.by_name.append(rule)
+
+    def matching(self, device: dict) -> list[TagRule]:
+        """The rules selecting a device, in file order for each kind of selector"""
+        return self.by_objid.get(str(device["objid"]), []) + [
+            rule for rule in self.by_name if rule.selects(device)
+        ]
+
+
+def selected(devices: Iterable[dict], rules: list[TagRule]) -> Iterator[dict]:
+    """The devices at least one rule selects"""
+    index = RuleIndex(rules)
+    return (device for device in devices if index.matching(device))
+
+
+def plan(devices: Iterable[dict], rules: list[TagRule]) -> list[TagChange]:
+    """
+    Diff the desired state against the devices' current tags.
+
+    Rules are applied in file order, later rules see the result of earlier
+    ones. Only devices whose tags end up different are returned. The tags
+    of each device should be its own, as getobjectproperty reads them:
+    table.json adds the tags inherited from groups, which the device
+    itself may still lack.
+    """
+    index = RuleIndex(rules)
+
+    changes = []
+    for device in devices:
+        matched = index.matching(device)
+        if not matched:
+            continue
+
+        def edit(tags: TagSet, matched=matched) -> TagSet:
+            for rule in matched:
+                tags = rule.apply(tags)
+            return tags
+
+        current = TagSet(device.get("tags") or "")
+        target = edit(current)
+        if target != current:
+            changes.append(
+                TagChange(str(device["objid"]), device.get("name") or "", current, target, edit)
+            )
+    return changes
@@ -1,7 +1,85 @@
+import csv
+import json
+import sys
+import time
+from typing import Callable, Iterable
+
 from rich.console import Console
+from rich.markup import escape
 from rich.table import Table
 
 
+# rows rendered by table output, the rest is only counted
+TABLE_LIMIT = 1000
+
+# output formats that write one line per record, for piping into other tools
+RECORD_OUTPUTS = ("csv", "ndjson", "ids")
+
+
+class RecordWriter:
+    """
+    Write records to stdout as CSV, NDJSON or bare IDs, one line per record as it arrives.
+
+    Only the given fields are written, in order, so the output can be piped
+    straight into other tools. ids writes the objid field alone.
+    """
+
+    def __init__(self, output: str, fields: list):
+        self.output = output
+        self.fields = fields
+        self._csv = None
+        if output == "csv":
+            self._csv = csv.DictWriter(sys.stdout, fieldnames=fields, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, record: dict) -> None:
+        if self._csv is not None:
+            self._csv.writerow(record)
+        elif self.output == "ids":
+            sys.stdout.write(f"{record['objid']}\n")
+        else:
+            sys.stdout.write(json.dumps({field: record.get(field) for field in self.fields}) + "\n")
+
+
+def write_pages(
+    pages: Iterable[list], output: str, fields: list, table: Callable[[list], None]
+) -> int:
+    """
+    Write pages of rows in an output format as they arrive, returning the row count.
+
+    text prints the IDs on one line, csv, ndjson and ids write a line per
+    row, so memory stays flat however many rows stream through. table
+    renders the first TABLE_LIMIT rows and summarises the rest.
+    """
+    count = 0
+    shown = []
+    writer = RecordWriter(output, fields) if output in RECORD_OUTPUTS else None
+
+    for page in pages:
+        count += len(page)
+        if writer is not None:
+            for row in page:
+                writer.write(row)
+        elif output == "table":
+            shown.extend(page[: TABLE_LIMIT - len(shown)])
+        elif page:
+            sys.stdout.write(" ".join(str(row["objid"]) for row in page) + " ")
+
+    if output == "table":
+        table(shown)
+        if count > len(shown):
+            print(f"Showing {len(shown)} of {count}, use --output csv or ndjson to get every row")
+    elif writer is None:
+        print()
+
+    return count
+
+
+def total(line: str, output: str) -> None:
+    """Print a summary line, on stderr when stdout carries records"""
+    print(line, file=sys.stderr if output in RECORD_OUTPUTS else sys.stdout)
+
+
 def sensor_table(sensor_list: list, device_only: bool = False) -> Table:
 
     table = Table(title="Sensor Status")
@@ -22,17 +100,73 @@ def sensor_table(sensor_list: list, device_only: bool = False) -> Table:
             table.add_row(
                 f" {objid}",
                 f"{device}",
-                f"{sensor['status']}",
-                f"{sensor['message_raw']}",
+                f"{sensor.get('status', '')}",
+                f"{sensor.get('message_raw', '')}",
             )
 
     console = Console()
     console.print(table)
 
 
+def create_sensor_status_table(sensor_list: list, title: str = "Sensor Status"):
+
+    table = Table(title=title)
+    # sensors watched on several cores are labelled with their core
+    include_core = any("core" in sensor for sensor in sensor_list)
+
+    if include_core:
+        table.add_column("Core", justify="center")
+    table.add_column("Sensor ID", justify="right")
+    table.add_column("Device", justify="left")
+    table.add_column("Sensor Name", justify="left")
+    table.add_column("Status", justify="left")
+    table.add_column("Message", justify="left")
+
+    for sensor in sensor_list:
+        row = [
+            str(sensor["objid"]),
+            f"{sensor.get('device', '')}",
+            f"{sensor.get('name', sensor.get('sensor', ''))}",
+            f"{sensor.get('status', '')}",
+            f"{sensor.get('message_raw', sensor.get('message', ''))}",
+        ]
+        if include_core:
+            row.insert(0, sensor["core"])
+        table.add_row(*row)
+
+    console = Console()
+    console.print(table)
+
+
+def status_changes(changes: list) -> None:
+    """Print one line per status transition, nothing when no sensor changed"""
+    console = Console(highlight=False)
+    stamp = time.strftime("%H:%M:%S")
+
+    for change in changes:
+        if change.after is None:
+            after = "[green]cleared"
+        elif change.after == "Up":
+            after = "[green]Up"
+        elif change.after.startswith("Down"):
+            after = f"[red]{escape(change.after)}"
+        else:
+            after = f"[yellow]{escape(change.after)}"
+        console.print(
+            f"{stamp} {change.core} {change.objid} {escape(str(change.device))} / "
+            f"{escape(str(change.name))}: {escape(change.before or 'new')} -> {after}[/] "
+            f"{escape(change.message)}"
+        )
+
+
 def device_table(sensor_list: list, include_tags: bool = False):
 
     table = Table(title="Device List")
+    # devices gathered with --all-cores are labelled with their core
+    include_core = any("core" in device for device in sensor_list)
+
+    if include_core:
+        table.add_column("Core", justify="center")
     table.add_column("Device ID", justify="center")
     table.add_column("Device Name", justify="center")
 
@@ -42,13 +176,35 @@ def device_table(sensor_list: list, include_tags: bool = False):
     for device in sensor_list:
         objid = device["objid"]
         server = device["name"]
+        row = [str(objid), server]
+
+        if include_core:
+            row.insert(0, device.get("core", ""))
         if include_tags:
-            tags = device["tags"]
+            row.append(device["tags"])
+
+        table.add_row(*row)
+
+    console = Console()
+    console.print(table)
+
+
+def tag_plan_table(changes: list):
+
+    table = Table(title="Tag Changes")
+    table.add_column("Device ID", justify="center")
+    table.add_column("Device Name", justify="left")
+    table.add_column("Added", justify="left", style="green")
+    table.add_column("Removed", justify="left", style="red")
+    table.add_column("New Tags", justify="left")
 
-        (
-            table.add_row(str(objid), server, tags)
-            if include_tags
-            else table.add_row(str(objid), server)
+    for change in changes:
+        table.add_row(
+            change.objid,
+            change.name,
+            str(change.added),
+            str(change.removed),
+            str(change.target),
         )
 
     console = Console()
@@ -0,0 +1,168 @@
+"""
+End-to-end benchmark of prtg commands against the local stand-in.
+
+Each command runs in-process against a synthetic core and is measured for
+wall time, requests sent, requests per second and peak Python memory:
+
+    python tests/benchmark.py --devices 10000 --targets 50 --latency 0.02
+    python tests/benchmark.py --save before.json
+    python tests/benchmark.py --baseline before.json --tolerance 0.2
+
+With --baseline the run fails when any command got slower, or sent more
+requests, than the baseline allows.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import local_base  # noqa: E402
+from stand_in import StandIn, configure_tool  # noqa: E402
+
+CORE = "serveronprem"
+
+
+@dataclass
+class Measurement:
+    command: str
+    exit_code: int
+    wall_time: float
+    requests: int
+    peak_memory: int
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.wall_time if self.wall_time else 0.0
+
+    def line(self) -> str:
+        return (
+            f"{self.command:<40} {self.wall_time:>8.3f}s {self.requests:>7} req "
+            f"{self.rps:>9.1f} req/s {self.peak_memory / 2**20:>8.1f} MiB"
+            + ("" if self.exit_code == 0 else f"  exit {self.exit_code}")
+        )
+
+
+def measure(stand_in: StandIn, name: str, args: list) -> Measurement:
+    runner = CliRunner()
+    requests_before = stand_in.total_requests()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = runner.invoke(local_base.app, args)
+    wall_time = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Measurement(
+        name, result.exit_code, wall_time, stand_in.total_requests() - requests_before, peak
+    )
+
+
+def commands(stand_in: StandIn, directory: Path, targets: int) -> list[tuple[str, list]]:
+    """The benchmarked command lines, built from objects on the synthetic core"""
+    core = stand_in.cores[CORE]
+    devices = sorted(core.devices)[:targets]
+    device_ids = " ".join(str(objid) for objid in devices)
+    ping = next(sensor for sensor in core.sensors.values() if sensor["name"] == "Ping")
+
+    sensor_file = directory / "sensors.csv"
+    with open(sensor_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["objid"])
+        writer.writerows([objid] for objid in sorted(core.sensors)[:targets])
+
+    return [
+        ("device list --no-cache", ["device", "list", CORE, "--no-cache"]),
+        ("device list (cold cache)", ["device", "list", CORE, "--refresh"]),
+        ("device list (warm cache)", ["device", "list", CORE]),
+        ("device search --no-cache", ["device", "search", CORE, "web", "--no-cache"]),
+        ("device add_tags", ["device", "add-tags", CORE, device_ids, "--tags", "bench:tag"]),
+        ("device delete_tags", ["device", "delete-tags", CORE, device_ids, "--tags", "bench:tag"]),
+        (
+            "sensor duplicate",
+            ["sensor", "duplicate", CORE, "Bench Ping", "--source-sensor", str(ping["objid"]),
+             "--target-device", device_ids],
+        ),
+        (
+            "channel set_threshold",
+            ["channel", "set-threshold", CORE, "--subid", "0", "--value", "90", "--warning",
+             "--file", str(sensor_file)],
+        ),
+    ]
+
+
+def run(
+    devices: int = 1000,
+    sensors_per_device: int = 3,
+    targets: int = 50,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+) -> list[Measurement]:
+    """Start a stand-in, point the tool at it and measure every command once"""
+    with tempfile.TemporaryDirectory() as directory, StandIn(
+        (CORE,), devices, sensors_per_device, latency, error_rate
+    ) as stand_in:
+        directory = Path(directory)
+        configure_tool(stand_in, directory)
+        return [
+            measure(stand_in, name, args)
+            for name, args in commands(stand_in, directory, targets)
+        ]
+
+
+def regressions(results: list[Measurement], baseline: dict, tolerance: float) -> list[str]:
+    """Commands slower, or sending more requests, than the baseline allows"""
+    found = []
+    for result in results:
+        before = baseline.get(result.command)
+        if before is None:
+            continue
+        if result.wall_time > before["wall_time"] * (1 + tolerance):
+            found.append(
+                f"{result.command}: {result.wall_time:.3f}s, baseline {before['wall_time']:.3f}s"
+            )
+        if result.requests > before["requests"]:
+            found.append(
+                f"{result.command}: {result.requests} requests, baseline {before['requests']}"
+            )
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--sensors-per-device", type=int, default=3)
+    parser.add_argument("--targets", type=int, default=50, help="objects changed by bulk commands")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--save", type=Path, help="write the results to a JSON file")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed wall time slowdown")
+    args = parser.parse_args()
+
+    results = run(args.devices, args.sensors_per_device, args.targets, args.latency, args.error_rate)
+    for result in results:
+        print(result.line())
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({result.command: asdict(result) for result in results}, f, indent=2)
+
+    failed = [result.command for result in results if result.exit_code != 0]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed += regressions(results, json.load(f), args.tolerance)
+
+    for failure in failed:
+        print(f"FAILED {failure}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# the prtg modules import each other by name, as they do under the prtg script
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from stand_in import StandIn, configure_tool  # noqa: E402
+
+# PRTG_LIVE_TESTS=1 runs the tests against the cores in the real config file
+LIVE = os.getenv("PRTG_LIVE_TESTS") == "1"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def stand_in(tmp_path_factory):
+    """A local stand-in for serveronprem and networkdc, unless running live"""
+    if LIVE:
+        yield None
+        return
+
+    with StandIn(cores=("serveronprem", "networkdc"), devices=900) as server:
+        configure_tool(server, tmp_path_factory.mktemp("prtg"))
+        yield server
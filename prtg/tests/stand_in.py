@@ -0,0 +1,487 @@
+"""
+Local stand-in for the PRTG API, for offline tests and benchmarks.
+
+Serves any number of synthetic cores from one port, each under its own
+path prefix, so the tool only needs url_template pointed at it:
+
+    python tests/stand_in.py --devices 10000 --port 8080
+    prtg config set url_template http://127.0.0.1:8080/{core} --section Client
+
+Implements the parts of the API this tool calls: table.json (paging,
+columns, filters, sortby), getobjectproperty.htm, setobjectproperty.htm,
+duplicateobject.htm, pause.htm, pauseobjectfor.htm, historicdata.json and
+status.json.
+Latency and 503 errors can be injected, whole cores can be taken down, and
+every request is counted per endpoint.
+"""
+
+import argparse
+import configparser
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+TOKEN = "stand-in-token"
+VERSION = "23.4.90.1299"
+
+# (tag, device name prefix)
+ROLES = [("role:webserver", "web"), ("role:database", "db"), ("role:fileserver", "fs")]
+SENSOR_TYPES = [("Ping", "pingsensor"), ("CPU Load", "wmicpu"), ("Disk Free", "wmidiskspace")]
+CHANNEL_PROPERTIES = {
+    "limitmode": "0",
+    "limitminwarning": "",
+    "limitminerror": "",
+    "limitmaxwarning": "",
+    "limitmaxerror": "",
+}
+
+STATUS = {
+    3: "Up",
+    5: "Down",
+    7: "Paused by User",
+    8: "Paused by Dependency",
+    11: "Paused until",
+}
+
+
+@dataclass
+class Core:
+    """Objects of one synthetic core, keyed by objid"""
+
+    name: str
+    devices: dict = field(default_factory=dict)
+    sensors: dict = field(default_factory=dict)
+    channels: dict = field(default_factory=dict)
+    next_id: int = 1000
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def get(self, objid: int) -> dict | None:
+        return self.devices.get(objid) or self.sensors.get(objid)
+
+
+def build_core(name: str, devices: int, sensors_per_device: int, seed: int = 0) -> Core:
+    """
+    Generate a core with a third of the devices in each role.
+
+    Device names follow the role (web00000, db00001, fs00002) so name searches
+    have predictable hit counts. Every device gets the first
+    sensors_per_device sensor types, one in twenty sensors is down.
+    """
+    rng = random.Random(seed)
+    core = Core(name)
+
+    for number in range(devices):
+        role, prefix = ROLES[number % len(ROLES)]
+        device_id = core.new_id()
+        host = f"{prefix}{number:05d}.agency.ok.local"
+        if number % 10 == 0:
+            host = f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}"
+
+        core.devices[device_id] = {
+            "objid": device_id,
+            "name": f"{prefix}{number:05d}",
+            "host": host,
+            "tags": f"{role} env:{rng.choice(['prod', 'test'])}",
+            "group": f"Group {number % 50}",
+            "probe": f"{name} probe",
+            "status": "Up",
+            "status_raw": 3,
+        }
+
+        for sensor_name, sensor_type in SENSOR_TYPES[:sensors_per_device]:
+            add_sensor(core, device_id, sensor_name, sensor_type, 5 if rng.random() < 0.05 else 3)
+
+    return core
+
+
+def add_sensor(core: Core, device_id: int, name: str, sensor_type: str, status: int) -> dict:
+    device = core.devices[device_id]
+    sensor_id = core.new_id()
+    sensor = {
+        "objid": sensor_id,
+        "name": name,
+        "sensor": name,
+        "device": device["name"],
+        "parentid": device_id,
+        "tags": sensor_type,
+        "type": sensor_type,
+        "group": device["group"],
+        "probe": device["probe"],
+        "status": STATUS[status],
+        "status_raw": status,
+        "message": "OK" if status == 3 else "Timeout",
+        "lastvalue": f"{sensor_id % 100} %",
+    }
+    core.sensors[sensor_id] = sensor
+    for subid in (0, 1):
+        core.channels[(sensor_id, subid)] = dict(CHANNEL_PROPERTIES)
+    return sensor
+
+
+# ========================= Filtering ==========================================
+
+
+def matches(row: dict, column: str, values: list) -> bool:
+    """PRTG filter semantics: repeated values of one filter are ORed"""
+    for value in values:
+        if column == "status":
+            cell = str(row.get("status_raw"))
+        else:
+            cell = str(row.get(column, ""))
+
+        if value.startswith("@tag(") and value.endswith(")"):
+            if value[5:-1] in cell.split():
+                return True
+        elif value.startswith("@sub(") and value.endswith(")"):
+            if value[5:-1].lower() in cell.lower():
+                return True
+        elif value.startswith("@neq(") and value.endswith(")"):
+            if cell != value[5:-1]:
+                return True
+        elif cell == value:
+            return True
+    return False
+
+
+def table(core: Core, query: dict) -> dict:
+    content = query.get("content", ["sensors"])[0]
+    rows = list(getattr(core, content, {}).values())
+    # like PRTG, table.json lists inherited tags after the object's own
+    rows = [
+        {**row, "tags": f"{row['tags']} {row['inherited_tags']}"}
+        if row.get("inherited_tags") else row
+        for row in rows
+    ]
+
+    if "id" in query:
+        parent = int(query["id"][0])
+        rows = [row for row in rows if row.get("parentid") == parent]
+
+    for key, values in query.items():
+        if key.startswith("filter_"):
+            column = key[len("filter_") :]
+            rows = [row for row in rows if matches(row, column, values)]
+
+    sortby = query.get("sortby", [None])[0]
+    if sortby:
+        column = sortby.lstrip("-")
+        rows.sort(key=lambda row: str(row.get(column, "")), reverse=sortby.startswith("-"))
+
+    start = int(query.get("start", ["0"])[0])
+    count = int(query.get("count", ["500"])[0])
+    page = rows[start : start + count]
+
+    columns = query.get("columns", ["objid,name"])[0].split(",")
+    wanted = set(columns) | {f"{column}_raw" for column in columns}
+    page = [{key: value for key, value in row.items() if key in wanted} for row in page]
+
+    return {"prtg-version": VERSION, "treesize": len(rows), content: page}
+
+
+def history(sensor: dict, sdate: str, edate: str, average: int) -> list:
+    """
+    Deterministic historic data of a sensor, one row per interval from sdate to edate.
+
+    Raw data (average 0) comes at the default 5 minute scanning interval.
+    """
+    start = datetime.strptime(sdate, "%Y-%m-%d-%H-%M-%S")
+    end = datetime.strptime(edate, "%Y-%m-%d-%H-%M-%S")
+    step = timedelta(seconds=average or 300)
+
+    rows = []
+    moment = start
+    while moment < end:
+        # datetime_raw counts days since 1899-12-30, like OLE dates
+        ole = (moment - datetime(1899, 12, 30)) / timedelta(days=1)
+        value = (sensor["objid"] + int(ole * 288)) % 100
+        rows.append(
+            {
+                "datetime": moment.strftime("%m/%d/%Y %I:%M:%S %p"),
+                "datetime_raw": round(ole, 6),
+                sensor["name"]: f"{value} %",
+                f"{sensor['name']} (Raw)": value,
+                "Downtime": "0 %",
+                "Downtime (Raw)": 0,
+            }
+        )
+        moment += step
+    return rows
+
+
+# ========================= Server =============================================
+
+
+class StandIn:
+    """
+    A threaded HTTP server holding one or more synthetic cores.
+
+    latency: seconds added to every request
+    error_rate: fraction of requests answered with 503
+    creation_delay: seconds before a duplicated sensor is listed by table.json
+    down: names of cores answering every request with 503
+    """
+
+    def __init__(
+        self,
+        cores: tuple = ("serveronprem",),
+        devices: int = 1000,
+        sensors_per_device: int = 3,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        creation_delay: float = 0.0,
+        seed: int = 0,
+    ):
+        self.cores = {
+            name: build_core(name, devices, sensors_per_device, seed + number)
+            for number, name in enumerate(cores)
+        }
+        self.latency = latency
+        self.error_rate = error_rate
+        self.creation_delay = creation_delay
+        self.requests = Counter()
+        self.pending = {}
+        self.down = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url_template(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{{core}}"
+
+    def start(self, port: int = 0) -> "StandIn":
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StandIn":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def handler(self) -> type:
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, content_type, body = stand_in.respond(self.path)
+                self.send_response(status)
+                if status == 302:
+                    self.send_header("Location", body.decode())
+                    body = b""
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def respond(self, path: str) -> tuple[int, str, bytes]:
+        url = urlsplit(path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        core_name, _, endpoint = url.path.strip("/").partition("/")
+        endpoint = endpoint.removeprefix("api/")
+
+        with self._lock:
+            self.requests[endpoint] += 1
+            failed = self._random.random() < self.error_rate
+
+        if self.latency:
+            time.sleep(self.latency)
+        if failed or core_name in self.down:
+            return 503, "text/plain", b"Service Unavailable"
+
+        core = self.cores.get(core_name)
+        if core is None:
+            return 404, "text/plain", b"Not Found"
+
+        if endpoint == "sensor.htm":
+            objid = query.get("id", [""])[0]
+            page = f'<html><a href="/sensor.htm?id={objid}">sensor</a></html>'
+            return 200, "text/html", page.encode()
+
+        if query.get("apitoken", [None])[0] != TOKEN:
+            return 401, "text/xml", error_xml("Unauthorized")
+
+        self.publish_pending(core)
+        with core.lock:
+            return self.endpoint(core, endpoint, query)
+
+    def endpoint(self, core: Core, endpoint: str, query: dict) -> tuple[int, str, bytes]:
+        def value(name: str, default: str = None) -> str:
+            return query.get(name, [default])[0]
+
+        match endpoint:
+            case "table.json":
+                return 200, "application/json", json.dumps(table(core, query)).encode()
+
+            case "status.json":
+                body = {"Version": VERSION, "Clock": time.strftime("%Y-%m-%d %H:%M:%S")}
+                return 200, "application/json", json.dumps(body).encode()
+
+            case "historicdata.json":
+                sensor = core.sensors.get(int(value("id", "0")))
+                if sensor is None:
+                    return 400, "text/xml", error_xml("Object not found")
+                rows = history(sensor, value("sdate"), value("edate"), int(value("avg", "0")))
+                body = {"prtg-version": VERSION, "treesize": len(rows), "histdata": rows}
+                return 200, "application/json", json.dumps(body).encode()
+
+            case "getobjectproperty.htm":
+                properties = self.properties(core, value("id"), value("subtype"), value("subid"))
+                if properties is None or value("name") not in properties:
+                    return 400, "text/xml", error_xml("Object or property not found")
+                result = escape(str(properties[value("name")]))
+                body = f"<?xml version='1.0' encoding='UTF-8'?><prtg><version>{VERSION}</version><result>{result}</result></prtg>"
+                return 200, "text/xml", body.encode()
+
+            case "setobjectproperty.htm":
+                properties = self.properties(core, value("id"), value("subtype"), value("subid"))
+                if properties is None:
+                    return 400, "text/xml", error_xml("Object not found")
+                properties[value("name")] = value("value", "")
+                return 200, "text/html", b"<html><body>OK</body></html>"
+
+            case "duplicateobject.htm":
+                source = core.sensors.get(int(value("id", "0")))
+                target = int(value("targetid", "0"))
+                if source is None or target not in core.devices:
+                    return 400, "text/xml", error_xml("Object not found")
+                sensor = add_sensor(core, target, value("name") or source["name"], source["type"], 7)
+                if self.creation_delay:
+                    # listed by table.json only once the delay has passed
+                    del core.sensors[sensor["objid"]]
+                    self.pending[sensor["objid"]] = (time.monotonic() + self.creation_delay, sensor)
+                return 302, "text/html", f"/{core.name}/sensor.htm?id={sensor['objid']}".encode()
+
+            case "pause.htm" | "pauseobjectfor.htm":
+                # like the core, one unknown ID rejects the whole request
+                objids = value("id", "").split(",")
+                objects = [core.get(int(objid)) if objid.isdigit() else None for objid in objids]
+                if None in objects:
+                    return 400, "text/xml", error_xml("Object not found")
+
+                if endpoint == "pauseobjectfor.htm":
+                    status = 11
+                else:
+                    status = 7 if value("action") == "0" else 3
+                for obj in objects:
+                    obj["status_raw"] = status
+                    obj["status"] = STATUS[status]
+                return 200, "text/html", b"<html><body>OK</body></html>"
+
+        return 404, "text/plain", b"Not Found"
+
+    def properties(self, core: Core, objid: str, subtype: str, subid: str) -> dict | None:
+        if objid is None or not objid.isdigit():
+            return None
+        if subtype == "channel":
+            return core.channels.get((int(objid), int(subid or 0)))
+        return core.get(int(objid))
+
+    def publish_pending(self, core: Core) -> None:
+        now = time.monotonic()
+        with core.lock:
+            for objid, (ready_at, sensor) in list(self.pending.items()):
+                if ready_at <= now:
+                    core.sensors[objid] = sensor
+                    del self.pending[objid]
+
+
+def configure_tool(stand_in: StandIn, directory: Path) -> None:
+    """
+    Point this process's prtg modules at a running stand-in.
+
+    Writes a config file with the stand-in's url_template, a token for each
+    core, and an inventory cache and job journals inside directory, then
+    drops every settings and client cache that was read from the previous
+    config.
+    """
+    import config
+
+    settings = configparser.ConfigParser()
+    settings["Tokens"] = {core: TOKEN for core in stand_in.cores}
+    settings["Client"] = {"url_template": stand_in.url_template}
+    settings["Cache"] = {"path": str(directory / "prtg_inventory.sqlite")}
+    settings["Journal"] = {"directory": str(directory / "jobs")}
+
+    config_file = directory / "prtg_admin.cfg"
+    with open(config_file, "w") as f:
+        settings.write(f)
+
+    config.config_file_path = str(config_file)
+    reset_tool()
+
+
+def reset_tool() -> None:
+    """Forget the clients, settings and cache connection built from the current config"""
+    import client
+    import config
+    import health
+    import inventory
+    import journal
+
+    config._clients.clear()
+    client._settings = None
+    health._settings = None
+    health.reset()
+    inventory._settings = None
+    journal._settings = None
+    inventory.close()
+
+
+def error_xml(message: str) -> bytes:
+    return f"<?xml version='1.0' encoding='UTF-8'?><prtg><error>{escape(message)}</error></prtg>".encode()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cores", nargs="+", default=["serveronprem"])
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--sensors-per-device", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    stand_in = StandIn(
+        tuple(args.cores),
+        args.devices,
+        args.sensors_per_device,
+        args.latency,
+        args.error_rate,
+    ).start(args.port)
+    print(f"url_template: {stand_in.url_template}  token: {TOKEN}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stand_in.stop()
@@ -0,0 +1,125 @@
+import asyncio
+import importlib
+
+import pytest
+import requests
+from typer.testing import CliRunner
+
+from stand_in import reset_tool
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+api = importlib.import_module("api")
+client = importlib.import_module("client")
+config = importlib.import_module("config")
+
+
+def devices(stand_in, count: int) -> list:
+    return [str(objid) for objid in sorted(stand_in.cores["networkdc"].devices)[-count:]]
+
+
+def test_client_returns_results_without_printing(stand_in, capsys):
+    prtg = api.PRTGClient("networkdc")
+    ids = devices(stand_in, 4)
+
+    added = prtg.add_tags([*ids, "999999"], "api:test")
+    assert set(added.updated) == set(ids)
+    assert all("api:test" in tags for tags in added.updated.values())
+    assert [*added.failed] == ["999999"]
+
+    again = prtg.add_tags(ids, "api:test")
+    assert again.updated == {} and sorted(again.unchanged) == sorted(ids)
+
+    own = {result.item: result.value for result in prtg.own_tags(ids)}
+    assert all("api:test" in tags for tags in own.values())
+
+    removed = prtg.remove_tags(ids, "api:test")
+    assert all("api:test" not in tags for tags in removed.updated.values())
+
+    names = [device["name"] for device in prtg.devices(name="fs0000")]
+    assert names == ["fs00002", "fs00005", "fs00008"]
+
+    assert capsys.readouterr().out == ""
+
+
+def test_async_client_pauses_concurrently(stand_in):
+    sensors = [str(objid) for objid in sorted(stand_in.cores["networkdc"].sensors)[:6]]
+
+    async def main():
+        prtg = api.AsyncPRTGClient("networkdc")
+        return await asyncio.gather(prtg.pause(sensors[:3]), prtg.pause(sensors[3:]))
+
+    results = asyncio.run(main())
+    assert [len(result.confirmed) for result in results] == [3, 3]
+    assert api.PRTGClient("networkdc").resume(sensors).unconfirmed == []
+
+
+def test_get_tags_returns_every_device(stand_in):
+    ids = devices(stand_in, 3)
+    tags = local_base.app(
+        ["device", "get-tags", "networkdc", " ".join([*ids, "999999"]), "-q"],
+        standalone_mode=False,
+    )
+    assert [*tags] == [*ids, "999999"]
+    assert tags["999999"] is None and all(tags[device] is not None for device in ids)
+
+
+def test_writes_to_a_down_core_fail(stand_in):
+    if stand_in is None:
+        pytest.skip("needs the stand-in")
+
+    client.get_settings().retries = 0
+    client.close()
+    stand_in.down.add("serveronprem")
+    sensor = str(min(stand_in.cores["serveronprem"].sensors))
+    try:
+        results = [*api.PRTGClient("serveronprem").set_property([sensor], "name", "down")]
+        assert not results[0].ok and "503" in results[0].error
+
+        result = runner.invoke(
+            local_base.app,
+            ["channel", "set-threshold", "serveronprem", "--sensor-id", sensor,
+             "--subid", "0", "--value", "5", "--warning"],
+        )
+        assert result.exit_code == 1
+        assert "1 failed" in result.stdout
+    finally:
+        stand_in.down.clear()
+        reset_tool()
+        client.close()
+    assert stand_in.cores["serveronprem"].sensors[int(sensor)]["name"] != "down"
+
+
+def test_client_sets_channel_thresholds(stand_in):
+    prtg = api.PRTGClient("networkdc")
+    sensor = str(max(stand_in.cores["networkdc"].sensors))
+    rows = [api.ChannelRow(sensor, "1", warning="70"), api.ChannelRow(sensor, None, warning="1")]
+
+    results = {result.item.subid: result for result in prtg.set_thresholds(rows)}
+    assert results["1"].value == [("limitminwarning", "70"), ("limitmode", "1")]
+    assert not results[None].ok
+
+    read = [*prtg.channel_property([api.ChannelRow(sensor, "1")], "limitminwarning")]
+    assert read[0].value == "70"
+
+
+def test_library_raises_instead_of_printing(stand_in, capsys):
+    page = requests.Response()
+    page.status_code, page.reason, page._content = 200, "OK", b"<html>done</html>"
+    with pytest.raises(ValueError, match="not JSON, status 200"):
+        local_base.parse_response(page)
+
+    rejected = requests.Response()
+    rejected.status_code, rejected.reason = 400, "Bad Request"
+    rejected._content = b"<prtg><error>Sorry, the selected object cannot be used here.</error></prtg>"
+    with pytest.raises(ValueError, match="cannot be used here"):
+        local_base.parse_response(rejected)
+
+    with pytest.raises(config.MissingToken):
+        api.PRTGClient("nosuchcore")
+    assert capsys.readouterr().out == ""
+
+    result = runner.invoke(local_base.app, ["device", "get-tags", "nosuchcore", "1001"])
+    assert result.exit_code == 1
+    assert "No Auth Token found" in result.stdout and "Traceback" not in result.stdout
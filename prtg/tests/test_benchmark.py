@@ -0,0 +1,37 @@
+import importlib
+
+import pytest
+
+from stand_in import reset_tool
+
+
+benchmark = importlib.import_module("benchmark")
+config = importlib.import_module("config")
+
+
+@pytest.fixture
+def own_config():
+    """The benchmark points the tool at its own stand-in, restore the session's"""
+    config_file_path = config.config_file_path
+    yield
+    config.config_file_path = config_file_path
+    reset_tool()
+
+
+def test_benchmark_commands_succeed(own_config):
+    results = {result.command: result for result in benchmark.run(devices=300, targets=2)}
+
+    assert all(result.exit_code == 0 for result in results.values())
+    assert results["device list (warm cache)"].requests == 0
+    assert all(result.wall_time > 0 and result.peak_memory > 0 for result in results.values())
+
+
+def test_regressions_flag_slower_and_chattier_commands():
+    baseline = {"device list": {"wall_time": 1.0, "requests": 2}}
+    slower = benchmark.Measurement("device list", 0, 1.5, 2, 0)
+    chattier = benchmark.Measurement("device list", 0, 1.0, 3, 0)
+    within = benchmark.Measurement("device list", 0, 1.1, 2, 0)
+
+    assert benchmark.regressions([slower], baseline, 0.2)
+    assert benchmark.regressions([chattier], baseline, 0.2)
+    assert not benchmark.regressions([within], baseline, 0.2)
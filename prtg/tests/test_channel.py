@@ -0,0 +1,124 @@
+import importlib
+import json
+from datetime import datetime, timedelta
+
+from typer.testing import CliRunner
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+
+
+def sensor_ids(stand_in, count: int) -> list:
+    return [str(objid) for objid in sorted(stand_in.cores["serveronprem"].sensors)[:count]]
+
+
+def test_set_threshold_with_sensor_ids(stand_in):
+    ids = sensor_ids(stand_in, 3)
+    result = runner.invoke(
+        local_base.app,
+        ["channel", "set-threshold", "serveronprem", "--subid", "0", "--value", "75",
+         "--warning", "--sensor_id", " ".join(ids)],
+    )
+    assert result.exit_code == 0
+
+    channels = stand_in.cores["serveronprem"].channels
+    for objid in ids:
+        assert channels[(int(objid), 0)]["limitminwarning"] == "75"
+        assert channels[(int(objid), 0)]["limitmode"] == "1"
+
+
+def test_set_threshold_rows_from_file_as_ndjson(stand_in, tmp_path):
+    first, second = sensor_ids(stand_in, 2)
+    file = tmp_path / "thresholds.csv"
+    file.write_text(f"objid,subid,warning,error\n{first},1,80,95\n{second},0,,90\n999999,0,1,\n")
+
+    result = runner.invoke(
+        local_base.app,
+        ["channel", "set-threshold", "serveronprem", "--file", str(file), "--output", "ndjson"],
+    )
+    assert result.exit_code == 1
+
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert {record["status"] for record in records if record["objid"] == "999999"} == {"failed"}
+    assert len([record for record in records if record["objid"] == second]) == 2
+
+    channels = stand_in.cores["serveronprem"].channels
+    assert channels[(int(first), 1)]["limitminwarning"] == "80"
+    assert channels[(int(first), 1)]["limitminerror"] == "95"
+    assert channels[(int(second), 0)]["limitminerror"] == "90"
+
+
+def test_state_reads_limitmode_as_csv(stand_in):
+    ids = sensor_ids(stand_in, 4)[2:]
+    disable = runner.invoke(
+        local_base.app,
+        ["channel", "state", "serveronprem", "--subid", "1", "--disable", "--sensor_id", ",".join(ids)],
+    )
+    assert disable.exit_code == 0
+
+    result = runner.invoke(
+        local_base.app,
+        ["channel", "state", "serveronprem", "--subid", "1", "--sensor_id", " ".join(ids), "-o", "csv"],
+    )
+    assert result.exit_code == 0
+    lines = result.stdout.splitlines()
+    assert lines[0] == "objid,subid,status,property,value,message"
+    assert sorted(line.split(",")[4] for line in lines[1:]) == ["0", "0"]
+
+
+def test_channel_commands_need_a_subid(stand_in, tmp_path):
+    file = tmp_path / "sensors.csv"
+    file.write_text("objid,warning\n1002,80\n")
+    requests = stand_in.total_requests()
+
+    for command in (
+        ["channel", "state", "serveronprem", "--sensor_id", "1002"],
+        ["channel", "set-threshold", "serveronprem", "--file", str(file)],
+    ):
+        result = runner.invoke(local_base.app, command)
+        assert result.exit_code == 1
+        assert "--subid" in result.stdout
+    assert stand_in.total_requests() == requests
+
+
+def test_export_writes_windows_and_skips_them_on_restart(stand_in, tmp_path):
+    ids = sensor_ids(stand_in, 2)
+    command = [
+        "channel", "export", "serveronprem", str(tmp_path), "--sensor_id", " ".join(ids),
+        "--start", "2024-01-01", "--end", "2024-01-03", "--window", "0.5",
+    ]
+    before = stand_in.requests["historicdata.json"]
+
+    result = runner.invoke(local_base.app, command)
+    assert result.exit_code == 0
+    assert stand_in.requests["historicdata.json"] == before + 8
+
+    files = sorted((tmp_path / ids[0]).glob("*.csv"))
+    assert len(files) == 4
+    lines = files[0].read_text().splitlines()
+    assert lines[0].startswith("objid,datetime,datetime_raw")
+    # 12 hours of 5 minute data
+    assert len(lines) == 1 + 144
+
+    files[-1].unlink()
+    result = runner.invoke(local_base.app, command)
+    assert result.exit_code == 0
+    assert stand_in.requests["historicdata.json"] == before + 9
+    assert "Skipped 7 windows already written" in result.stdout
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_export_without_end_writes_whole_windows(stand_in, tmp_path):
+    sensor = sensor_ids(stand_in, 1)[0]
+    start = (datetime.now() - timedelta(hours=30)).strftime("%Y-%m-%dT%H:%M:%S")
+    command = ["channel", "export", "serveronprem", str(tmp_path), "--sensor_id", sensor,
+               "--start", start, "--window", "0.5"]
+
+    assert runner.invoke(local_base.app, command).exit_code == 0
+    assert runner.invoke(local_base.app, command).exit_code == 0
+
+    # 30 hours hold two whole 12 hour windows, the running one is left for later
+    files = sorted((tmp_path / sensor).glob("*.csv"))
+    assert len(files) == 2
+    assert all(len(f.read_text().splitlines()) == 1 + 144 for f in files)
@@ -0,0 +1,37 @@
+import csv
+import importlib
+
+from typer.testing import CliRunner
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+decommissioned = importlib.import_module("Decommisioned_servers")
+
+
+def test_host_keys_normalise_case_fqdn_and_ip():
+    assert decommissioned.host_keys("Web01.Agency.OK.local.") == ["web01.agency.ok.local", "web01"]
+    assert decommissioned.host_keys(" 10.0.0.1 ") == ["ip:10.0.0.1"]
+    assert decommissioned.host_keys("") == []
+
+
+def test_reconcile_reports_matched_missing_and_stale(tmp_path):
+    inventory = tmp_path / "retired.csv"
+    inventory.write_text("Hostname,IP\nWEB00000.agency.ok.local,\nfs00002,\nretired99,\n,10.0.0.30\n")
+
+    result = runner.invoke(
+        local_base.app,
+        ["decommissioned", "reconcile", str(inventory), "--core", "networkdc",
+         "--ip-column", "IP", "-o", "csv"],
+    )
+    assert result.exit_code == 0
+
+    rows = [*csv.DictReader(result.stdout.splitlines())]
+    matched = {row["hostname"]: row["device"] for row in rows if row["status"] == "matched"}
+    assert matched == {
+        "WEB00000.agency.ok.local": "web00000",
+        "fs00002": "fs00002",
+        "10.0.0.30": "web00030",
+    }
+    assert [row["hostname"] for row in rows if row["status"] == "missing"] == ["retired99"]
+    assert len([row for row in rows if row["status"] == "stale"]) == 900 - 3
@@ -29,6 +29,58 @@ def test_device_search():
     assert result.exit_code == 0
     assert "Total Devices" in result.stdout
 
+def test_add_tags_writes_inherited_tags(stand_in):
+    device = stand_in.cores["networkdc"].devices[sorted(stand_in.cores["networkdc"].devices)[1]]
+    device["inherited_tags"] = "team:ops"
+    try:
+        command = ["device", "add-tags", "networkdc", str(device["objid"]), "--tags", "team:ops"]
+        result = runner.invoke(local_base.app, command)
+        assert result.exit_code == 0
+        assert "no change in tags" not in result.stdout
+        assert "team:ops" in device["tags"].split()
+    finally:
+        del device["inherited_tags"]
+        device["tags"] = " ".join(tag for tag in device["tags"].split() if tag != "team:ops")
+
+
+def test_tag_writes_keep_inherited_tags_in_the_cache(stand_in):
+    device = stand_in.cores["networkdc"].devices[sorted(stand_in.cores["networkdc"].devices)[2]]
+    device["inherited_tags"] = "team:ops"
+    listing = ["device", "list", "networkdc", "--tags", "team:ops"]
+    try:
+        result = runner.invoke(local_base.app, [*listing, "--refresh"])
+        assert parse_device_num(result.stdout) == 1
+
+        command = ["device", "add-tags", "networkdc", str(device["objid"]), "--tags", "cache:test"]
+        assert runner.invoke(local_base.app, command).exit_code == 0
+
+        result = runner.invoke(local_base.app, listing)
+        assert parse_device_num(result.stdout) == 1
+    finally:
+        del device["inherited_tags"]
+        device["tags"] = " ".join(tag for tag in device["tags"].split() if tag != "cache:test")
+        runner.invoke(local_base.app, [*listing, "--refresh"])
+
+
 def parse_device_num(input: str):
     match = re.search(r"Total Devices: (?P<dev_count>\d+)", input)
-    return match.groupdict()["dev_count"]
+    return int(match.groupdict()["dev_count"])
+
+
+def test_reconcile_plans_against_own_tags(stand_in, tmp_path):
+    device = stand_in.cores["networkdc"].devices[min(stand_in.cores["networkdc"].devices)]
+    device["inherited_tags"] = "team:ops"
+    rules = tmp_path / "desired.csv"
+    rules.write_text(f"objid,name,tags,add,remove\n{device['objid']},,,team:ops,\n")
+    try:
+        command = ["device", "reconcile-tags", "networkdc", str(rules), "--no-cache"]
+        result = runner.invoke(local_base.app, command)
+        assert result.exit_code == 0
+        assert "Devices to update: 1" in result.stdout
+
+        result = runner.invoke(local_base.app, [*command, "--apply"])
+        assert result.exit_code == 0
+        assert "team:ops" in device["tags"].split()
+    finally:
+        del device["inherited_tags"]
+        device["tags"] = " ".join(tag for tag in device["tags"].split() if tag != "team:ops")
@@ -0,0 +1,92 @@
+import importlib
+import time
+
+import pytest
+
+from stand_in import reset_tool
+
+
+client = importlib.import_module("client")
+config = importlib.import_module("config")
+fanout = importlib.import_module("fanout")
+health = importlib.import_module("health")
+local_base = importlib.import_module("local_base")
+search = importlib.import_module("search")
+
+
+@pytest.fixture
+def flaky(stand_in):
+    """networkdc down, no session retries and a breaker tripping after two failures"""
+    client.get_settings().retries = 0
+    client.close()
+    health._settings = health.HealthSettings(failures=2, cooldown=0.5, probe_timeout=1.0)
+    # breakers made by earlier tests hold the default settings
+    health.reset()
+    stand_in.down.add("networkdc")
+    yield stand_in
+    stand_in.down.clear()
+    reset_tool()
+    client.close()
+
+
+def status(core: str) -> int:
+    params = {"content": "devices", "count": 1, "apitoken": "stand-in-token"}
+    return client.get(local_base.query_url(core), params).status_code
+
+
+def test_breaker_opens_and_fails_fast(flaky):
+    for _ in range(2):
+        result = fanout.query_cores(status, ["serveronprem", "networkdc"])
+        assert result.results == {"serveronprem": 200, "networkdc": 503}
+
+    sent = flaky.total_requests()
+    result = fanout.query_cores(status, ["serveronprem", "networkdc"])
+    assert result.results == {"serveronprem": 200}
+    assert "2 failures in a row" in result.skipped["networkdc"]
+    assert flaky.total_requests() == sent + 1
+
+    with pytest.raises(health.CoreUnavailable):
+        status("networkdc")
+
+
+def test_breaker_closes_after_a_probe(flaky):
+    for _ in range(2):
+        status("networkdc")
+    with pytest.raises(health.CoreUnavailable):
+        status("networkdc")
+
+    # still down when the cooldown ends, so the probe opens it again
+    probes = flaky.requests["status.json"]
+    time.sleep(0.6)
+    with pytest.raises(health.CoreUnavailable):
+        status("networkdc")
+    assert flaky.requests["status.json"] == probes + 1
+
+    flaky.down.clear()
+    time.sleep(0.6)
+    assert status("networkdc") == 200
+    assert health.unavailable("networkdc") is None
+
+
+def test_fanout_deadline_covers_whole_queries(stand_in):
+    """Slow multi-page reads are not timed out by the per-request timeouts"""
+    if stand_in is None:
+        pytest.skip("needs the stand-in")
+
+    settings = client.get_settings()
+    settings.connect_timeout, settings.read_timeout, settings.page_size = 0.5, 0.5, 100
+    stand_in.latency = 0.1
+    try:
+        def devices(core: str) -> list:
+            return [row for page in config.get_client(core).read_pages({"content": "devices", "output": "json", "columns": "objid,name"}, "devices") for row in page]
+
+        result = fanout.query_cores(devices, ["serveronprem", "networkdc"])
+        assert result.errors == {}
+        assert [len(rows) for rows in result.results.values()] == [900, 900]
+
+        found = search.search(["serveronprem"], "devices", "web0000", refresh=True)
+        assert len(found) == 4
+        assert health.for_core("serveronprem").failures == 0
+    finally:
+        stand_in.latency = 0.0
+        reset_tool()
@@ -0,0 +1,68 @@
+import importlib
+
+import pytest
+from typer.testing import CliRunner
+
+from stand_in import StandIn, configure_tool
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+inventory = importlib.import_module("inventory")
+
+
+@pytest.fixture
+def core(stand_in, tmp_path):
+    """A core of its own, changed between reads, with an empty cache"""
+    if stand_in is None:
+        pytest.skip("needs the stand-in")
+
+    with StandIn(cores=("lifecycle",), devices=30) as server:
+        configure_tool(server, tmp_path)
+        yield server
+    session = tmp_path / "session"
+    session.mkdir()
+    configure_tool(stand_in, session)
+
+
+def ids(*args: str) -> list[str]:
+    result = runner.invoke(local_base.app, ["device", "list", "lifecycle", "-o", "ids", *args])
+    assert result.exit_code == 0
+    return result.stdout.split()
+
+
+def test_cache_follows_the_core(core):
+    devices = core.cores["lifecycle"].devices
+    settings = inventory.get_settings()
+    settings.ttl = 3600
+
+    cached = {row["objid"]: row for row in inventory.select("lifecycle", "devices")}
+    assert len(cached) == 30
+    removed, renamed, down, retagged = sorted(devices)[:4]
+    with core.cores["lifecycle"].lock:
+        added = core.cores["lifecycle"].new_id()
+        devices[added] = {**devices[removed], "objid": added, "name": "added"}
+        del devices[removed]
+        devices[renamed]["name"] = "renamed"
+        devices[down].update(status="Down", status_raw=5)
+        devices[retagged]["tags"] = "team:ops"
+
+    # within the ttl nothing is asked of the core
+    before = core.requests["table.json"]
+    assert {row["objid"]: row for row in inventory.select("lifecycle", "devices")} == cached
+    assert core.requests["table.json"] == before
+
+    # past it new, removed and renamed devices and statuses are picked up,
+    # other edits wait for a full refresh
+    settings.ttl = 0
+    rows = {row["objid"]: row for row in inventory.select("lifecycle", "devices")}
+    assert removed not in rows and len(rows) == 30
+    assert rows[added]["name"] == "added"
+    assert rows[renamed]["name"] == "renamed"
+    assert (rows[down]["status"], rows[down]["status_raw"]) == ("Down", 5)
+    assert rows[retagged]["tags"] == cached[retagged]["tags"]
+
+    settings.ttl = 3600
+    assert ids("--tags", "team:ops") == []
+    assert ids("--tags", "team:ops", "--no-cache") == [str(retagged)]
+    assert ids("--tags", "team:ops", "--refresh") == [str(retagged)]
@@ -0,0 +1,102 @@
+import importlib
+import os
+import re
+import signal
+import threading
+import time
+
+import pytest
+import typer
+from typer.testing import CliRunner
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+journal = importlib.import_module("journal")
+
+
+def job_name(output: str) -> str:
+    return re.search(r"Job (\S+),", output).group(1)
+
+
+def test_ctrl_c_drains_and_resume_skips_done_items(stand_in):
+    calls = []
+    lock = threading.Lock()
+
+    def worker(item: int) -> int:
+        with lock:
+            calls.append(item)
+        if item == 5:
+            os.kill(os.getpid(), signal.SIGINT)
+        time.sleep(0.01)
+        return item * 10
+
+    job = journal.open_job("test", "networkdc")
+    finished = []
+    with pytest.raises(typer.Exit) as exit, journal.reporting(job):
+        for result in job.run(range(100), worker, max_workers=4, interruptible=True):
+            finished.append(result.item)
+    assert exit.value.exit_code == 130
+
+    # everything sent before Ctrl-C finished and was recorded, nothing else ran
+    assert sorted(finished) == sorted(calls)
+    assert len(calls) < 100
+    records = list(journal.read(job.path))
+    assert records[-1]["event"] == "interrupted"
+    assert {record["item"] for record in records if record["event"] == "done"} == {
+        str(item) for item in finished
+    }
+
+    resumed = journal.open_job("test", "networkdc", resume=job.job)
+    calls.clear()
+    rest = [result.item for result in resumed.run(range(100), lambda item: item, max_workers=4)]
+    assert sorted(rest + finished) == list(range(100))
+    assert resumed.skipped == len(finished)
+    assert [*journal.read(job.path)][-1]["event"] == "finished"
+
+
+def test_library_runs_leave_sigint_alone(stand_in):
+    handler = signal.getsignal(signal.SIGINT)
+    seen = []
+
+    job = journal.open_job("test", "networkdc")
+    for result in job.run(range(4), lambda item: seen.append(signal.getsignal(signal.SIGINT))):
+        assert result.ok
+    assert seen == [handler] * 4
+
+
+def test_duplicate_resume_checks_the_journal(stand_in):
+    core = stand_in.cores["serveronprem"]
+    devices = [str(objid) for objid in sorted(core.devices)[:3]]
+    ping = next(sensor for sensor in core.sensors.values() if sensor["name"] == "Ping")
+    args = ["sensor", "duplicate", "serveronprem", "Journal Ping", "--source-sensor",
+            str(ping["objid"]), "--target-device", " ".join(devices)]
+
+    first = runner.invoke(local_base.app, args)
+    assert first.exit_code == 0
+    assert first.stdout.count("->") == 3
+    job = job_name(first.stderr)
+
+    before = stand_in.requests["duplicateobject.htm"]
+    resumed = runner.invoke(local_base.app, [*args, "--resume", job])
+    assert resumed.exit_code == 0
+    assert "Skipped 3 items already done" in resumed.stderr
+    assert stand_in.requests["duplicateobject.htm"] == before
+
+    wrong = runner.invoke(
+        local_base.app, ["device", "add-tags", "serveronprem", devices[0], "--tags", "x",
+                         "--resume", job],
+    )
+    assert wrong.exit_code == 1
+    assert "not add_tags on" in wrong.stderr
+
+    other_tags = runner.invoke(
+        local_base.app, ["device", "add-tags", "serveronprem", devices[0], "--tags", "a"],
+    )
+    tags_job = job_name(other_tags.stderr)
+    mismatch = runner.invoke(
+        local_base.app, ["device", "add-tags", "serveronprem", devices[0], "--tags", "b",
+                         "--resume", tags_job],
+    )
+    assert mismatch.exit_code == 1
+    assert "tags differ" in mismatch.stderr
@@ -0,0 +1,52 @@
+import csv
+import importlib
+import io
+import json
+
+from typer.testing import CliRunner
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+outputs = importlib.import_module("terminal_outputs")
+
+
+def test_device_list_streams_records(stand_in):
+    result = runner.invoke(local_base.app, ["device", "list", "serveronprem", "-o", "ndjson"])
+    assert result.exit_code == 0
+
+    devices = [json.loads(line) for line in result.stdout.splitlines()]
+    assert len(devices) == 900
+    assert set(devices[0]) == {"objid", "name", "tags"}
+    assert "Total Devices: 900" in result.stderr
+
+    result = runner.invoke(local_base.app, ["device", "list", "serveronprem", "-o", "csv"])
+    rows = list(csv.DictReader(io.StringIO(result.stdout)))
+    assert [row["objid"] for row in rows] == [str(device["objid"]) for device in devices]
+
+
+def test_ids_output_pipes_into_other_commands(stand_in):
+    result = runner.invoke(
+        local_base.app, ["device", "search", "serveronprem", "fs0000", "-o", "ids"]
+    )
+    assert result.exit_code == 0
+    assert len(result.stdout.split()) == 3
+    assert all(line.isdigit() for line in result.stdout.splitlines())
+
+
+def test_sensor_list_counts_sensors(stand_in):
+    result = runner.invoke(local_base.app, ["sensor", "list", "serveronprem", "--name", "ping"])
+    assert result.exit_code == 0
+    ids = result.stdout.split("Total Sensors")[0].split()
+    assert f"Total Sensors: {len(ids)}" in result.stdout
+
+
+def test_table_output_is_truncated(capsys):
+    pages = [[{"objid": objid} for objid in range(start, start + 500)] for start in (0, 500, 1000)]
+    rendered = []
+
+    count = outputs.write_pages(iter(pages), "table", ["objid"], rendered.extend)
+
+    assert count == 1500
+    assert len(rendered) == outputs.TABLE_LIMIT
+    assert f"Showing {outputs.TABLE_LIMIT} of 1500" in capsys.readouterr().out
@@ -0,0 +1,39 @@
+import importlib
+import json
+
+from typer.testing import CliRunner
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+profiling = importlib.import_module("profiling")
+
+
+def test_profile_summary_and_exports(stand_in, tmp_path):
+    export = tmp_path / "profile.json"
+    result = runner.invoke(
+        local_base.app,
+        ["--profile", "--profile-export", str(export), "device", "list", "serveronprem",
+         "--no-cache", "-o", "ids"],
+    )
+    assert result.exit_code == 0
+    assert "table.json" in result.stderr
+    assert "Profile" not in result.stdout
+    assert not profiling.enabled
+
+    data = json.loads(export.read_text())
+    [endpoint] = data["endpoints"]
+    assert (endpoint["core"], endpoint["endpoint"]) == ("serveronprem", "table.json")
+    assert endpoint["requests"] >= 1 and endpoint["bytes"] > 0
+    assert data["parse_seconds"]["json"] > 0
+
+    text = profiling.prometheus(data)
+    assert 'prtg_requests_total{core="serveronprem",endpoint="table.json"}' in text
+    assert "# TYPE prtg_run_seconds gauge" in text
+
+
+def test_nothing_recorded_without_profile(stand_in):
+    profiling.requests.clear()
+    result = runner.invoke(local_base.app, ["device", "list", "serveronprem", "--no-cache"])
+    assert result.exit_code == 0
+    assert profiling.requests == {}
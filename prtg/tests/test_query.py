@@ -0,0 +1,56 @@
+import importlib
+
+import pytest
+
+
+config = importlib.import_module("config")
+query = importlib.import_module("query")
+
+
+def test_only_what_the_core_can_filter_is_pushed_down():
+    # PRTG ORs repeated filter values, so only the first of the tags that must all match is sent
+    all_tags = query.TableQuery("devices", "objid,name,tags", tags=["role:webserver", "env:prod"])
+    assert all_tags.params()["filter_tags"] == ["@tag(role:webserver)"]
+    assert all_tags.remaining({"tags": "role:webserver env:prod"})
+    assert not all_tags.remaining({"tags": "role:webserver env:test"})
+
+    any_tags = query.TableQuery("devices", "objid,name,tags", any_tags=["role:webserver", "role:database"])
+    assert any_tags.params()["filter_tags"] == ["@tag(role:webserver)", "@tag(role:database)"]
+    assert any_tags.remaining({"tags": "env:prod"})
+
+    objids = query.TableQuery("devices", "objid,name", objids=[1001, 1002])
+    assert objids.params()["filter_objid"] == ["1001", "1002"]
+
+    literal = query.TableQuery("devices", "objid,name", name_pattern="web")
+    assert literal.params()["filter_name"] == "@sub(web)"
+    assert literal.remaining({"name": "WEB00003"})
+    assert not literal.remaining({"name": "xweb"})
+
+    pattern = query.TableQuery("devices", "objid,name", name_pattern="web0000[36]")
+    assert "filter_name" not in pattern.params()
+    assert pattern.remaining({"name": "web00006"})
+    assert not pattern.remaining({"name": "web00009"})
+
+
+def test_pushed_down_filters_shrink_the_response(stand_in):
+    if stand_in is None:
+        pytest.skip("needs the stand-in")
+
+    devices = stand_in.cores["serveronprem"].devices.values()
+    web = [device for device in devices if "role:webserver" in device["tags"].split()]
+    web_prod = [device for device in web if "env:prod" in device["tags"].split()]
+    prtg = config.get_client("serveronprem")
+
+    def rows(table_query: query.TableQuery) -> tuple[int, int]:
+        """Rows the core answered with, and rows left after the client side checks"""
+        received = [row for page in prtg.read_pages(table_query.params(), "devices") for row in page]
+        return len(received), len([row for row in received if table_query.remaining(row)])
+
+    both = query.TableQuery("devices", "objid,name,tags", tags=["role:webserver", "env:prod"])
+    assert rows(both) == (len(web), len(web_prod))
+
+    some = sorted(device["objid"] for device in devices)[:5]
+    assert rows(query.TableQuery("devices", "objid,name", objids=some)) == (5, 5)
+
+    assert rows(query.TableQuery("devices", "objid,name", name_pattern="fs0000")) == (3, 3)
+    assert rows(query.TableQuery("devices", "objid,name", name_pattern="fs0000[25]")) == (len(devices), 2)
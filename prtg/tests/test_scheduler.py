@@ -0,0 +1,56 @@
+import importlib
+import threading
+import time
+
+
+scheduler = importlib.import_module("scheduler")
+
+
+def make_scheduler(window: int = 4, **settings) -> "scheduler.CoreScheduler":
+    return scheduler.CoreScheduler(scheduler.SchedulerSettings(**settings), window)
+
+
+def test_window_grows_on_fast_writes_and_halves_on_errors():
+    core = make_scheduler(window=4, rate=1000, burst=1000)
+
+    for _ in range(8):
+        with core.slot():
+            pass
+    assert core.window > 5
+
+    grown = core.window
+    with core.slot() as slot:
+        slot.ok = False
+    assert core.window == grown / 2
+
+
+def test_one_burst_of_errors_halves_the_window_once():
+    core = make_scheduler(window=16, rate=1000, burst=1000)
+    barrier = threading.Barrier(8)
+
+    def fail():
+        with core.slot() as slot:
+            barrier.wait()
+            time.sleep(0.05)
+            slot.ok = False
+
+    threads = [threading.Thread(target=fail) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert core.window == 8
+
+
+def test_token_bucket_caps_the_rate():
+    core = make_scheduler(window=32, rate=50, burst=1)
+
+    started = time.monotonic()
+    for _ in range(6):
+        with core.slot():
+            pass
+
+    # the first request uses the burst, the other five wait 1/50s each
+    assert time.monotonic() - started >= 0.09
+    assert core.throttled >= 0.09
@@ -0,0 +1,98 @@
+import importlib
+
+import pytest
+from typer.testing import CliRunner
+
+from stand_in import StandIn, configure_tool
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+inventory = importlib.import_module("inventory")
+search = importlib.import_module("search")
+fanout = importlib.import_module("fanout")
+query = importlib.import_module("query")
+
+
+def names(rows: list) -> list:
+    return [row["name"] for row in rows]
+
+
+def test_ranked_substring_search(stand_in):
+    found = search.search(["serveronprem"], "devices", "WEB0001")
+
+    assert names(found)[:1] == ["web00012"]
+    assert all("web0001" in name for name in names(found))
+    assert names(search.search(["serveronprem"], "devices", "web00012"))[0] == "web00012"
+
+
+def test_fuzzy_search_tolerates_typos(stand_in):
+    assert search.search(["serveronprem"], "devices", "wbe00123") == []
+    assert "web00123" in names(search.search(["serveronprem"], "devices", "wbe00123", fuzzy=True))
+
+
+def test_index_follows_cache_writes(stand_in):
+    search.search(["networkdc"], "devices", "web")
+    device = search.search(["networkdc"], "devices", "db00004")[0]
+
+    inventory.update_tags("networkdc", device["objid"], "role:retired")
+    assert names(search.search(["networkdc"], "devices", "role:retired")) == ["db00004"]
+
+    inventory.upsert("networkdc", "devices", {**device, "name": "renamed-db00004"})
+    assert names(search.search(["networkdc"], "devices", "renamed-db")) == ["renamed-db00004"]
+
+
+def test_device_search_and_completion(stand_in):
+    result = runner.invoke(local_base.app, ["device", "search", "serveronprem", "fs0000"])
+    assert result.exit_code == 0
+    assert "Total Devices: 3" in result.stdout
+
+    assert search.complete("devices", "fs0000", "serveronprem") == ["fs00002", "fs00005", "fs00008"]
+
+
+def test_sensor_list_by_name(stand_in):
+    result = runner.invoke(local_base.app, ["sensor", "list", "serveronprem", "--name", "cpu load"])
+    assert result.exit_code == 0
+    assert len(result.stdout.split("Total Sensors")[0].split()) == 900
+
+
+def test_device_search_by_substring_or_regex(stand_in):
+    command = ["device", "search", "serveronprem", "-o", "ids"]
+    for extra in ([], ["--no-cache"]):
+        result = runner.invoke(local_base.app, [*command, "fs0000", *extra])
+        assert len(result.stdout.split()) == 3
+
+    # dashes and spaces match themselves, the pattern is still narrowed on the core
+    assert query.TableQuery("devices", "name", name_pattern="web-01 a").params()["filter_name"] == "@sub(web-01 a)"
+    assert "filter_name" not in query.TableQuery("devices", "name", name_pattern="web.1").params()
+
+    result = runner.invoke(local_base.app, [*command, "fs0000[25]", "--regex", "--no-cache"])
+    assert len(result.stdout.split()) == 2
+
+
+def test_sensor_search_matches_names_only(stand_in):
+    # every CPU Load sensor is tagged wmicpu
+    for extra in ([], ["--no-cache"]):
+        result = runner.invoke(local_base.app, ["sensor", "list", "serveronprem", "--name", "wmi", *extra])
+        assert result.exit_code == 0
+        assert "Total Sensors: 0" in result.stdout
+
+
+def test_cores_refresh_the_cache_at_once(stand_in, tmp_path):
+    if stand_in is None:
+        pytest.skip("needs the stand-in")
+
+    cores = ("core1", "core2", "core3", "core4")
+    try:
+        with StandIn(cores=cores, devices=3000) as server:
+            configure_tool(server, tmp_path)
+            for refresh in (False, True):
+                result = fanout.query_cores(
+                    lambda core: inventory.ensure_fresh(core, "devices", refresh), cores
+                )
+                assert result.errors == {}
+                assert sum(len(inventory.select(core, "devices")) for core in cores) == 12000
+    finally:
+        session = tmp_path / "session"
+        session.mkdir()
+        configure_tool(stand_in, session)
@@ -0,0 +1,153 @@
+import importlib
+
+from typer.testing import CliRunner
+
+from stand_in import add_sensor
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+sensor = importlib.import_module("sensor")
+inventory = importlib.import_module("inventory")
+api = importlib.import_module("api")
+query = importlib.import_module("query")
+status_watch = importlib.import_module("status_watch")
+
+
+def sensor_ids(stand_in, count: int) -> list:
+    return [str(objid) for objid in sorted(stand_in.cores["networkdc"].sensors)[-count:]]
+
+
+def test_read_ids_from_arguments_and_file(tmp_path):
+    file = tmp_path / "ids.csv"
+    file.write_text("objid\n3\n4,5\n")
+
+    assert sensor.read_ids(["1 2", "2,3"], file) == ["1", "2", "3", "4", "5"]
+
+
+def test_pause_and_resume_in_one_request(stand_in):
+    ids = sensor_ids(stand_in, 5)
+    before = stand_in.requests["pause.htm"]
+
+    paused = runner.invoke(local_base.app, ["sensor", "pause", "networkdc", *ids, "--message", "patching"])
+    assert paused.exit_code == 0
+    assert "Confirmed paused: 5 of 5" in paused.stdout
+    assert stand_in.requests["pause.htm"] == before + 1
+
+    resumed = runner.invoke(local_base.app, ["sensor", "resume", "networkdc", "-"], input="\n".join(ids))
+    assert resumed.exit_code == 0
+    assert "Confirmed active: 5 of 5" in resumed.stdout
+
+
+def test_timed_pause_isolates_unknown_ids(stand_in):
+    ids = sensor_ids(stand_in, 8)[:3]
+
+    result = runner.invoke(
+        local_base.app, ["sensor", "pause", "networkdc", ",".join([*ids, "999999"]), "--duration", "30"]
+    )
+    assert result.exit_code == 1
+    assert "Failed 999999" in result.stdout
+    assert "Confirmed paused: 3 of 4" in result.stdout
+
+    sensors = stand_in.cores["networkdc"].sensors
+    assert all(sensors[int(objid)]["status_raw"] == 11 for objid in ids)
+
+
+def test_duplicate_checks_existing_sensors_in_one_read(stand_in):
+    core = stand_in.cores["networkdc"]
+    devices = [str(objid) for objid in sorted(core.devices)[:40]]
+    ping = next(sensor for sensor in core.sensors.values() if sensor["name"] == "Ping")
+    inventory.ensure_fresh("networkdc", "sensors")
+    before = stand_in.requests["table.json"]
+    duplicated = stand_in.requests["duplicateobject.htm"]
+
+    # every device already has a Ping sensor
+    result = runner.invoke(
+        local_base.app,
+        ["sensor", "duplicate", "networkdc", "Ping", "--source-sensor", str(ping["objid"]),
+         "--target-device", " ".join(devices)],
+    )
+    assert result.exit_code == 0
+    assert result.stdout.count("already applied, skipped") == 40
+    assert stand_in.requests["table.json"] == before + 1
+    assert stand_in.requests["duplicateobject.htm"] == duplicated
+
+    # a sensor created after the cache refresh is still seen on the core
+    with core.lock:
+        add_sensor(core, int(devices[0]), "Created Elsewhere", "pingsensor", 3)
+    result = runner.invoke(
+        local_base.app,
+        ["sensor", "duplicate", "networkdc", "Created Elsewhere", "--source-sensor",
+         str(ping["objid"]), "--target-device", devices[0]],
+    )
+    assert result.exit_code == 0
+    assert "already applied, skipped" in result.stdout
+    assert stand_in.requests["duplicateobject.htm"] == duplicated
+
+    assert sensor.has_sensor("networkdc", devices[0], sensor_id=str(ping["objid"]), use_cache=False)
+    assert not sensor.has_sensor("networkdc", devices[0], sensor_name="Nope", use_cache=False)
+
+
+def test_duplicate_copies_once_onto_a_repeated_target(stand_in):
+    core = stand_in.cores["networkdc"]
+    device = str(sorted(core.devices)[-1])
+    ping = next(sensor for sensor in core.sensors.values() if sensor["name"] == "Ping")
+    duplicated = stand_in.requests["duplicateobject.htm"]
+
+    results = list(api.PRTGClient("networkdc").duplicate([str(ping["objid"])], "Copy Once", [device, device]))
+    assert [result.item for result in results] == [device]
+    assert stand_in.requests["duplicateobject.htm"] == duplicated + 1
+
+
+def test_sensor_names_are_batched_and_remembered(stand_in):
+    ids = sensor_ids(stand_in, 250)
+    api._names.clear()
+    inventory.ensure_fresh("networkdc", "sensors")
+    before = stand_in.requests["table.json"]
+
+    # cached names in one query, the unknown ID in one request to the core
+    names = api.sensor_names("networkdc", [*ids, "999999"])
+    assert len(names) == 250
+    assert "999999" not in names
+    assert stand_in.requests["table.json"] == before + 1
+
+    assert ("networkdc", ids[0]) in api._names
+    assert sensor.get_sensor_name(ids[0], "networkdc", None) == names[ids[0]]
+
+
+def set_status(sensor: dict, status: int, text: str) -> None:
+    sensor["status_raw"] = status
+    sensor["status"] = text
+
+
+def test_watch_reports_only_transitions(stand_in):
+    core = stand_in.cores["networkdc"]
+    down = next(s for s in core.sensors.values() if s["status_raw"] == 5)
+    up = next(s for s in core.sensors.values() if s["status_raw"] == 3)
+    table_query = query.TableQuery(
+        "sensors", status_watch.WATCH_COLUMNS, statuses=status_watch.PROBLEM_STATUSES
+    )
+
+    polls = status_watch.watch(["networkdc"], table_query, interval=0.1, polls=3)
+    first, changes = next(polls)
+    assert down["objid"] in first["networkdc"] and changes == []
+    projected = {*status_watch.WATCH_COLUMNS.split(","), "status_raw", "message_raw"}
+    assert set(first["networkdc"][down["objid"]]) <= projected
+
+    try:
+        with core.lock:
+            set_status(down, 3, "Up")
+            set_status(up, 5, "Down")
+        first, changes = next(polls)
+        assert first == {}
+        assert {(c.objid, c.before, c.after) for c in changes} == {
+            (down["objid"], "Down", None),
+            (up["objid"], None, "Down"),
+        }
+
+        first, changes = next(polls)
+        assert changes == []
+    finally:
+        with core.lock:
+            set_status(down, 5, "Down")
+            set_status(up, 3, "Up")
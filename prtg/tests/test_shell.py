@@ -0,0 +1,66 @@
+import importlib
+
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from stand_in import reset_tool
+
+
+runner = CliRunner()
+local_base = importlib.import_module("local_base")
+client = importlib.import_module("client")
+config = importlib.import_module("config")
+shell = importlib.import_module("shell")
+
+
+def test_commands_share_one_process(stand_in):
+    lines = [
+        "device search serveronprem fs0000 -o ids",
+        "device bogus",
+        "sensor list serveronprem --name 'cpu load' -o ids",
+        "exit",
+        "cores list",
+    ]
+    session = client.CoreClient("serveronprem", "").session
+    result = runner.invoke(local_base.app, ["shell"], input="\n".join(lines) + "\n")
+
+    assert result.exit_code == 0
+    assert "Total Devices: 3" in result.stderr
+    assert "No such command 'bogus'" in result.stderr
+    assert "Total Sensors: 900" in result.stderr
+    assert "Available cores" not in result.stdout
+    assert client.CoreClient("serveronprem", "").session is session
+
+
+def test_config_changes_apply_to_the_running_shell(stand_in):
+    config_file = Path(config.config_file_path)
+    saved = config_file.read_text()
+    assert client.get_settings().page_size == 2000
+    try:
+        result = runner.invoke(
+            local_base.app, ["shell"], input="config set page_size 50 --section Client\nexit\n"
+        )
+        assert result.exit_code == 0
+        assert client.get_settings().page_size == 50
+    finally:
+        config_file.write_text(saved)
+        # the restored file may share the changed file's mtime, parse it again regardless
+        config._loaded_mtime = None
+        reset_tool()
+    assert client.get_settings().page_size == 2000
+
+
+def test_completion_of_commands_cores_and_names(stand_in):
+    assert shell.complete_words(["dev"]) == ["device"]
+    assert "add-tags" in shell.complete_words(["device", "a"])
+    assert shell.complete_words(["device", "search", "server"]) == [
+        "serveronprem", "serveresx", "serverazure"
+    ]
+    assert "--fuzzy" in shell.complete_words(["device", "search", "--f"])
+
+    shell.run_line("device search serveronprem fs")
+    assert shell.complete_words(["device", "search", "serveronprem", "fs0000"]) == [
+        "fs00002", "fs00005", "fs00008"
+    ]
+    assert shell.complete_words(["sensor", "list", "serveronprem", "CPU"]) == ["'CPU Load'"]
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+# Seconds `prtg` may add on top of a bare interpreter start, override on slow machines
+STARTUP_BUDGET = float(os.getenv("PRTG_STARTUP_BUDGET", "0.5"))
+HEAVY_MODULES = ["requests", "xmltodict", "sqlite3", "device", "sensor", "channel"]
+
+SCRIPT = """
+import sys
+import local_base
+
+try:
+    local_base.app(sys.argv[1:], prog_name="prtg")
+except SystemExit:
+    pass
+print("LOADED", *sys.modules)
+"""
+
+
+def run_prtg(*args: str) -> tuple[float, set]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT, *args],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    loaded = result.stdout.split("LOADED", 1)[1].split()
+    return elapsed, set(loaded)
+
+
+def bare_interpreter() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"])
+    return time.perf_counter() - started
+
+
+def test_help_does_not_import_subcommands():
+    _, loaded = run_prtg("--help")
+    assert not loaded.intersection(HEAVY_MODULES)
+
+
+def test_cores_list_does_not_import_subcommands():
+    _, loaded = run_prtg("cores", "list")
+    assert not loaded.intersection(HEAVY_MODULES)
+
+
+def test_startup_budget():
+    # best of three to smooth out a busy machine
+    overhead = min(run_prtg("cores", "list")[0] for _ in range(3)) - bare_interpreter()
+    assert overhead < STARTUP_BUDGET, f"startup took {overhead:.3f}s over the interpreter"
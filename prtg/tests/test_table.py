@@ -0,0 +1,30 @@
+import importlib
+
+import pytest
+
+
+config = importlib.import_module("config")
+table = importlib.import_module("table")
+
+PARAMS = {"content": "devices", "columns": "objid,name", "output": "json", "sortby": "name"}
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+@pytest.mark.parametrize("page_size, requests", [(100, 10), (250, 4)])
+def test_pages_are_read_in_order_until_a_short_page(stand_in, prefetch, page_size, requests):
+    if stand_in is None:
+        pytest.skip("needs the stand-in")
+
+    names = sorted(device["name"] for device in stand_in.cores["serveronprem"].devices.values())
+    prtg = config.get_client("serveronprem")
+    before = stand_in.requests["table.json"]
+
+    pages = list(
+        table.read_pages(prtg.url(), prtg.with_token(PARAMS), "devices", page_size, prefetch)
+    )
+
+    # 900 devices: nine full pages and an empty one, or three full pages and a short one
+    assert [len(page) for page in pages[:-1]] == [page_size] * (requests - 1)
+    assert len(pages[-1]) < page_size
+    assert [row["name"] for page in pages for row in page] == names
+    assert stand_in.requests["table.json"] == before + requests
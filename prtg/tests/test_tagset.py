@@ -0,0 +1,35 @@
+import importlib
+
+
+tagset = importlib.import_module("tagset")
+TagSet = tagset.TagSet
+
+
+def test_tagset_whole_tags():
+    tags = TagSet("web webserver,role:web web")
+    assert str(tags) == "web webserver role:web"
+    assert str(tags - "web") == "webserver role:web"
+    assert "webs" not in tags
+
+
+def test_tagset_union_keeps_order():
+    assert str(TagSet("b a") | "a c") == "b a c"
+    assert TagSet("a b") == TagSet("b a")
+
+
+def test_plan_only_changed_devices():
+    devices = [
+        {"objid": 1, "name": "web01", "tags": "role:web legacy"},
+        {"objid": 2, "name": "db01", "tags": "role:db"},
+        {"objid": 3, "name": "web02", "tags": "role:web"},
+    ]
+    rules = [
+        tagset.TagRule(name="^web", add=TagSet("role:web"), remove=TagSet("legacy")),
+        tagset.TagRule(objid="2", tags=TagSet("role:db env:prod")),
+    ]
+
+    changes = {change.objid: change for change in tagset.plan(devices, rules)}
+
+    assert sorted(changes) == ["1", "2"]
+    assert str(changes["1"].removed) == "legacy"
+    assert str(changes["2"].added) == "env:prod"